@@ -0,0 +1,201 @@
+"""
+archive.py
+Tiered retention for the interactions table.
+
+Interactions older than INTERACTION_RETENTION_DAYS are moved to cold
+storage: the full message and response are written zlib-compressed to a
+separate archive database (ARCHIVE_DATABASE_URL), and the hot row keeps its
+id, user, timestamp, phase, stored embedding and a short summary of each
+side, marked with archived_at. The hot file stops carrying full transcripts
+while memory search (vector and keyword) keeps working on the hot data.
+
+Reads are transparent: hydrate() swaps the archived full text back onto
+Interaction objects on demand, and load_interactions() calls it, so
+retrieval and prompts see the original transcript.
+
+Usage:
+    python archive.py --older-than-days 180
+"""
+
+import os
+import json
+import zlib
+import logging
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict, List, Sequence, Tuple
+from sqlalchemy import create_engine, Column, Integer, DateTime, LargeBinary
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.orm.attributes import set_committed_value
+from database import SessionLocal, configure_sqlite
+from db_writer import writer_for
+import models
+
+logger = logging.getLogger(__name__)
+
+INTERACTION_RETENTION_DAYS = int(os.getenv("INTERACTION_RETENTION_DAYS", "180"))
+ARCHIVE_DATABASE_URL = os.getenv("ARCHIVE_DATABASE_URL", "sqlite:///./cyclewise_archive.db")
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+SUMMARY_CHARS = 160
+
+ArchiveBase = declarative_base()
+
+
+class ArchivedInteraction(ArchiveBase):
+    __tablename__ = "archived_interactions"
+    id = Column(Integer, primary_key=True)  # Same id as the hot interactions row
+    user_id = Column(Integer, index=True)
+    timestamp = Column(DateTime)
+    payload = Column(LargeBinary)  # zlib-compressed JSON {"message", "response"}
+
+
+_archive_engine = None
+_ArchiveSession = None
+
+
+def archive_session() -> Session:
+    global _archive_engine, _ArchiveSession
+    if _ArchiveSession is None:
+        connect_args = {"check_same_thread": False} if ARCHIVE_DATABASE_URL.startswith("sqlite") else {}
+        _archive_engine = configure_sqlite(create_engine(ARCHIVE_DATABASE_URL, connect_args=connect_args))
+        ArchiveBase.metadata.create_all(bind=_archive_engine)
+        _ArchiveSession = sessionmaker(bind=_archive_engine, autoflush=False)
+    return _ArchiveSession()
+
+
+def compress(message: str, response: str) -> bytes:
+    return zlib.compress(json.dumps({"message": message, "response": response}).encode("utf-8"), 6)
+
+
+def decompress(payload: bytes) -> Tuple[str, str]:
+    data = json.loads(zlib.decompress(payload).decode("utf-8"))
+    return data["message"], data["response"]
+
+
+def summarize(text: str, limit: int = SUMMARY_CHARS) -> str:
+    """Short hot-tier stand-in for an archived message or response."""
+    text = " ".join((text or "").split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def fetch_archived(interaction_ids: Sequence[int]) -> Dict[int, Tuple[str, str]]:
+    """Full (message, response) for archived interaction ids."""
+    if not interaction_ids:
+        return {}
+    session = archive_session()
+    try:
+        rows = session.query(ArchivedInteraction.id, ArchivedInteraction.payload).filter(
+            ArchivedInteraction.id.in_(list(interaction_ids))
+        ).all()
+        return {interaction_id: decompress(payload) for interaction_id, payload in rows}
+    finally:
+        session.close()
+
+
+def hydrate(interactions: List[models.Interaction]) -> List[models.Interaction]:
+    """
+    Restore the full text of archived interactions in place. The values are
+    set as already-committed state, so the session won't write them back
+    to the hot table.
+    """
+    archived = [i for i in interactions if i.archived_at is not None]
+    if not archived:
+        return interactions
+    full = fetch_archived([i.id for i in archived])
+    for interaction in archived:
+        if interaction.id in full:
+            message, response = full[interaction.id]
+            set_committed_value(interaction, "message", message)
+            set_committed_value(interaction, "response", response)
+        else:
+            logger.warning(f"Archived interaction {interaction.id} missing from the archive")
+    return interactions
+
+
+def delete_archived(interaction_ids: Sequence[int]):
+    if not interaction_ids:
+        return
+    session = archive_session()
+    try:
+        session.query(ArchivedInteraction).filter(
+            ArchivedInteraction.id.in_(list(interaction_ids))
+        ).delete(synchronize_session=False)
+        session.commit()
+    finally:
+        session.close()
+
+
+def archive_interactions(db: Session, older_than_days: int = None, batch_size: int = None, now: datetime = None) -> int:
+    """
+    Move interactions older than older_than_days to the archive. Each batch
+    is committed to the archive before its hot rows are trimmed, so an
+    interrupted run never loses text and simply resumes. Returns the number
+    of interactions archived.
+    """
+    days = INTERACTION_RETENTION_DAYS if older_than_days is None else older_than_days
+    batch_size = batch_size or ARCHIVE_BATCH_SIZE
+    cutoff = (now or datetime.utcnow()) - timedelta(days=days)
+    archived = 0
+    while True:
+        batch = (
+            db.query(models.Interaction)
+            .filter(models.Interaction.timestamp < cutoff, models.Interaction.archived_at.is_(None))
+            .order_by(models.Interaction.timestamp, models.Interaction.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+
+        cold = archive_session()
+        try:
+            for interaction in batch:
+                cold.merge(ArchivedInteraction(
+                    id=interaction.id,
+                    user_id=interaction.user_id,
+                    timestamp=interaction.timestamp,
+                    payload=compress(interaction.message or "", interaction.response or ""),
+                ))
+            cold.commit()
+        finally:
+            cold.close()
+
+        trimmed = [
+            {"id": i.id, "message": summarize(i.message), "response": summarize(i.response)}
+            for i in batch
+        ]
+        archived_at = datetime.utcnow()
+
+        def trim(session: Session, rows=trimmed):
+            for row in rows:
+                session.query(models.Interaction).filter(models.Interaction.id == row["id"]).update(
+                    {"message": row["message"], "response": row["response"], "archived_at": archived_at},
+                    synchronize_session=False,
+                )
+
+        writer_for(db).submit(trim)
+        db.expire_all()
+        archived += len(batch)
+        logger.info(f"Archived {archived} interactions older than {cutoff:%Y-%m-%d}")
+    return archived
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old interactions to the cold archive.")
+    parser.add_argument("--older-than-days", type=int, default=INTERACTION_RETENTION_DAYS)
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        count = archive_interactions(db, older_than_days=args.older_than_days, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(f"✅ Archived {count} interactions to {ARCHIVE_DATABASE_URL}")
+    if count:
+        print("Run VACUUM on the main database to return the freed pages to the filesystem.")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,8 +10,10 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, get_async_db, get_read_db, get_async_read_db
 import models
 from google.auth.transport import requests
 from google.oauth2 import id_token
@@ -24,6 +26,8 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "your-google-client-id")
+# Accounts allowed to read operational endpoints such as /internal/stats (comma-separated emails)
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -57,24 +61,55 @@ def verify_token(token: str) -> Optional[str]:
     except JWTError:
         return None
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)) -> models.User:
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
-    token = credentials.credentials
-    email = verify_token(token)
+
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)) -> models.User:
+    email = verify_token(credentials.credentials)
     if email is None:
-        raise credentials_exception
+        raise _credentials_exception()
     
     user = db.query(models.User).filter(models.User.email == email).first()
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     
     return user
 
+async def get_current_user_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db),
+) -> models.User:
+    """get_current_user for async routes."""
+    email = verify_token(credentials.credentials)
+    if email is None:
+        raise _credentials_exception()
+    
+    user = (await db.execute(select(models.User).filter(models.User.email == email))).scalars().first()
+    if user is None:
+        raise _credentials_exception()
+    
+    return user
+
+def get_current_reader(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_read_db)) -> models.User:
+    """get_current_user for read-only GET routes: looks the user up on the route's read session."""
+    return get_current_user(credentials, db)
+
+async def get_current_reader_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_read_db),
+) -> models.User:
+    return await get_current_user_async(credentials, db)
+
+def get_current_admin(current_user: models.User = Depends(get_current_reader)) -> models.User:
+    """get_current_reader restricted to ADMIN_EMAILS; everyone is refused when it is unset."""
+    if current_user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed")
+    return current_user
+
 def verify_google_token(token: str) -> dict:
     """
     Verify Google ID token and return user info.
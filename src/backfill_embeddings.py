@@ -0,0 +1,211 @@
+"""
+backfill_embeddings.py
+Resumable background backfill of interaction embeddings.
+
+Pages through interactions by id, embeds the ones that have no stored
+embedding for the current model in large batches under a rate limit,
+writes the vectors in bulk and checkpoints progress in job_checkpoints so
+an interrupted run resumes where it stopped.
+
+Usage:
+    python backfill_embeddings.py --batch-size 256 --rate 200
+    python backfill_embeddings.py --reset   # start again from the first interaction
+
+Or in-process: start_background_backfill() runs it on a daemon thread
+(main.py does this at startup when EMBEDDING_BACKFILL_ON_STARTUP=true).
+"""
+
+import argparse
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from embeddings import Embedder, get_embedder, vector_to_bytes
+from vector_store import format_interaction
+from archive import hydrate
+import models
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBackfill:
+    """
+    Embeds interactions missing a stored embedding for the embedder's model.
+
+    Args:
+        batch_size: Interactions per page, embed call and commit
+        rate_limit: Max texts embedded per second (0 = unlimited)
+        embedder: Backend to use (defaults to the deployment's embedder)
+    """
+
+    def __init__(self, batch_size: int = 256, rate_limit: float = 0, embedder: Embedder = None,
+                 session_factory=SessionLocal):
+        self.batch_size = batch_size
+        self.rate_limit = rate_limit
+        self.embedder = embedder or get_embedder()
+        self.session_factory = session_factory
+        self.job_name = f"embedding_backfill:{self.embedder.model_name}"
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._progress: Dict[str, Any] = {"state": "idle", "processed": 0, "remaining": None}
+
+    def _pending(self, db: Session, after_id: int):
+        """Interactions after after_id without an embedding for this model."""
+        return (
+            db.query(models.Interaction)
+            .outerjoin(models.InteractionEmbedding, models.InteractionEmbedding.interaction_id == models.Interaction.id)
+            .filter(
+                models.Interaction.id > after_id,
+                or_(
+                    models.InteractionEmbedding.interaction_id.is_(None),
+                    models.InteractionEmbedding.model != self.embedder.model_name,
+                ),
+            )
+        )
+
+    def _checkpoint(self, db: Session) -> models.JobCheckpoint:
+        checkpoint = db.get(models.JobCheckpoint, self.job_name)
+        if checkpoint is None:
+            checkpoint = models.JobCheckpoint(name=self.job_name, last_id=0)
+            db.add(checkpoint)
+            db.commit()
+        return checkpoint
+
+    def reset(self):
+        db = self.session_factory()
+        try:
+            self._checkpoint(db).last_id = 0
+            db.commit()
+        finally:
+            db.close()
+
+    def stop(self):
+        self._stop.set()
+
+    def progress(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._progress)
+
+    def _update_progress(self, **fields):
+        with self._lock:
+            self._progress.update(fields)
+
+    def run(self) -> int:
+        """Run until no pending interactions remain (or stop()). Returns rows embedded."""
+        db = self.session_factory()
+        started = time.monotonic()
+        processed = 0
+        try:
+            checkpoint = self._checkpoint(db)
+            remaining = self._pending(db, checkpoint.last_id).with_entities(func.count(models.Interaction.id)).scalar()
+            self._update_progress(state="running", job=self.job_name, processed=0, remaining=remaining,
+                                  last_id=checkpoint.last_id, started_at=datetime.utcnow().isoformat())
+            logger.info(f"Embedding backfill {self.job_name}: {remaining} interactions pending after id {checkpoint.last_id}")
+
+            while not self._stop.is_set():
+                batch = (
+                    self._pending(db, checkpoint.last_id)
+                    .order_by(models.Interaction.id)
+                    .limit(self.batch_size)
+                    .all()
+                )
+                hydrate(batch)  # Embed archived interactions from their full text
+                if not batch:
+                    break
+
+                batch_started = time.monotonic()
+                vectors = self.embedder.embed([format_interaction(i.message, i.response) for i in batch])
+                ids = [i.id for i in batch]
+                db.query(models.InteractionEmbedding).filter(
+                    models.InteractionEmbedding.interaction_id.in_(ids)
+                ).delete(synchronize_session=False)
+                db.bulk_insert_mappings(models.InteractionEmbedding, [
+                    {
+                        "interaction_id": interaction_id,
+                        "model": self.embedder.model_name,
+                        "dim": self.embedder.dim,
+                        "vector": vector_to_bytes(vector),
+                        "created_at": datetime.utcnow(),
+                    }
+                    for interaction_id, vector in zip(ids, vectors)
+                ])
+                checkpoint.last_id = ids[-1]
+                db.commit()
+
+                processed += len(batch)
+                remaining = max(0, remaining - len(batch))
+                elapsed = time.monotonic() - started
+                rate = processed / elapsed if elapsed > 0 else 0.0
+                self._update_progress(
+                    processed=processed, remaining=remaining, last_id=checkpoint.last_id,
+                    rows_per_second=round(rate, 2),
+                    eta_seconds=round(remaining / rate, 1) if rate > 0 else None,
+                )
+                logger.info(
+                    f"Embedding backfill: {processed} done, {remaining} left, "
+                    f"{rate:.1f} rows/s, ETA {remaining / rate if rate else 0:.0f}s"
+                )
+
+                if self.rate_limit > 0:
+                    # Sleep off whatever this batch finished ahead of the rate limit
+                    time.sleep(max(0.0, len(batch) / self.rate_limit - (time.monotonic() - batch_started)))
+
+            self._update_progress(state="stopped" if self._stop.is_set() else "done")
+            return processed
+        except Exception as e:
+            db.rollback()
+            self._update_progress(state="failed", error=str(e))
+            logger.error(f"Embedding backfill failed after {processed} rows: {e}")
+            raise
+        finally:
+            db.close()
+
+
+_background: Optional[EmbeddingBackfill] = None
+
+
+def start_background_backfill(batch_size: int = 256, rate_limit: float = 0) -> EmbeddingBackfill:
+    """Run a backfill on a daemon thread; returns the job for progress/stop."""
+    global _background
+    _background = EmbeddingBackfill(batch_size=batch_size, rate_limit=rate_limit)
+    threading.Thread(target=_run_quietly, args=(_background,), name="embedding-backfill", daemon=True).start()
+    return _background
+
+
+def background_backfill() -> Optional[EmbeddingBackfill]:
+    return _background
+
+
+def _run_quietly(job: EmbeddingBackfill):
+    try:
+        job.run()
+    except Exception:
+        pass  # Already logged and reflected in job.progress()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill stored embeddings for existing interactions.")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--rate", type=float, default=0, help="Max texts per second (0 = unlimited)")
+    parser.add_argument("--reset", action="store_true", help="Ignore the checkpoint and start from the first interaction")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    job = EmbeddingBackfill(batch_size=args.batch_size, rate_limit=args.rate)
+    if args.reset:
+        job.reset()
+    try:
+        processed = job.run()
+    except KeyboardInterrupt:
+        job.stop()
+        print(f"\nInterrupted; progress is checkpointed at id {job.progress().get('last_id')}.")
+        return
+    print(f"✅ Embedded {processed} interactions.")
+
+
+if __name__ == "__main__":
+    main()
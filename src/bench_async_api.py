@@ -0,0 +1,206 @@
+"""
+bench_async_api.py
+Sync vs async data-API benchmark at high concurrency.
+
+Seeds a fresh database (users with cycle history and reminders), then
+drives GET /api/phase and GET /api/cycles for a fixed duration with many
+concurrent clients against two apps serving the same database:
+
+    sync:  the previous handlers (def + sync Session from get_db), which
+           hold a threadpool slot for the whole database round trip
+    async: routers.py's async handlers (AsyncSession from get_async_db)
+
+Requests go through httpx's in-process ASGI transport, so the numbers
+measure the server side (auth, queries, serialization) without sockets.
+Reports throughput, p50/p99 latency and errors for each mode.
+
+The async engine is warmed first, as main.py does at startup: on a cold
+pool, connections opened while the first one is still running its connect
+event (the pragmas) queue on SQLAlchemy's asyncio lock, and the requests
+behind them stall for the whole run (p99 ~4100 ms against ~1000 ms warm).
+
+The pool defaults to one connection per client. With fewer, the sync path
+stalls: a request's get_db session keeps its connection while it waits for
+a threadpool slot, so requests time out on the pool (try --pool-size 20).
+
+Usage:
+    python bench_async_api.py --concurrency 200 --seconds 10
+    python bench_async_api.py --modes async --pool-size 20 --output async_bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+import httpx
+import numpy as np
+from fastapi import APIRouter, Depends, FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from database import Base, async_database_url, configure_sqlite, get_async_db, get_async_read_db, get_db, warm_async_engine
+from cycles import phase_for_day
+import auth
+import models
+import routers
+import schemas
+
+PATHS = ["/api/phase", "/api/cycles"]
+
+# The sync handlers as they were before the data API moved to async, for comparison
+sync_router = APIRouter()
+
+
+@sync_router.get("/cycles", response_model=List[schemas.CycleOut])
+def get_cycles(current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+    return db.query(models.Cycle).filter(models.Cycle.user_id == current_user.id).all()
+
+
+@sync_router.get("/phase")
+def get_current_phase(current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+    last_cycle = db.query(models.Cycle).filter(models.Cycle.user_id == current_user.id) \
+        .order_by(models.Cycle.start_date.desc()).first()
+    if not last_cycle:
+        return {"phase": None, "message": "No cycle data found."}
+    days_since = (datetime.utcnow() - last_cycle.start_date).days
+    return {"phase": phase_for_day(days_since), "days_since": days_since}
+
+
+def seed(Session, users: int, cycles: int):
+    now = datetime.utcnow()
+    db = Session()
+    for user_id in range(1, users + 1):
+        db.add(models.User(id=user_id, email=f"bench{user_id}@example.com"))
+        for n in range(cycles):
+            db.add(models.Cycle(user_id=user_id, start_date=now - timedelta(days=28 * n + 3),
+                                symptoms="mild cramps, tired", moods="calm"))
+        db.add(models.Reminder(user_id=user_id, type="pill", time="08:00", method="email"))
+    db.commit()
+    db.close()
+
+
+def build_app(mode: str, url: str, pool_size: int):
+    """(app, engine) for a mode, with the database dependencies pointed at url."""
+    app = FastAPI()
+    if mode == "sync":
+        bind = configure_sqlite(create_engine(url, connect_args={"check_same_thread": False},
+                                              pool_size=pool_size, max_overflow=0))
+        Session = sessionmaker(bind=bind, autoflush=False)
+
+        def override():
+            db = Session()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.include_router(sync_router, prefix="/api")
+        app.dependency_overrides[get_db] = override
+    else:
+        bind = create_async_engine(async_database_url(url), pool_size=pool_size, max_overflow=0)
+        configure_sqlite(bind.sync_engine)
+        AsyncSession = async_sessionmaker(bind=bind, autoflush=False, expire_on_commit=False)
+
+        async def override():
+            async with AsyncSession() as db:
+                yield db
+
+        app.include_router(routers.router, prefix="/api")
+        app.dependency_overrides[get_async_db] = override
+        app.dependency_overrides[get_async_read_db] = override
+    return app, bind
+
+
+async def drive(app, users: int, concurrency: int, seconds: float) -> Dict[str, Any]:
+    tokens = {user_id: auth.create_access_token({"sub": f"bench{user_id}@example.com"}, timedelta(hours=1))
+              for user_id in range(1, users + 1)}
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+
+    async def client_loop(client: httpx.AsyncClient, rng: random.Random):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            headers = {"Authorization": f"Bearer {tokens[rng.randint(1, users)]}"}
+            start = time.perf_counter()
+            try:
+                response = await client.get(rng.choice(PATHS), headers=headers)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client, random.Random(i)) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    ms = np.asarray(latencies) * 1000
+    return {
+        "seconds": round(elapsed, 2),
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2) if ms.size else None,
+        "p99_ms": round(float(np.percentile(ms, 99)), 2) if ms.size else None,
+    }
+
+
+def run_mode(mode: str, url: str, users: int, concurrency: int, seconds: float, pool_size: int) -> Dict[str, Any]:
+    app, bind = build_app(mode, url, pool_size)
+
+    async def run():
+        try:
+            if mode == "async":
+                await warm_async_engine(bind)  # as main.py does at startup
+            return await drive(app, users, concurrency, seconds)
+        finally:
+            if mode == "async":
+                await bind.dispose()
+
+    result = asyncio.run(run())
+    if mode == "sync":
+        bind.dispose()
+    return {"mode": mode, **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sync vs async data-API handlers under high concurrency.")
+    parser.add_argument("--modes", nargs="+", default=["sync", "async"], choices=["sync", "async"])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--cycles", type=int, default=24, help="Seeded cycles per user")
+    parser.add_argument("--concurrency", type=int, default=200, help="Concurrent clients")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--pool-size", type=int, help="Connection pool size for both engines (default: --concurrency)")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+    args.pool_size = args.pool_size or args.concurrency
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        seed_engine = create_engine(url)
+        Base.metadata.create_all(seed_engine)
+        seed(sessionmaker(bind=seed_engine), args.users, args.cycles)
+        seed_engine.dispose()
+
+        for mode in args.modes:
+            result = run_mode(mode, url, args.users, args.concurrency, args.seconds, args.pool_size)
+            results.append(result)
+            print(f"{mode:>6}: {result['requests_per_s']} req/s  p50={result['p50_ms']}ms "
+                  f"p99={result['p99_ms']}ms errors={result['errors']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+        print(f"\n✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+bench_memory.py
+Recall/latency benchmark for memory retrieval index types.
+
+For each corpus size, builds every index kind the memory store can choose
+(flat, HNSW, IVF) in every vector encoding (float32, float16, int8, PQ) over
+a synthetic clustered corpus and reports build time, bytes per vector,
+recall@k against exact search, and p50/p99 single-query latency, with and
+without re-ranking against the exact vectors.
+
+Usage:
+    python bench_memory.py --sizes 1000 100000 1000000 --dim 768
+    python bench_memory.py --sizes 100000 --ef-search 32 64 128 --nprobe 8 16 32
+    python bench_memory.py --sizes 100000 --kinds flat --encodings float32 int8 pq --rerank
+
+Note: 1M vectors at 768 dims is ~3 GB per copy; use a smaller --dim on
+machines with less than ~10 GB of free memory.
+"""
+
+import argparse
+import time
+from typing import Dict, Any, List
+import faiss
+import numpy as np
+from vector_store import (
+    create_index, set_search_params, choose_index_kind, exact_distances, bytes_per_code, normalize,
+    INDEX_KINDS, ENCODINGS, METRIC, MEMORY_RERANK_FACTOR,
+)
+
+
+def synthetic_corpus(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Unit-norm Gaussian-mixture vectors, roughly like topic-clustered chat embeddings."""
+    rng = np.random.default_rng(seed)
+    n_clusters = max(1, int(np.sqrt(n)))
+    centers = rng.standard_normal((n_clusters, dim)).astype("float32")
+    assignments = rng.integers(0, n_clusters, size=n)
+    corpus = np.empty((n, dim), dtype="float32")
+    for start in range(0, n, 100000):
+        chunk = assignments[start:start + 100000]
+        corpus[start:start + len(chunk)] = normalize(centers[chunk] + 0.5 * rng.standard_normal((len(chunk), dim)).astype("float32"))
+    return corpus
+
+
+def synthetic_queries(corpus: np.ndarray, n_queries: int, seed: int = 1) -> np.ndarray:
+    """Queries are perturbed corpus points, like a user repeating a past topic."""
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(corpus), size=n_queries)
+    # Same noise-to-signal ratio as 0.3 * N(0, 1) against the unnormalized corpus
+    scale = 0.3 / np.sqrt(1.25 * corpus.shape[1])
+    return normalize(corpus[picks] + scale * rng.standard_normal((n_queries, corpus.shape[1])).astype("float32"))
+
+
+def exact_neighbors(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    index = faiss.IndexFlat(corpus.shape[1], METRIC)
+    index.add(corpus)
+    _, I = index.search(queries, k)
+    return I
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def measure_queries(index: faiss.Index, queries: np.ndarray, k: int, corpus: np.ndarray = None):
+    """
+    Run queries one at a time (as chat requests do) and time each. When
+    corpus is given, over-fetch and re-rank against the exact vectors, as
+    the store does against stored embeddings with MEMORY_RERANK.
+    """
+    found = np.full((len(queries), k), -1, dtype="int64")
+    latencies = np.empty(len(queries))
+    fetch = k * MEMORY_RERANK_FACTOR if corpus is not None else k
+    for row, query in enumerate(queries):
+        start = time.perf_counter()
+        _, I = index.search(query.reshape(1, -1), fetch)
+        candidates = I[0][I[0] >= 0]
+        if corpus is not None:
+            distances = exact_distances(query, corpus[candidates])
+            order = np.argsort(-distances if METRIC == faiss.METRIC_INNER_PRODUCT else distances)
+            candidates = candidates[order]
+        latencies[row] = time.perf_counter() - start
+        found[row, :min(k, len(candidates))] = candidates[:k]
+    return found, latencies
+
+
+def bench_index(kind: str, corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int = 5,
+                ef_search: int = None, nprobe: int = None, encoding: str = "float32",
+                rerank: bool = False) -> Dict[str, Any]:
+    ids = np.arange(len(corpus), dtype="int64")
+    start = time.perf_counter()
+    index = create_index(corpus.shape[1], kind, training_vectors=corpus, encoding=encoding)
+    index.add_with_ids(corpus, ids)
+    build_seconds = time.perf_counter() - start
+    set_search_params(index, kind, ef_search=ef_search, nprobe=nprobe)
+
+    found, latencies = measure_queries(index, queries, k, corpus=corpus if rerank else None)
+    result = {
+        "kind": kind,
+        "encoding": encoding,
+        "rerank": rerank,
+        "n": len(corpus),
+        "dim": corpus.shape[1],
+        "bytes_per_vector": bytes_per_code(corpus.shape[1], encoding),
+        "build_s": round(build_seconds, 3),
+        f"recall@{k}": round(recall_at_k(found, truth), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+    }
+    if kind == "hnsw":
+        result["efSearch"] = ef_search
+    elif kind == "ivf":
+        result["nprobe"] = nprobe
+    return result
+
+
+def run(sizes: List[int], dim: int, n_queries: int, k: int, kinds: List[str],
+        ef_search: List[int], nprobe: List[int], encodings: List[str] = ("float32",),
+        rerank: bool = False) -> List[Dict[str, Any]]:
+    results = []
+    for n in sizes:
+        corpus = synthetic_corpus(n, dim)
+        queries = synthetic_queries(corpus, n_queries)
+        truth = exact_neighbors(corpus, queries, k)
+        print(f"\nn={n} dim={dim} (store would choose: {choose_index_kind(n)})")
+        for kind in kinds:
+            if kind == "ivf" and n < 1000:
+                continue  # Too few points to train IVF centroids meaningfully
+            sweep = ef_search if kind == "hnsw" else nprobe if kind == "ivf" else [None]
+            for encoding in encodings:
+                if encoding == "pq" and n < 39 * 256:
+                    continue  # Too few points to train 256 PQ centroids
+                for value in sweep:
+                    params = {"ef_search": value} if kind == "hnsw" else {"nprobe": value} if kind == "ivf" else {}
+                    for with_rerank in ([False, True] if rerank and encoding != "float32" else [False]):
+                        result = bench_index(kind, corpus, queries, truth, k=k, encoding=encoding,
+                                             rerank=with_rerank, **params)
+                        results.append(result)
+                        print("  " + "  ".join(f"{key}={val}" for key, val in result.items() if key not in ("n", "dim")))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark memory retrieval index types.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--kinds", nargs="+", default=INDEX_KINDS, choices=INDEX_KINDS)
+    parser.add_argument("--encodings", nargs="+", default=ENCODINGS, choices=ENCODINGS)
+    parser.add_argument("--rerank", action="store_true", help="Also measure compressed encodings with exact re-ranking")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[None], help="HNSW efSearch values to sweep")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[None], help="IVF nprobe values to sweep")
+    args = parser.parse_args()
+    run(args.sizes, args.dim, args.queries, args.k, args.kinds, args.ef_search, args.nprobe,
+        encodings=args.encodings, rerank=args.rerank)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+bench_memory_suite.py
+End-to-end cost benchmark for the memory subsystem.
+
+Generates a synthetic interaction history per user, embeds it with an
+offline embedder (the deterministic test backend by default, or the local
+hashing backend) and, for every index kind and vector encoding, measures:
+
+- embed throughput (texts/s) for the user corpora and for single queries
+- index build time per user
+- incremental add latency (one interaction at a time, as log_interaction does)
+- query latency p50/p99 and recall@k against exact search
+- resident memory (RSS) added by holding every user's index
+
+Results are written as JSON so runs can be diffed across commits/machines.
+
+Usage:
+    python bench_memory_suite.py --users 20 --sizes 500 5000 --output bench_results.json
+    python bench_memory_suite.py --embedder local --dim 256 --kinds flat hnsw --encodings float32 int8
+"""
+
+import argparse
+import gc
+import json
+import platform
+import random
+import resource
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+import faiss
+import numpy as np
+from bench_memory import exact_neighbors, recall_at_k
+from embeddings import DeterministicEmbedder, HashingEmbedder, Embedder
+from vector_store import (
+    create_index, set_search_params, choose_index_kind, effective_encoding, format_interaction, normalize,
+    INDEX_KINDS, ENCODINGS, ENCODING_MIN_TRAIN,
+)
+
+SUITE_EMBEDDERS = {"test": DeterministicEmbedder, "local": HashingEmbedder}
+
+_SYMPTOMS = ["cramps", "headache", "bloating", "fatigue", "back pain", "acne", "mood swings",
+             "nausea", "tender breasts", "insomnia", "cravings", "spotting", "dizziness"]
+_CONTEXTS = ["since this morning", "after my workout", "for three days", "at night", "before my period",
+             "during work", "after coffee", "when I'm stressed", "on and off all week"]
+_ADVICE = ["Try a heating pad and gentle stretching.", "Stay hydrated and rest if you can.",
+           "Ibuprofen taken with food may help.", "Track it for a few cycles and see a doctor if it persists.",
+           "Light exercise and magnesium-rich foods can ease this.", "Aim for regular sleep this week."]
+
+
+def synthetic_interactions(n: int, seed: int) -> List[str]:
+    """A user's chat history: symptom reports with advice, in the stored text format."""
+    rng = random.Random(seed)
+    return [
+        format_interaction(
+            f"I have {rng.choice(_SYMPTOMS)} and {rng.choice(_SYMPTOMS)} {rng.choice(_CONTEXTS)}",
+            rng.choice(_ADVICE),
+        )
+        for _ in range(n)
+    ]
+
+
+def synthetic_query_texts(n: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    return [f"{rng.choice(_SYMPTOMS)} {rng.choice(_CONTEXTS)}" for _ in range(n)]
+
+
+def rss_bytes() -> int:
+    """Current resident set size (falls back to peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentiles_ms(seconds: List[float]) -> Dict[str, float]:
+    values = np.asarray(seconds) * 1000
+    return {"p50_ms": round(float(np.percentile(values, 50)), 4), "p99_ms": round(float(np.percentile(values, 99)), 4)}
+
+
+def embed_corpora(embedder: Embedder, users: int, size: int, n_queries: int, adds: int) -> Dict[str, Any]:
+    """Embed every user's history, incremental-add texts and queries; time corpus and query embedding."""
+    corpora, extra, queries = [], [], []
+    texts_embedded = 0
+    start = time.perf_counter()
+    for user in range(users):
+        texts = synthetic_interactions(size + adds, seed=user)
+        vectors = normalize(embedder.embed(texts))
+        corpora.append(vectors[:size])
+        extra.append(vectors[size:])
+        texts_embedded += len(texts)
+    corpus_seconds = time.perf_counter() - start
+
+    query_latencies = []
+    for user in range(users):
+        user_queries = []
+        for text in synthetic_query_texts(n_queries, seed=10_000 + user):
+            t = time.perf_counter()
+            user_queries.append(embedder.embed([text])[0])
+            query_latencies.append(time.perf_counter() - t)
+        queries.append(normalize(np.vstack(user_queries)))
+
+    return {
+        "corpora": corpora,
+        "extra": extra,
+        "queries": queries,
+        "stats": {
+            "embed_texts_per_s": round(texts_embedded / corpus_seconds, 1) if corpus_seconds > 0 else None,
+            "query_embed": percentiles_ms(query_latencies),
+        },
+    }
+
+
+def bench_config(kind: str, encoding: str, data: Dict[str, Any], k: int) -> Dict[str, Any]:
+    """Build, grow and query every user's index of one kind/encoding."""
+    gc.collect()
+    rss_before = rss_bytes()
+    indexes, build_seconds, add_latencies, query_latencies, recalls = [], [], [], [], []
+
+    for corpus, extra, queries in zip(data["corpora"], data["extra"], data["queries"]):
+        ids = np.arange(len(corpus), dtype="int64")
+        start = time.perf_counter()
+        index = create_index(corpus.shape[1], kind, training_vectors=corpus, encoding=encoding)
+        index.add_with_ids(corpus, ids)
+        build_seconds.append(time.perf_counter() - start)
+        set_search_params(index, kind)
+
+        for offset, vector in enumerate(extra):
+            t = time.perf_counter()
+            index.add_with_ids(vector.reshape(1, -1), np.array([len(corpus) + offset], dtype="int64"))
+            add_latencies.append(time.perf_counter() - t)
+
+        found = np.full((len(queries), k), -1, dtype="int64")
+        for row, query in enumerate(queries):
+            t = time.perf_counter()
+            _, I = index.search(query.reshape(1, -1), k)
+            query_latencies.append(time.perf_counter() - t)
+            found[row] = I[0]
+        full = np.vstack([corpus, extra]) if len(extra) else corpus
+        recalls.append(recall_at_k(found, exact_neighbors(full, queries, k)))
+        indexes.append(index)
+
+    rss_after = rss_bytes()
+    result = {
+        "kind": kind,
+        "encoding": encoding,
+        "build_ms_per_user": round(1000 * float(np.mean(build_seconds)), 3),
+        "build_s_total": round(float(np.sum(build_seconds)), 3),
+        "add": percentiles_ms(add_latencies) if add_latencies else None,
+        "query": percentiles_ms(query_latencies),
+        f"recall@{k}": round(float(np.mean(recalls)), 4),
+        "rss_delta_bytes": max(0, rss_after - rss_before),
+    }
+    del indexes
+    return result
+
+
+def run(users: int, sizes: List[int], embedder: Embedder, kinds: List[str], encodings: List[str],
+        n_queries: int = 50, adds: int = 20, k: int = 5) -> Dict[str, Any]:
+    runs = []
+    for size in sizes:
+        data = embed_corpora(embedder, users, size, n_queries, adds)
+        print(f"\n{users} users x {size} interactions (store would choose {choose_index_kind(size)}/"
+              f"{effective_encoding(size)}): {data['stats']['embed_texts_per_s']} texts/s embedded")
+        configs = []
+        for kind in kinds:
+            if kind == "ivf" and size < 1000:
+                continue  # Too few points to train IVF centroids meaningfully
+            for encoding in encodings:
+                if size < ENCODING_MIN_TRAIN[encoding]:
+                    continue  # Too few points to train this encoding
+                result = bench_config(kind, encoding, data, k)
+                configs.append(result)
+                print("  " + "  ".join(f"{key}={val}" for key, val in result.items()))
+        runs.append({"users": users, "interactions_per_user": size, **data["stats"], "configs": configs})
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "embedder": {"backend": embedder.backend, "model": embedder.model_name, "dim": embedder.dim},
+            "faiss_version": faiss.__version__,
+            "numpy_version": np.__version__,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "queries_per_user": n_queries,
+            "adds_per_user": adds,
+            "k": k,
+        },
+        "runs": runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark memory subsystem cost per index kind and encoding.")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 2000, 20000], help="Interactions per user")
+    parser.add_argument("--embedder", default="test", choices=list(SUITE_EMBEDDERS))
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=50, help="Queries per user")
+    parser.add_argument("--adds", type=int, default=20, help="Incremental adds per user after the build")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--kinds", nargs="+", default=INDEX_KINDS, choices=INDEX_KINDS)
+    parser.add_argument("--encodings", nargs="+", default=ENCODINGS, choices=ENCODINGS)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    embedder = SUITE_EMBEDDERS[args.embedder](dim=args.dim)
+    try:
+        results = run(args.users, args.sizes, embedder, args.kinds, args.encodings,
+                      n_queries=args.queries, adds=args.adds, k=args.k)
+    finally:
+        if hasattr(embedder, "close"):
+            embedder.close()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+bench_sqlite.py
+Mixed read/write chat-traffic benchmark for the SQLite pragma profiles.
+
+Seeds a fresh database per profile (users with cycles and interaction
+history), then runs concurrent "chat" traffic for a fixed duration: reads
+do what a chat request does before calling the model (latest cycle for the
+phase, recent interactions, keyword memory search) and writes log an
+interaction with its embedding and commit. Reports throughput, read/write
+p50/p99 latency and lock errors for each profile.
+
+Usage:
+    python bench_sqlite.py --profiles default production --threads 8 --seconds 10
+    python bench_sqlite.py --write-ratio 0.5 --output sqlite_bench.json
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from database import Base, PRAGMA_PROFILES, configure_sqlite, sqlite_pragmas
+from lexical_index import bm25_search
+import models
+
+_WORDS = ["cramps", "headache", "tired", "bloated", "sleep", "period", "late", "mood", "stress", "water",
+          "exercise", "pain", "heating", "pad", "tea", "work", "anxious", "craving", "chocolate", "back"]
+
+
+def _sentence(rng: random.Random, n: int = 12) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(n))
+
+
+def seed(Session, users: int, history: int, dim: int):
+    rng = random.Random(0)
+    db = Session()
+    now = datetime.utcnow()
+    for user_id in range(1, users + 1):
+        db.add(models.User(id=user_id, email=f"bench{user_id}@example.com"))
+        for months_ago in range(6):
+            db.add(models.Cycle(user_id=user_id, start_date=now - timedelta(days=28 * months_ago + 3),
+                                symptoms=_sentence(rng, 3), moods=_sentence(rng, 2)))
+        for n in range(history):
+            interaction = models.Interaction(user_id=user_id, message=_sentence(rng), response=_sentence(rng, 40),
+                                             timestamp=now - timedelta(hours=history - n))
+            interaction.embedding = models.InteractionEmbedding(model="bench", dim=dim, vector=os.urandom(dim * 4))
+            db.add(interaction)
+        db.commit()
+    db.close()
+
+
+def chat_read(db, user_id: int, rng: random.Random):
+    db.query(models.Cycle).filter(models.Cycle.user_id == user_id).order_by(models.Cycle.start_date.desc()).first()
+    db.query(models.Interaction).filter(models.Interaction.user_id == user_id) \
+        .order_by(models.Interaction.timestamp.desc()).limit(20).all()
+    bm25_search(db, user_id, _sentence(rng, 3), k=20)
+
+
+def chat_write(db, user_id: int, rng: random.Random, dim: int):
+    interaction = models.Interaction(user_id=user_id, message=_sentence(rng), response=_sentence(rng, 40),
+                                     timestamp=datetime.utcnow())
+    interaction.embedding = models.InteractionEmbedding(model="bench", dim=dim, vector=os.urandom(dim * 4))
+    db.add(interaction)
+    db.commit()
+
+
+def run_profile(profile: str, users: int, history: int, threads: int, seconds: float,
+                write_ratio: float, dim: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                               connect_args={"check_same_thread": False}, pool_size=threads, max_overflow=0)
+        configure_sqlite(engine, profile)
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine, autoflush=False)
+        seed(Session, users, history, dim)
+
+        latencies: Dict[str, List[float]] = {"read": [], "write": []}
+        errors = {"read": 0, "write": 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def worker(seed_value: int):
+            rng = random.Random(seed_value)
+            db = Session()
+            local = {"read": [], "write": []}
+            local_errors = {"read": 0, "write": 0}
+            while time.perf_counter() < deadline:
+                user_id = rng.randint(1, users)
+                kind = "write" if rng.random() < write_ratio else "read"
+                start = time.perf_counter()
+                try:
+                    if kind == "write":
+                        chat_write(db, user_id, rng, dim)
+                    else:
+                        chat_read(db, user_id, rng)
+                    local[kind].append(time.perf_counter() - start)
+                except OperationalError:
+                    db.rollback()
+                    local_errors[kind] += 1
+            db.close()
+            with lock:
+                for key in latencies:
+                    latencies[key].extend(local[key])
+                    errors[key] += local_errors[key]
+
+        pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        started = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        engine.dispose()
+
+    result = {"profile": profile, "pragmas": sqlite_pragmas(profile), "seconds": round(elapsed, 2),
+              "ops_per_s": round(sum(len(v) for v in latencies.values()) / elapsed, 1)}
+    for kind, values in latencies.items():
+        ms = np.asarray(values) * 1000
+        result[kind] = {
+            "ops": len(values),
+            "errors": errors[kind],
+            "p50_ms": round(float(np.percentile(ms, 50)), 3) if ms.size else None,
+            "p99_ms": round(float(np.percentile(ms, 99)), 3) if ms.size else None,
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SQLite pragma profiles under mixed chat traffic.")
+    parser.add_argument("--profiles", nargs="+", default=list(PRAGMA_PROFILES), choices=list(PRAGMA_PROFILES))
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--history", type=int, default=200, help="Seeded interactions per user")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.25, help="Fraction of operations that are writes")
+    parser.add_argument("--dim", type=int, default=768, help="Embedding size stored per written interaction")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = []
+    for profile in args.profiles:
+        result = run_profile(profile, args.users, args.history, args.threads, args.seconds, args.write_ratio, args.dim)
+        results.append(result)
+        print(f"{profile:>10}: {result['ops_per_s']} ops/s  "
+              f"read p50={result['read']['p50_ms']}ms p99={result['read']['p99_ms']}ms errors={result['read']['errors']}  "
+              f"write p50={result['write']['p50_ms']}ms p99={result['write']['p99_ms']}ms errors={result['write']['errors']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+        print(f"\n✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+cycle_import.py
+Streaming bulk import of cycle history exported from other tracking apps.
+
+Accepts CSV (with a header row) or JSON (an array of objects, or one
+object per line). The upload is parsed incrementally as chunks arrive, so
+a large export is never held in memory. Each row is validated on its own
+(bad rows are counted and reported, not fatal), deduplicated against the
+user's existing period start dates and the rest of the file, and inserted
+in batches of IMPORT_BATCH_SIZE rows: one executemany INSERT for the
+cycles and one for their symptom events per transaction (through the
+group-commit writer when called from the API). The user's
+cycle stats are rebuilt once at the end, or after the last committed batch
+if the upload turns out to be malformed partway through.
+
+Recognized columns (case-insensitive): start_date / date / period_start,
+symptoms / notes, moods / mood.
+
+Usage:
+    python cycle_import.py --email user@example.com --file clue_export.csv
+    python cycle_import.py --email user@example.com --file flo_export.json --format json
+"""
+
+import argparse
+import codecs
+import csv
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from cycles import rebuild_user_stats
+from database import SessionLocal
+from symptom_extraction import cycle_event_rows, cycle_tags
+import models
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))  # Rows per INSERT transaction
+IMPORT_MAX_ERRORS = 50  # Row errors included in the summary
+IMPORT_MAX_OBJECT_CHARS = 1 << 20  # A single JSON record larger than this is rejected
+
+FIELD_ALIASES = {
+    "start_date": ["start_date", "date", "period_start", "period_start_date", "cycle_start", "start"],
+    "symptoms": ["symptoms", "symptom", "notes", "note"],
+    "moods": ["moods", "mood", "feelings"],
+}
+DATE_FORMATS = ["%m/%d/%Y", "%d.%m.%Y", "%Y/%m/%d", "%d-%m-%Y"]
+EARLIEST_DATE = datetime(1950, 1, 1)
+
+
+class CycleImportError(ValueError):
+    """The upload as a whole can't be imported (unknown format, missing date column, malformed JSON)."""
+
+
+# --- Incremental parsers: feed(bytes) -> [(row number, record)], close() -> the rest ---
+
+class CSVRecords:
+    def __init__(self, encoding: str = "utf-8"):
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._buffer = ""
+        self._pending = ""
+        self._header: Optional[List[str]] = None
+        self._row = 0
+
+    def feed(self, data: bytes) -> List[Tuple[int, Dict[str, Any]]]:
+        self._buffer += self._decoder.decode(data)
+        *lines, self._buffer = self._buffer.split("\n")
+        return self._records(lines)
+
+    def close(self) -> List[Tuple[int, Dict[str, Any]]]:
+        self._buffer += self._decoder.decode(b"", final=True)
+        lines, self._buffer = ([self._buffer] if self._buffer else []), ""
+        records = self._records(lines)
+        if self._pending:
+            raise CycleImportError(f"Unterminated quoted field starting on row {self._row + 1}")
+        return records
+
+    def _records(self, lines: List[str]) -> List[Tuple[int, Dict[str, Any]]]:
+        records = []
+        for line in lines:
+            # A quoted field may contain newlines: keep joining until the quotes balance
+            self._pending = f"{self._pending}\n{line}" if self._pending else line
+            if self._pending.count('"') % 2:
+                continue
+            text, self._pending = self._pending.rstrip("\r"), ""
+            if not text.strip():
+                continue
+            values = next(csv.reader([text]))
+            if self._header is None:
+                self._header = [name.strip().lstrip("\ufeff").lower() for name in values]
+                continue
+            self._row += 1
+            records.append((self._row, dict(zip(self._header, values))))
+        return records
+
+
+class JSONRecords:
+    def __init__(self, encoding: str = "utf-8"):
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._started = False
+        self._done = False
+        self._row = 0
+
+    def feed(self, data: bytes) -> List[Tuple[int, Dict[str, Any]]]:
+        self._buffer += self._decoder.decode(data)
+        return self._records(final=False)
+
+    def close(self) -> List[Tuple[int, Dict[str, Any]]]:
+        self._buffer += self._decoder.decode(b"", final=True)
+        return self._records(final=True)
+
+    def _records(self, final: bool) -> List[Tuple[int, Dict[str, Any]]]:
+        records = []
+        position = 0
+        buffer = self._buffer
+        while True:
+            while position < len(buffer) and (buffer[position].isspace() or buffer[position] == ","):
+                position += 1
+            if position == len(buffer) or self._done:
+                break
+            if not self._started:
+                self._started = True
+                if buffer[position] == "[":  # A JSON array; otherwise one object per line
+                    position += 1
+                    continue
+            if buffer[position] == "]":
+                self._done = True
+                break
+            try:
+                record, end = self._json.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                if final or len(buffer) - position > IMPORT_MAX_OBJECT_CHARS:
+                    raise CycleImportError(f"Malformed JSON after record {self._row}: {e.msg}")
+                break  # Incomplete record; wait for more data
+            position = end
+            self._row += 1
+            records.append((self._row, record))
+        self._buffer = buffer[position:]
+        return records
+
+
+def parser_for(fmt: Optional[str], content_type: Optional[str] = None, filename: Optional[str] = None):
+    """A CSVRecords or JSONRecords for an explicit format, a Content-Type or a file name."""
+    hint = (fmt or content_type or os.path.splitext(filename or "")[1] or "").lower()
+    if "csv" in hint:
+        return CSVRecords()
+    if "json" in hint:
+        return JSONRecords()
+    raise CycleImportError("Unknown import format; use format=csv or format=json")
+
+
+# --- Validation ---
+
+def _field(record: Dict[str, Any], name: str) -> Any:
+    for alias in FIELD_ALIASES[name]:
+        for key in (alias, alias.title(), alias.upper()):
+            if record.get(key) not in (None, ""):
+                return record[key]
+    return None
+
+
+def _text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(v) for v in value if v) or None
+    return str(value).strip() or None
+
+
+def parse_date(value: Any) -> datetime:
+    if not isinstance(value, str):
+        raise ValueError(f"expected a date string, got {value!r}")
+    value = value.strip()
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        for fmt in DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(value, fmt)
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(f"unrecognized date {value!r}")
+    return parsed.replace(tzinfo=None)
+
+
+def validate(record: Any) -> Dict[str, Any]:
+    """Cycle column values for one record; ValueError if it isn't a usable row."""
+    if not isinstance(record, dict):
+        raise ValueError("expected an object")
+    raw_date = _field(record, "start_date")
+    if raw_date is None:
+        raise ValueError("missing start date")
+    start_date = parse_date(raw_date)
+    if not EARLIEST_DATE <= start_date <= datetime.utcnow() + timedelta(days=1):
+        raise ValueError(f"start date {start_date.date()} out of range")
+    return {"start_date": start_date, "symptoms": _text(_field(record, "symptoms")), "moods": _text(_field(record, "moods"))}
+
+
+# --- Import ---
+
+def existing_start_dates(db: Session, user_id: int) -> Set[date]:
+    return {start.date() for (start,) in db.query(models.Cycle.start_date).filter(models.Cycle.user_id == user_id)}
+
+
+def insert_cycles(session: Session, user_id: int, rows: List[Dict[str, Any]]) -> int:
+    """
+    One executemany INSERT for a batch of validated cycles and one for their
+    symptom events. Does not commit, and may be replayed (DBWriter write op).
+    """
+    if not rows:
+        return 0
+    ids = session.execute(
+        insert(models.Cycle).returning(models.Cycle.id, sort_by_parameter_order=True),
+        [{**values, "user_id": user_id} for values in rows],
+    ).scalars().all()
+    events = [event for cycle_id, values in zip(ids, rows)
+              for event in cycle_event_rows(user_id, cycle_id, values["start_date"], values["tags"])]
+    if events:
+        session.execute(insert(models.SymptomEvent), events)
+    return len(rows)
+
+
+class CycleImport:
+    """
+    Validates and deduplicates one user's imported records into batches for
+    insert_cycles.
+
+    Args:
+        user_id: Owner of the imported cycles
+        existing: Start dates the user already has (see existing_start_dates)
+        batch_size: Rows per INSERT transaction
+    """
+
+    def __init__(self, user_id: int, existing: Iterable[date] = (), batch_size: int = None):
+        self.user_id = user_id
+        self.batch_size = batch_size or IMPORT_BATCH_SIZE
+        self._seen = set(existing)
+        self._batch: List[Dict[str, Any]] = []
+        self._started = time.perf_counter()
+        self.counts = {"received": 0, "inserted": 0, "duplicates": 0, "invalid": 0}
+        self.errors: List[Dict[str, Any]] = []
+
+    def add(self, row: int, record: Any) -> bool:
+        """Validate and queue one record. Returns True once a full batch is ready to take()."""
+        self.counts["received"] += 1
+        try:
+            values = validate(record)
+        except ValueError as e:
+            self.counts["invalid"] += 1
+            if len(self.errors) < IMPORT_MAX_ERRORS:
+                self.errors.append({"row": row, "error": str(e)})
+            return False
+        day = values["start_date"].date()
+        if day in self._seen:
+            self.counts["duplicates"] += 1
+            return False
+        self._seen.add(day)
+        values["tags"] = cycle_tags(values["symptoms"], values["moods"])
+        self._batch.append(values)
+        return len(self._batch) >= self.batch_size
+
+    def take(self) -> List[Dict[str, Any]]:
+        """The queued rows, counted as inserted; pass them to insert_cycles."""
+        batch, self._batch = self._batch, []
+        self.counts["inserted"] += len(batch)
+        return batch
+
+    def summary(self) -> Dict[str, Any]:
+        return {**self.counts, "errors": self.errors, "seconds": round(time.perf_counter() - self._started, 3)}
+
+
+def import_file(db: Session, user_id: int, path: str, fmt: str = None, chunk_size: int = 1 << 16) -> Dict[str, Any]:
+    """
+    Stream an export file into the user's cycles, committing once per batch.
+    Stats are rebuilt at the end, including when the file turns out to be
+    malformed after some batches were already committed.
+    """
+    parser = parser_for(fmt, filename=path)
+    importer = CycleImport(user_id, existing_start_dates(db, user_id))
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                for row, record in parser.feed(chunk) if chunk else parser.close():
+                    if importer.add(row, record):
+                        insert_cycles(db, user_id, importer.take())
+                        db.commit()
+                if not chunk:
+                    break
+        insert_cycles(db, user_id, importer.take())
+        db.commit()
+    finally:
+        if importer.counts["inserted"]:
+            db.rollback()  # Drop a batch left half-written by an error
+            rebuild_user_stats(db, user_id)
+            db.commit()
+    return importer.summary()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import cycle history exported from another tracking app.")
+    parser.add_argument("--email", required=True, help="Account to import into")
+    parser.add_argument("--file", required=True, help="CSV or JSON export")
+    parser.add_argument("--format", choices=["csv", "json"], help="Default: from the file extension")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.email == args.email).first()
+        if user is None:
+            raise SystemExit(f"❌ No user with email {args.email}")
+        summary = import_file(db, user.id, args.file, args.format)
+    except CycleImportError as e:
+        raise SystemExit(f"❌ Import failed: {e}")
+    finally:
+        db.close()
+    print(f"✅ Imported {summary['inserted']} cycles in {summary['seconds']}s "
+          f"({summary['duplicates']} duplicates, {summary['invalid']} invalid rows)")
+    for error in summary["errors"]:
+        print(f"   row {error['row']}: {error['error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+cycles.py
+Cycle phase helpers and per-user cycle statistics for CycleWise backend.
+
+user_cycle_stats keeps one row per user: last period start, running mean
+and variance of cycle length, period length, the current phase with the
+date it ends, and the next-period estimate. log_cycle updates it in the
+same transaction as the insert (record_cycle), so phase and insight reads
+are a primary-key lookup instead of a scan of the user's cycles.
+
+Usage (rebuild every user's row from the cycles table):
+    python cycles.py --rebuild-stats
+"""
+
+import argparse
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy.orm import Session
+from database import SessionLocal
+import models
+
+PHASES = ["menstrual", "follicular", "ovulatory", "luteal"]
+PHASE_LAST_DAY = {"menstrual": 4, "follicular": 13, "ovulatory": 16, "luteal": 28}  # Days since period start
+PHASE_FIRST_DAY = {phase: PHASE_LAST_DAY[PHASES[i - 1]] + 1 if i else 0 for i, phase in enumerate(PHASES)}
+
+
+def phase_for_day(days_since: int) -> str:
+    """Map days since the last period start to a cycle phase."""
+    for phase in PHASES:
+        if days_since <= PHASE_LAST_DAY[phase]:
+            return phase
+    return "unknown"
+
+
+def phase_window(last_start: datetime, at: Optional[datetime] = None) -> Tuple[str, int, Optional[datetime]]:
+    """(phase, days since last_start, start of the next phase) at a point in time (default now)."""
+    days_since = ((at or datetime.utcnow()) - last_start).days
+    phase = phase_for_day(days_since)
+    until = last_start + timedelta(days=PHASE_LAST_DAY[phase] + 1) if phase in PHASE_LAST_DAY else None
+    return phase, days_since, until
+
+
+def current_phase(user_id: int, db: Session, at: Optional[datetime] = None) -> Optional[str]:
+    """
+    The user's cycle phase at a point in time (default now), based on their
+    latest logged cycle start. None if they have no cycle data. The current
+    phase is a primary-key read of user_cycle_stats.
+    """
+    if at is None:
+        stats = db.get(models.UserCycleStats, user_id)
+        return stats_phase(stats)[0] if stats else None
+    last_start = (
+        db.query(models.Cycle.start_date)
+        .filter(models.Cycle.user_id == user_id, models.Cycle.start_date <= at)
+        .order_by(models.Cycle.start_date.desc())
+        .limit(1)
+        .scalar()
+    )
+    if not last_start:
+        return None
+    return phase_for_day((at - last_start).days)
+
+
+# --- Per-user statistics ---
+
+DEFAULT_CYCLE_LENGTH = 28
+MIN_CYCLE_LENGTH, MAX_CYCLE_LENGTH = 15, 60  # Days; longer gaps are most likely unlogged cycles
+
+
+def _refresh_derived(stats: models.UserCycleStats, at: Optional[datetime] = None):
+    stats.phase, _, stats.phase_until = phase_window(stats.last_start, at)
+    stats.next_period = stats.last_start + timedelta(days=round(stats.avg_cycle_length or DEFAULT_CYCLE_LENGTH))
+
+
+def stats_phase(stats: models.UserCycleStats, at: Optional[datetime] = None) -> Tuple[str, int]:
+    """(phase, days since last start) from a stats row; the stored phase while it is still current."""
+    at = at or datetime.utcnow()
+    days_since = (at - stats.last_start).days
+    if stats.phase in PHASE_FIRST_DAY and stats.phase_until is not None \
+            and stats.last_start + timedelta(days=PHASE_FIRST_DAY[stats.phase]) <= at < stats.phase_until:
+        return stats.phase, days_since
+    return phase_for_day(days_since), days_since
+
+
+def stats_summary(stats: models.UserCycleStats, at: Optional[datetime] = None) -> Dict[str, Any]:
+    phase, days_since = stats_phase(stats, at)
+    return {
+        "phase": phase,
+        "days_since": days_since,
+        "avg_cycle_length": round(stats.avg_cycle_length, 1) if stats.avg_cycle_length else None,
+        "next_period": stats.next_period.isoformat() if stats.next_period else None,
+    }
+
+
+def rebuild_user_stats(session: Session, user_id: int) -> Optional[models.UserCycleStats]:
+    """Recompute a user's row from all their cycles (None, and no row, if they have none). Doesn't commit."""
+    starts = [start for (start,) in session.query(models.Cycle.start_date)
+              .filter(models.Cycle.user_id == user_id).order_by(models.Cycle.start_date)]
+    stats = session.get(models.UserCycleStats, user_id)
+    if not starts:
+        if stats is not None:
+            session.delete(stats)
+        return None
+    if stats is None:
+        stats = models.UserCycleStats(user_id=user_id)
+        session.add(stats)
+    lengths = [(b - a).days for a, b in zip(starts, starts[1:])]
+    lengths = [n for n in lengths if MIN_CYCLE_LENGTH <= n <= MAX_CYCLE_LENGTH]
+    mean = sum(lengths) / len(lengths) if lengths else None
+    stats.last_start = starts[-1]
+    stats.cycle_count = len(starts)
+    stats.length_count = len(lengths)
+    stats.avg_cycle_length = mean
+    stats.cycle_length_variance = sum((n - mean) ** 2 for n in lengths) / len(lengths) if lengths else None
+    # A column read, not the User entity: migrations run this before later users columns exist
+    stats.avg_period_length = session.query(models.User.period_duration).filter(models.User.id == user_id).scalar()
+    _refresh_derived(stats)
+    return stats
+
+
+def record_cycle(session: Session, cycle: models.Cycle) -> Optional[models.UserCycleStats]:
+    """
+    Update the user's stats for a newly flushed cycle (in the same
+    transaction). A cycle after the latest start extends the running mean
+    and variance (Welford); a first or back-dated cycle triggers a rebuild.
+    """
+    stats = session.get(models.UserCycleStats, cycle.user_id)
+    if stats is None or cycle.start_date <= stats.last_start:
+        return rebuild_user_stats(session, cycle.user_id)
+    length = (cycle.start_date - stats.last_start).days
+    if MIN_CYCLE_LENGTH <= length <= MAX_CYCLE_LENGTH:
+        n = stats.length_count + 1
+        mean = stats.avg_cycle_length or 0.0
+        m2 = (stats.cycle_length_variance or 0.0) * stats.length_count
+        delta = length - mean
+        mean += delta / n
+        m2 += delta * (length - mean)
+        stats.length_count, stats.avg_cycle_length, stats.cycle_length_variance = n, mean, m2 / n
+    stats.cycle_count += 1
+    stats.last_start = cycle.start_date
+    _refresh_derived(stats)
+    return stats
+
+
+def rebuild_stats_chunk(db: Session, after_id: int = 0, limit: int = 500) -> Optional[int]:
+    """Rebuild stats for up to `limit` users with id > after_id, without committing. Returns the last id, or None when done."""
+    user_ids = [user_id for (user_id,) in db.query(models.User.id).filter(models.User.id > after_id)
+                .order_by(models.User.id).limit(limit)]
+    if not user_ids:
+        return None
+    for user_id in user_ids:
+        rebuild_user_stats(db, user_id)
+    return user_ids[-1]
+
+
+def rebuild_all_stats(db: Session, batch_size: int = 500) -> int:
+    """Rebuild every user's stats, committing per batch of users. Returns users with stats."""
+    last_id = 0
+    while last_id is not None:
+        last_id = rebuild_stats_chunk(db, last_id, batch_size)
+        db.commit()
+    return db.query(models.UserCycleStats).count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-user cycle statistics.")
+    parser.add_argument("--rebuild-stats", action="store_true", help="Rebuild user_cycle_stats from the cycles table")
+    parser.add_argument("--batch-size", type=int, default=500, help="Users per commit")
+    args = parser.parse_args()
+    if not args.rebuild_stats:
+        parser.print_help()
+        return
+    db = SessionLocal()
+    try:
+        print(f"✅ Rebuilt cycle stats for {rebuild_all_stats(db, args.batch_size)} users.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
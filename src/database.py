@@ -1,22 +1,265 @@
 """
 database.py
 Sets up SQLAlchemy engine, session, and base.
+
+SQLite connections get a pragma profile (SQLITE_PROFILE, default
+"production": WAL journal, synchronous=NORMAL, busy timeout, larger page
+cache, mmap and in-memory temp tables) applied as each connection opens.
+start_sqlite_maintenance() runs PRAGMA optimize and a WAL checkpoint
+periodically in the background.
+
+Async route handlers use get_async_db(), backed by an async engine on the
+same database (DATABASE_URL with its async driver: aiosqlite for SQLite,
+asyncpg for PostgreSQL), created on first use.
+
+Read-only GET handlers use get_read_db() / get_async_read_db(), which go
+to READ_DATABASE_URL: a replica for server databases, or by default a
+read-only URI connection to the same SQLite file. A client that has just
+written (see mark_write) reads from the primary for
+READ_YOUR_WRITES_SECONDS, so it sees its own writes despite replica lag.
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional
+from fastapi import Request
+
+logger = logging.getLogger(__name__)
 
 # Use DATABASE_URL from .env or default to local SQLite
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./cyclewise.db")
 
+# SQLite pragma profiles; individual values can be overridden with SQLITE_<PRAGMA>
+PRAGMA_PROFILES = {
+    "default": {},  # SQLite's built-in settings (rollback journal, synchronous=FULL)
+    "production": {
+        "journal_mode": "WAL",  # Readers don't block the writer and vice versa
+        "synchronous": "NORMAL",  # Durable at checkpoints; safe with WAL
+        "busy_timeout": 5000,  # ms to wait for a lock before "database is locked"
+        "cache_size": -65536,  # Negative = KiB, i.e. 64 MiB page cache per connection
+        "mmap_size": 268435456,  # 256 MiB memory-mapped I/O
+        "temp_store": "MEMORY",
+    },
+}
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "production")
+# Pragmas that write to the database file; skipped on read-only connections (mode=ro)
+WRITE_PRAGMAS = ("journal_mode",)
+SQLITE_MAINTENANCE_INTERVAL = float(os.getenv("SQLITE_MAINTENANCE_INTERVAL", "600"))  # seconds
+
+
+def sqlite_pragmas(profile: str = None, read_only: bool = False) -> dict:
+    """The pragmas for a profile, with SQLITE_<PRAGMA> environment overrides applied (minus WRITE_PRAGMAS if read_only)."""
+    profile = profile or SQLITE_PROFILE
+    if profile not in PRAGMA_PROFILES:
+        raise ValueError(f"Unknown SQLITE_PROFILE '{profile}'. Choose from {list(PRAGMA_PROFILES)}.")
+    pragmas = dict(PRAGMA_PROFILES[profile])
+    for name in PRAGMA_PROFILES["production"]:
+        override = os.getenv(f"SQLITE_{name.upper()}")
+        if override is not None:
+            pragmas[name] = override
+    if read_only:
+        for name in WRITE_PRAGMAS:
+            pragmas.pop(name, None)
+    return pragmas
+
+
+def configure_sqlite(engine, profile: str = None, read_only: bool = False):
+    """Apply a pragma profile to every new connection of a SQLite engine (no-op otherwise).
+
+    Read-only engines skip WRITE_PRAGMAS: switching a file that isn't in WAL
+    mode yet to WAL is a write, which a mode=ro connection can't do.
+    """
+    if engine.dialect.name != "sqlite":
+        return engine
+    pragmas = sqlite_pragmas(profile, read_only)
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    return engine
+
+
+def run_sqlite_maintenance(engine):
+    """Refresh query planner statistics and checkpoint the WAL into the main file."""
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.connect() as connection:
+        connection.exec_driver_sql("PRAGMA optimize")
+        connection.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)")
+
+
+def start_sqlite_maintenance(engine, interval: float = None) -> threading.Event:
+    """Run run_sqlite_maintenance every `interval` seconds on a daemon thread; set the returned event to stop."""
+    interval = SQLITE_MAINTENANCE_INTERVAL if interval is None else interval
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            try:
+                run_sqlite_maintenance(engine)
+            except Exception as e:
+                logger.warning(f"SQLite maintenance failed: {e}")
+
+    threading.Thread(target=loop, name="sqlite-maintenance", daemon=True).start()
+    return stop
+
+
+def read_only_sqlite_url(url: str) -> Optional[str]:
+    """A read-only URI connection URL for a SQLite database file; None for other or in-memory databases."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:") or parsed.database.startswith("file:"):
+        return None
+    return f"{parsed.drivername}:///file:{parsed.database}?mode=ro&uri=true"
+
+
+# Read engine for GET handlers; the primary itself if there is nothing separate to read from
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL") or read_only_sqlite_url(DATABASE_URL) or DATABASE_URL
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+READ_METHODS = ("GET", "HEAD")
+
 # SQLite-specific connection args
 connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
 
 # Set up engine and session
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+engine = configure_sqlite(create_engine(DATABASE_URL, connect_args=connect_args))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+if READ_DATABASE_URL == DATABASE_URL:
+    read_engine = engine
+else:
+    read_engine = configure_sqlite(create_engine(
+        READ_DATABASE_URL, connect_args={"check_same_thread": False} if READ_DATABASE_URL.startswith("sqlite") else {}
+    ), read_only=True)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Async engines and sessions (async route handlers)
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def async_database_url(url: str) -> str:
+    """The async-driver form of a database URL, e.g. sqlite:///x.db -> sqlite+aiosqlite:///x.db."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{backend}' databases. Supported: {list(ASYNC_DRIVERS)}.")
+    if parsed.get_driver_name() in ("aiosqlite", "asyncpg"):
+        return url
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
+_async_engines: Dict[str, AsyncEngine] = {}
+_async_engines_lock = threading.Lock()
+
+
+def get_async_engine(read: bool = False) -> AsyncEngine:
+    """The shared async engine for the primary (or read) database, with the same SQLite pragma profile."""
+    url = READ_DATABASE_URL if read else DATABASE_URL
+    with _async_engines_lock:
+        async_engine = _async_engines.get(url)
+        if async_engine is None:
+            async_engine = _async_engines[url] = create_async_engine(async_database_url(url))
+            configure_sqlite(async_engine.sync_engine, read_only=url != DATABASE_URL)
+        return async_engine
+
+
+async def warm_async_engine(async_engine: AsyncEngine):
+    """
+    Open one connection (and return it to the pool) before serving traffic.
+
+    SQLAlchemy runs a pool's first "connect" event (our pragmas) under an
+    asyncio lock, and every connection opened while that first one is still
+    being set up queues on the lock too. On a cold pool hit by a burst of
+    requests, each of those connections then waits for its predecessors'
+    pragma round trips on the busy event loop: bench_async_api.py saw ~1% of
+    requests stall for the whole 4 s run (p99 ~4100 ms). Once one connection
+    has been set up, later connects skip the lock.
+    """
+    async with async_engine.connect():
+        pass
+
+
+async def warm_async_engines():
+    """warm_async_engine for the primary and read async engines."""
+    for async_engine in {get_async_engine(), get_async_engine(read=True)}:
+        await warm_async_engine(async_engine)
+
+
+async def dispose_async_engines():
+    with _async_engines_lock:
+        async_engines = list(_async_engines.values())
+        _async_engines.clear()
+    for async_engine in async_engines:
+        await async_engine.dispose()
+
+
+# Read-your-writes: clients (by Authorization header) that wrote recently read from the primary
+_recent_writes: Dict[str, float] = {}
+_recent_writes_lock = threading.Lock()
+
+
+def client_key(request: Request) -> Optional[str]:
+    return request.headers.get("authorization")
+
+
+def mark_write(key: Optional[str]):
+    """Pin a client's reads to the primary for READ_YOUR_WRITES_SECONDS."""
+    if not key:
+        return
+    now = time.monotonic()
+    with _recent_writes_lock:
+        _recent_writes[key] = now + READ_YOUR_WRITES_SECONDS
+        if len(_recent_writes) > 10000:
+            for stale in [k for k, until in _recent_writes.items() if until <= now]:
+                del _recent_writes[stale]
+
+
+def wrote_recently(key: Optional[str]) -> bool:
+    with _recent_writes_lock:
+        return key is not None and _recent_writes.get(key, 0) > time.monotonic()
+
+
+def use_read_engine(request: Request) -> bool:
+    """Whether a request can be served from the read engine."""
+    return (
+        read_engine is not engine
+        and request.method in READ_METHODS
+        and not wrote_recently(client_key(request))
+    )
+
+
+def _pool_stats(bind) -> Dict[str, Any]:
+    pool = bind.pool
+    stats = {"dialect": bind.dialect.name, "pool": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    return stats
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Connection pool usage for every engine in use."""
+    stats = {"primary": _pool_stats(engine), "read": _pool_stats(read_engine) if read_engine is not engine else "primary"}
+    with _async_engines_lock:
+        async_engines = dict(_async_engines)
+    for url, async_engine in async_engines.items():
+        name = "async_read" if url == READ_DATABASE_URL and url != DATABASE_URL else "async_primary"
+        stats[name] = _pool_stats(async_engine.sync_engine)
+    return stats
+
+
 # Declarative base class
 Base = declarative_base()
 
@@ -27,3 +270,20 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dependency for async FastAPI routes
+async def get_async_db():
+    async with AsyncSessionLocal(bind=get_async_engine()) as db:
+        yield db
+
+# Dependencies for read-only GET routes: the read engine unless the client just wrote
+def get_read_db(request: Request):
+    db = (ReadSessionLocal if use_read_engine(request) else SessionLocal)()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(request: Request):
+    async with AsyncSessionLocal(bind=get_async_engine(read=use_read_engine(request))) as db:
+        yield db
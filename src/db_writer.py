@@ -0,0 +1,275 @@
+"""
+db_writer.py
+Single-writer path with group commit for hot database writes.
+
+SQLite allows one writer at a time; request threads that each open a
+transaction and commit end up queueing on the file lock ("database is
+locked"). Instead, hot writes are queued to one writer thread per engine,
+which applies them in groups of up to DB_WRITER_MAX_BATCH operations (or
+whatever arrived within DB_WRITER_MAX_WAIT_MS) and commits each group once.
+
+A write operation is a function that takes the writer's Session, does its
+adds/updates/deletes and returns a result. It must only touch the session
+(no other side effects): if one operation in a group fails, the group is
+rolled back and replayed one operation per commit so only the failing
+operation sees the error.
+
+    writer = writer_for(db)
+    cycle = writer.add(models.Cycle(...))                    # waits for the commit
+    future = writer.submit(op, durable=False)                # returns once queued
+    cycle = await writer.add_async(models.Cycle(...))        # async handlers
+
+Objects returned from the writer are detached, with their attributes
+(including generated ids) loaded.
+"""
+
+import os
+import time
+import asyncio
+import queue
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List
+import numpy as np
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+logger = logging.getLogger(__name__)
+
+DB_WRITER_MAX_BATCH = int(os.getenv("DB_WRITER_MAX_BATCH", "64"))
+DB_WRITER_MAX_WAIT_MS = float(os.getenv("DB_WRITER_MAX_WAIT_MS", "10"))
+DB_WRITER_TIMEOUT = float(os.getenv("DB_WRITER_TIMEOUT", "30"))  # seconds a durable write waits
+DB_WRITER_LOCK_RETRIES = 5
+
+WriteOp = Callable[[Session], Any]
+
+
+class _Write:
+    __slots__ = ("op", "future", "enqueued")
+
+    def __init__(self, op: WriteOp):
+        self.op = op
+        self.future: Future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class DBWriter:
+    """
+    Queues write operations for one engine and commits them in groups on a
+    dedicated thread.
+
+    Args:
+        bind: Engine the writes go to
+        max_batch: Most operations per commit
+        max_wait_ms: How long the first operation of a group waits for company
+    """
+
+    def __init__(self, bind, max_batch: int = None, max_wait_ms: float = None):
+        self.max_batch = max_batch or DB_WRITER_MAX_BATCH
+        self.max_wait = (DB_WRITER_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+        self._session_factory = sessionmaker(bind=bind, autoflush=False, expire_on_commit=False)
+        self._queue: "queue.Queue[_Write]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._counters = {"ops": 0, "failed_ops": 0, "commits": 0, "replayed_groups": 0, "lock_retries": 0}
+        self._commit_seconds: Deque[float] = deque(maxlen=1000)
+        self._queue_seconds: Deque[float] = deque(maxlen=1000)
+        self._batch_sizes: Deque[int] = deque(maxlen=1000)
+        self._thread.start()
+
+    # --- Submitting ---
+
+    def submit(self, op: WriteOp, durable: bool = True, timeout: float = None):
+        """
+        Queue op. With durable=True (the default) wait until its group has
+        committed and return op's result, re-raising its error. With
+        durable=False return a Future as soon as the op is queued.
+        """
+        if self._closed:
+            raise RuntimeError("DB writer is closed")
+        write = _Write(op)
+        self._queue.put(write)
+        if not durable:
+            return write.future
+        return write.future.result(timeout=DB_WRITER_TIMEOUT if timeout is None else timeout)
+
+    def add(self, obj, durable: bool = True):
+        """Insert a new ORM object; returns it (detached, with its id) once committed."""
+        def op(session: Session):
+            session.add(obj)
+            session.flush()
+            return obj
+        return self.submit(op, durable=durable)
+
+    async def submit_async(self, op: WriteOp, timeout: float = None):
+        """submit() for async handlers: awaits the group commit without blocking the event loop."""
+        future = asyncio.wrap_future(self.submit(op, durable=False))
+        return await asyncio.wait_for(future, DB_WRITER_TIMEOUT if timeout is None else timeout)
+
+    async def add_async(self, obj, timeout: float = None):
+        def op(session: Session):
+            session.add(obj)
+            session.flush()
+            return obj
+        return await self.submit_async(op, timeout)
+
+    def close(self, timeout: float = 10.0):
+        """Stop accepting writes, commit what is queued and stop the thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    # --- Writer thread ---
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            group: List[_Write] = []
+            stop = False
+            try:
+                if first.future.set_running_or_notify_cancel():
+                    group.append(first)
+                deadline = time.perf_counter() + self.max_wait
+                while len(group) < self.max_batch:
+                    try:
+                        write = self._queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                    except queue.Empty:
+                        break
+                    if write is None:
+                        stop = True
+                        break
+                    # A write whose caller timed out or was cancelled before it was picked up is dropped
+                    if write.future.set_running_or_notify_cancel():
+                        group.append(write)
+                if group:
+                    self._commit_group(group)
+            except Exception as e:
+                # Never let one bad group kill the only thread that commits writes for this engine
+                logger.exception("DB writer group failed")
+                for write in group:
+                    self._fail(write, e)
+            if stop:
+                return
+
+    def _commit_group(self, group: List[_Write]):
+        started = time.perf_counter()
+        for write in group:
+            self._record(self._queue_seconds, started - write.enqueued)
+        try:
+            results = self._apply(group)
+        except Exception as e:
+            if len(group) == 1:
+                self._fail(group[0], e)
+                return
+            # Isolate the failing op(s): replay one operation per commit
+            with self._stats_lock:
+                self._counters["replayed_groups"] += 1
+            for write in group:
+                try:
+                    results = self._apply([write])
+                except Exception as single_error:
+                    self._fail(write, single_error)
+                else:
+                    self._succeed([write], results)
+            return
+        self._succeed(group, results)
+
+    def _apply(self, group: List[_Write]) -> List[Any]:
+        """Run a group's ops in one transaction and commit, retrying on lock contention."""
+        for attempt in range(DB_WRITER_LOCK_RETRIES + 1):
+            session = self._session_factory()
+            try:
+                results = [write.op(session) for write in group]
+                start = time.perf_counter()
+                session.commit()
+                self._record(self._commit_seconds, time.perf_counter() - start)
+                session.expunge_all()
+                return results
+            except OperationalError as e:
+                session.rollback()
+                if "locked" not in str(e).lower() or attempt == DB_WRITER_LOCK_RETRIES:
+                    raise
+                with self._stats_lock:
+                    self._counters["lock_retries"] += 1
+                time.sleep(0.01 * 2 ** attempt)
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+
+    def _succeed(self, group: List[_Write], results: List[Any]):
+        with self._stats_lock:
+            self._counters["ops"] += len(group)
+            self._counters["commits"] += 1
+            self._batch_sizes.append(len(group))
+        for write, result in zip(group, results):
+            if not write.future.done():
+                write.future.set_result(result)
+
+    def _fail(self, write: _Write, error: Exception):
+        logger.error(f"Queued database write failed: {error}")
+        with self._stats_lock:
+            self._counters["failed_ops"] += 1
+        if not write.future.done():
+            write.future.set_exception(error)
+
+    # --- Metrics ---
+
+    def _record(self, samples: Deque, value):
+        with self._stats_lock:
+            samples.append(value)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            commit_ms = np.asarray(self._commit_seconds) * 1000
+            queue_ms = np.asarray(self._queue_seconds) * 1000
+            return {
+                **self._counters,
+                "queued": self._queue.qsize(),
+                "avg_group_size": round(float(np.mean(self._batch_sizes)), 2) if self._batch_sizes else 0.0,
+                "commit_ms_p50": round(float(np.percentile(commit_ms, 50)), 3) if commit_ms.size else None,
+                "commit_ms_p99": round(float(np.percentile(commit_ms, 99)), 3) if commit_ms.size else None,
+                "queue_wait_ms_p50": round(float(np.percentile(queue_ms, 50)), 3) if queue_ms.size else None,
+                "queue_wait_ms_p99": round(float(np.percentile(queue_ms, 99)), 3) if queue_ms.size else None,
+            }
+
+
+_writers: Dict[Any, DBWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def writer_for(db: Session) -> DBWriter:
+    """The writer for the engine db is bound to, started on first use."""
+    return writer_for_bind(db.get_bind())
+
+
+def writer_for_bind(bind) -> DBWriter:
+    """The writer for a (sync) engine, started on first use. Async handlers pass database.engine."""
+    with _writers_lock:
+        writer = _writers.get(bind)
+        if writer is None:
+            writer = _writers[bind] = DBWriter(bind)
+        return writer
+
+
+def writer_stats() -> Dict[str, Any]:
+    with _writers_lock:
+        # Keyed by position rather than URL, so the payload doesn't reveal hosts or file paths
+        return {f"{bind.dialect.name}_{n}": writer.stats() for n, (bind, writer) in enumerate(_writers.items())}
+
+
+def close_writers():
+    """Drain and stop every writer (at shutdown)."""
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
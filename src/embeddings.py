@@ -0,0 +1,361 @@
+"""
+embeddings.py
+Pluggable text embedding backends for CycleWise memory retrieval.
+
+- VertexEmbedder: Google Vertex AI textembedding-gecko (network)
+- HashingEmbedder: local CPU feature-hashing embedder, runs offline
+- DeterministicEmbedder: seeded vectors for tests and benchmarks
+
+The backend is chosen per deployment with EMBEDDING_BACKEND
+("vertex", "local" or "test") and every backend reports its throughput.
+Unless EMBED_BATCHING is disabled, the backend is wrapped in a
+BatchingEmbedder that coalesces concurrent small requests into one call.
+"""
+
+import os
+import re
+import time
+import zlib
+import hashlib
+import logging
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class Embedder:
+    """
+    Base class for embedding backends. Subclasses implement _embed and set
+    model_name (stored with every vector) and dim. min_similarity is the
+    cosine below which a vector search hit is treated as unrelated; it
+    depends on how the backend's scores are distributed.
+    """
+
+    backend = "base"
+    model_name = "base"
+    dim = 0
+    min_similarity = 0.5
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self._calls = 0
+        self._texts = 0
+        self._seconds = 0.0
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts into a (len(texts), dim) float32 array."""
+        if not texts:
+            return np.zeros((0, self.dim), dtype="float32")
+        start = time.perf_counter()
+        vectors = np.asarray(self._embed(texts), dtype="float32").reshape(len(texts), self.dim)
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self._calls += 1
+            self._texts += len(texts)
+            self._seconds += elapsed
+        return vectors
+
+    def _embed(self, texts: List[str]):
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "backend": self.backend,
+                "model": self.model_name,
+                "dim": self.dim,
+                "calls": self._calls,
+                "texts": self._texts,
+                "seconds": round(self._seconds, 4),
+                "texts_per_second": round(self._texts / self._seconds, 2) if self._seconds else None,
+            }
+
+
+class VertexEmbedder(Embedder):
+    """Google Vertex AI text embeddings."""
+
+    backend = "vertex"
+    min_similarity = 0.7  # Related gecko embeddings typically score 0.7-0.9
+
+    def __init__(self, project: str = None, location: str = None, model: str = None, batch_size: int = None):
+        super().__init__()
+        self.project = project or os.getenv("VERTEX_PROJECT", "your-project")
+        self.location = location or os.getenv("VERTEX_LOCATION", "us-central1")
+        self.model_name = model or os.getenv("VERTEX_EMBEDDING_MODEL", "textembedding-gecko")
+        self.dim = int(os.getenv("VERTEX_EMBEDDING_DIM", "768"))
+        self.batch_size = batch_size or int(os.getenv("VERTEX_EMBED_BATCH_SIZE", "5"))  # Max instances per predict call
+        self.endpoint = f"projects/{self.project}/locations/{self.location}/publishers/google/models/{self.model_name}"
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            from google.cloud import aiplatform_v1
+            self._client = aiplatform_v1.PredictionServiceClient()
+        return self._client
+
+    def _embed(self, texts: List[str]):
+        client = self._get_client()
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            instances = [{"content": t} for t in texts[start:start + self.batch_size]]
+            response = client.predict(endpoint=self.endpoint, instances=instances)
+            vectors.extend(list(pred.embedding) for pred in response.predictions)
+        return vectors
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+def _hash_embed_chunk(texts: List[str], dim: int) -> np.ndarray:
+    """
+    Signed feature hashing of word unigrams and bigrams, sublinear term
+    frequency, L2-normalized. Module-level so it can run in a process pool;
+    crc32 is used instead of hash() so vectors are stable across processes.
+    """
+    out = np.zeros((len(texts), dim), dtype="float32")
+    for row, text in enumerate(texts):
+        tokens = _TOKEN_RE.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        counts: Dict[int, float] = {}
+        for feature in features:
+            h = zlib.crc32(feature.encode("utf-8"))
+            idx = h % dim
+            sign = 1.0 if (h >> 31) & 1 else -1.0
+            counts[idx] = counts.get(idx, 0.0) + sign
+        for idx, value in counts.items():
+            out[row, idx] = np.sign(value) * (1.0 + np.log(abs(value))) if value else 0.0
+        norm = np.linalg.norm(out[row])
+        if norm > 0:
+            out[row] /= norm
+    return out
+
+
+class HashingEmbedder(Embedder):
+    """
+    Local CPU embedder based on feature hashing. No network or model files;
+    large batches are split across a process pool.
+    """
+
+    backend = "local"
+    min_similarity = 0.15  # Sparse hashed n-grams: sharing a couple of words scores ~0.2-0.3
+
+    def __init__(self, dim: int = None, workers: int = None, pool_min_batch: int = 256):
+        super().__init__()
+        self.dim = dim or int(os.getenv("LOCAL_EMBEDDING_DIM", "512"))
+        self.model_name = f"hashing-v1-{self.dim}"
+        self.workers = workers or int(os.getenv("LOCAL_EMBEDDING_WORKERS", str(os.cpu_count() or 1)))
+        self.pool_min_batch = pool_min_batch
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def _embed(self, texts: List[str]):
+        if self.workers <= 1 or len(texts) < self.pool_min_batch:
+            return _hash_embed_chunk(texts, self.dim)
+        chunk = -(-len(texts) // self.workers)
+        chunks = [texts[i:i + chunk] for i in range(0, len(texts), chunk)]
+        results = self._get_pool().map(_hash_embed_chunk, chunks, [self.dim] * len(chunks))
+        return np.vstack(list(results))
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+class DeterministicEmbedder(Embedder):
+    """
+    Test backend: each text maps to a fixed pseudo-random unit vector seeded
+    from its SHA-256, so results are reproducible without any service.
+    """
+
+    backend = "test"
+    min_similarity = -1.0  # Random vectors carry no meaning; keep every hit
+
+    def __init__(self, dim: int = 768):
+        super().__init__()
+        self.dim = dim
+        self.model_name = f"deterministic-{dim}"
+
+    def _embed(self, texts: List[str]):
+        out = np.empty((len(texts), self.dim), dtype="float32")
+        for row, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dim)
+            out[row] = vector / np.linalg.norm(vector)
+        return out
+
+
+class _EmbedRequest:
+    __slots__ = ("texts", "future")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future: Future = Future()
+
+
+class BatchingEmbedder(Embedder):
+    """
+    Micro-batching front for another embedder. Concurrent embed calls are
+    queued; dispatcher threads collect requests for up to max_wait_ms (or
+    until max_batch_size texts), send them to the inner backend as one batch
+    and route each slice of vectors back to its caller.
+
+    max_batch_size is capped at the inner backend's own per-call limit
+    (VertexEmbedder.batch_size), so a micro-batch is one round-trip rather
+    than several serial ones; the dispatchers run those calls concurrently.
+    """
+
+    backend = "batching"
+    HISTOGRAM_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+    def __init__(self, inner: Embedder, max_batch_size: int = None, max_wait_ms: float = None, dispatchers: int = None):
+        super().__init__()
+        self.inner = inner
+        self.model_name = inner.model_name
+        self.dim = inner.dim
+        self.min_similarity = inner.min_similarity
+        self.max_batch_size = max_batch_size or int(os.getenv("EMBED_BATCH_MAX_SIZE", "64"))
+        if getattr(inner, "batch_size", None):
+            self.max_batch_size = min(self.max_batch_size, inner.batch_size)
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5"))) / 1000.0
+        self.dispatchers = dispatchers or int(os.getenv("EMBED_BATCH_DISPATCHERS", "4"))
+        self._queue: "queue.Queue[_EmbedRequest]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._start_lock = threading.Lock()
+        self._batches = 0
+        self._histogram = [0] * (len(self.HISTOGRAM_BUCKETS) + 1)  # Last bucket: > 256
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if not self._threads:
+                for n in range(self.dispatchers):
+                    thread = threading.Thread(target=self._dispatch_loop, name=f"embed-batcher-{n}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+
+    def _embed(self, texts: List[str]):
+        if len(texts) >= self.max_batch_size:
+            # Already a full batch (e.g. index builds); no point queueing it
+            self._record_batch(len(texts))
+            return self.inner.embed(texts)
+        self._ensure_started()
+        request = _EmbedRequest(texts)
+        self._queue.put(request)
+        return request.future.result()
+
+    def _dispatch_loop(self):
+        carry: Optional[_EmbedRequest] = None
+        while True:
+            batch = [carry or self._queue.get()]
+            carry = None
+            size = len(batch[0].texts)
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if size + len(request.texts) > self.max_batch_size:
+                    carry = request  # Would overflow the batch; it starts the next one
+                    break
+                batch.append(request)
+                size += len(request.texts)
+            self._run_batch(batch, size)
+
+    def _run_batch(self, batch: List[_EmbedRequest], size: int):
+        self._record_batch(size)
+        try:
+            vectors = self.inner.embed([text for request in batch for text in request.texts])
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        offset = 0
+        for request in batch:
+            request.future.set_result(vectors[offset:offset + len(request.texts)])
+            offset += len(request.texts)
+
+    def _record_batch(self, size: int):
+        bucket = next((i for i, bound in enumerate(self.HISTOGRAM_BUCKETS) if size <= bound), len(self.HISTOGRAM_BUCKETS))
+        with self._stats_lock:
+            self._batches += 1
+            self._histogram[bucket] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        caller = super().stats()
+        with self._stats_lock:
+            labels = [f"<={bound}" for bound in self.HISTOGRAM_BUCKETS] + [f">{self.HISTOGRAM_BUCKETS[-1]}"]
+            batching = {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": self._batches,
+                "batch_size_histogram": dict(zip(labels, self._histogram)),
+                "queued": self._queue.qsize(),
+            }
+        return {
+            **self.inner.stats(),
+            "caller": {key: caller[key] for key in ("calls", "texts", "seconds", "texts_per_second")},
+            "batching": batching,
+        }
+
+
+EMBEDDER_BACKENDS = {
+    "vertex": VertexEmbedder,
+    "local": HashingEmbedder,
+    "test": DeterministicEmbedder,
+}
+
+_embedder: Optional[Embedder] = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder() -> Embedder:
+    """Return the deployment's embedder, created from EMBEDDING_BACKEND on first use."""
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            name = os.getenv("EMBEDDING_BACKEND", "vertex")
+            backend = EMBEDDER_BACKENDS.get(name)
+            if backend is None:
+                raise ValueError(f"Unknown EMBEDDING_BACKEND '{name}'. Choose from {list(EMBEDDER_BACKENDS)}.")
+            _embedder = backend()
+            if os.getenv("EMBED_BATCHING", "true").lower() == "true":
+                _embedder = BatchingEmbedder(_embedder)
+            logger.info(f"Using {_embedder.backend} embedder ({_embedder.model_name}, dim {_embedder.dim})")
+        return _embedder
+
+
+def set_embedder(embedder: Embedder):
+    """Replace the process-wide embedder (tests, benchmarks, custom deployments)."""
+    global _embedder
+    with _embedder_lock:
+        _embedder = embedder
+
+
+def embed_text(texts: List[str]) -> np.ndarray:
+    """Embed texts with the configured backend."""
+    return get_embedder().embed(texts)
+
+
+def vector_to_bytes(vector) -> bytes:
+    """Serialize a vector for the interaction_embeddings table."""
+    return np.asarray(vector, dtype="float32").tobytes()
+
+
+def bytes_to_vector(data: bytes) -> np.ndarray:
+    """Deserialize a vector stored by vector_to_bytes."""
+    return np.frombuffer(data, dtype="float32")
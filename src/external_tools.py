@@ -232,7 +232,7 @@ class MedicalInfoTool:
                 ],
                 "when_to_see_doctor": "Severe bloating, bloating with other concerning symptoms, or bloating that doesn't improve"
             },
-            "headaches": {
+            "headache": {
                 "description": "Hormonal changes can trigger headaches, especially during the luteal phase.",
                 "evidence_level": "high",
                 "remedies": [
@@ -246,8 +246,12 @@ class MedicalInfoTool:
             }
         }
 
-        if symptom and symptom.lower() in medical_database:
-            return medical_database[symptom.lower()]
+        # Keys are symptom_extraction's canonical names; "headaches" was the key before
+        aliases = {"headaches": "headache"}
+        key = aliases.get(symptom.lower(), symptom.lower()) if symptom else None
+
+        if key in medical_database:
+            return medical_database[key]
         elif symptom:
             # Return general information for unknown symptoms
             return {
@@ -1,11 +1,13 @@
 """
 init_db.py
-Initializes the database tables.
+Initializes the database: creates the tables and applies any pending
+schema migrations (see migrations.py).
 """
 
-from .database import engine
-from .models import Base
+import logging
+from migrations import migrate
 
 if __name__ == "__main__":
-    Base.metadata.create_all(bind=engine)
-    print("Database tables created.") 
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO)
+    applied = migrate()
+    print(f"Database initialized ({len(applied)} migration(s) applied).")
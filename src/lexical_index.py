@@ -0,0 +1,73 @@
+"""
+lexical_index.py
+BM25 keyword search over interactions using the SQLite FTS5 index.
+
+interactions_fts has an `owner` column holding one token per row,
+owner_token(user_id), and every search ANDs that token into its MATCH
+expression, so FTS5 only walks the user's own rows. Matches are scored
+with BM25 IDF over the user's own history rather than FTS5's bm25(),
+whose IDF pass counts each term across every user's rows: a query costs
+about the same however many other users share the database.
+"""
+
+import re
+import math
+import logging
+from typing import Dict, List, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+MATCH_SQL = "SELECT rowid FROM interactions_fts WHERE interactions_fts MATCH :match"
+COUNT_SQL = "SELECT count(*) FROM interactions_fts WHERE interactions_fts MATCH :match"
+MAX_QUERY_TERMS = 16  # Terms scored per query (one FTS lookup each)
+
+
+def owner_token(user_id: int) -> str:
+    """The owner column value for a user's rows; the interactions_fts triggers write 'u' || user_id."""
+    return f"u{user_id}"
+
+
+def query_terms(query: str) -> List[str]:
+    """The distinct lowercased word tokens of free text, in order."""
+    return list(dict.fromkeys(_TOKEN_RE.findall(query.lower())))[:MAX_QUERY_TERMS]
+
+
+def user_match_query(user_id: int, term: str = None) -> str:
+    """
+    An FTS5 MATCH expression for one user's rows, optionally only those
+    containing `term` in the transcript columns. The term is quoted, so user
+    input can't inject FTS syntax.
+    """
+    match = f'owner:"{owner_token(user_id)}"'
+    return f'{match} AND {{message response}}:"{term}"' if term else match
+
+
+def bm25_search(db: Session, user_id: int, query: str, k: int = 5) -> List[Tuple[int, float]]:
+    """
+    Return (interaction_id, score) pairs for the user's best keyword matches,
+    best first (newest first on ties). A row scores the sum of the BM25 IDF
+    of each query term it contains, with document frequencies counted over
+    the user's interactions: a word in most of their history adds little, a
+    rare one a lot. Returns [] on databases without FTS5.
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        return []
+    terms = query_terms(query)
+    if not terms:
+        return []
+
+    total = db.execute(text(COUNT_SQL), {"match": user_match_query(user_id)}).scalar()
+    if not total:
+        return []
+    scores: Dict[int, float] = {}
+    for term in terms:
+        ids = [rowid for (rowid,) in db.execute(text(MATCH_SQL), {"match": user_match_query(user_id, term)})]
+        idf = math.log(1 + (total - len(ids) + 0.5) / (len(ids) + 0.5))
+        for interaction_id in ids:
+            scores[interaction_id] = scores.get(interaction_id, 0.0) + idf
+    ranked = sorted(scores.items(), key=lambda item: (item[1], item[0]), reverse=True)
+    return [(int(interaction_id), score) for interaction_id, score in ranked[:k]]
@@ -10,13 +10,18 @@ from executor import call_gemini
 from memory import log_interaction
 from fastapi.middleware.cors import CORSMiddleware
 from routers import router as api_router
-from database import get_db
+from database import get_db, engine, start_sqlite_maintenance, warm_async_engines, dispose_async_engines, pool_stats, mark_write, client_key, READ_METHODS
 import models
 import auth
 from sqlalchemy.orm import Session
 import logging
 from external_tools import CalendarTool, HealthTrackingTool, MedicalInfoTool
 from planner import generate_contextual_response
+from embeddings import get_embedder
+from vector_store import memory_store
+from backfill_embeddings import start_background_backfill, background_backfill
+from db_writer import writer_stats, close_writers
+import os
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +38,14 @@ app.add_middleware(
 
 app.include_router(api_router, prefix="/api")
 
+@app.middleware("http")
+async def track_writes(request, call_next):
+    """After a successful write, pin the client's reads to the primary (read-your-writes)."""
+    response = await call_next(request)
+    if request.method not in READ_METHODS and response.status_code < 400:
+        mark_write(client_key(request))
+    return response
+
 class ChatRequest(BaseModel):
     message: str
 
@@ -273,12 +286,52 @@ def demo_weather():
             }
         }
 
+@app.get("/internal/stats")
+def internal_stats(admin: models.User = Depends(auth.get_current_admin)):
+    """Runtime performance counters for the memory and storage subsystems (ADMIN_EMAILS only)."""
+    return {
+        "embedder": get_embedder().stats(),
+        "memory_store": memory_store.stats(),
+        "db_writer": writer_stats(),
+        "db_pools": pool_stats(),
+        "embedding_backfill": background_backfill().progress() if background_backfill() else None,
+    }
+
+@app.on_event("startup")
+def start_db_maintenance():
+    app.state.stop_db_maintenance = start_sqlite_maintenance(engine)
+
+@app.on_event("startup")
+async def open_async_db():
+    await warm_async_engines()
+
+@app.on_event("startup")
+def start_embedding_backfill():
+    if os.getenv("EMBEDDING_BACKFILL_ON_STARTUP", "false").lower() == "true":
+        start_background_backfill(
+            batch_size=int(os.getenv("EMBEDDING_BACKFILL_BATCH_SIZE", "256")),
+            rate_limit=float(os.getenv("EMBEDDING_BACKFILL_RATE", "50")),
+        )
+
+@app.on_event("shutdown")
+def flush_memory_store():
+    if background_backfill():
+        background_backfill().stop()
+    close_writers()
+    app.state.stop_db_maintenance.set()
+    memory_store.flush_all()
+
+@app.on_event("shutdown")
+async def close_async_db():
+    await dispose_async_engines()
+
 """
 How to run:
 1. Create a .env file in the project root with:
    GEMINI_API_KEY=your_google_gemini_api_key_here
    SECRET_KEY=your_secret_key_here
    GOOGLE_CLIENT_ID=your_google_client_id_here
+   EMBEDDING_BACKEND=vertex  # or "local" for offline CPU embeddings, "test" for deterministic vectors
 2. Install dependencies:
    pip install -r requirements.txt
 3. Start the server:
@@ -4,27 +4,126 @@ Memory management for CycleWise backend.
 """
 
 import logging
+import os
 from sqlalchemy.orm import Session
 from database import get_db
 import models
+from embeddings import get_embedder, vector_to_bytes
+from vector_store import memory_store, format_interaction
+from cycles import current_phase
+from db_writer import writer_for, DB_WRITER_TIMEOUT
+from archive import delete_archived
+from symptom_extraction import record_interaction_events, delete_events
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
-def log_interaction(message: str, response: str, user_id: int, db: Session):
+# Memory index updates for committed interactions; off the DB writer thread,
+# which would otherwise load, flush or delete index shards between commits
+_index_pool = ThreadPoolExecutor(max_workers=int(os.getenv("MEMORY_INDEX_WORKERS", "2")), thread_name_prefix="memory-index")
+
+def log_interaction(message: str, response: str, user_id: int, db: Session, durable: bool = False):
     """
     Log user interaction for memory retrieval.
+    The interaction is embedded once here and the vector stored alongside it,
+    so retrieval only ever needs to embed the incoming query. Symptom and
+    mood mentions in the message are extracted into symptom_events in the
+    same transaction.
+
+    The row is written through the group-commit writer. By default this
+    returns once the write is queued and the memory index is updated on a
+    background thread when it commits; pass durable=True to wait for the
+    commit (up to DB_WRITER_TIMEOUT) and the index update.
     """
+    embedder = get_embedder()
+    vector = None
     try:
-        interaction = models.Interaction(
-            user_id=user_id,
-            message=message,
-            response=response,
-            timestamp=datetime.utcnow()
+        vector = embedder.embed([format_interaction(message, response)])[0]
+    except Exception as e:
+        # Stored without an embedding; it is embedded when the user's index is next built
+        logger.warning(f"Embedding failed for new interaction of user {user_id}: {e}")
+
+    interaction = models.Interaction(
+        user_id=user_id,
+        message=message,
+        response=response,
+        timestamp=datetime.utcnow(),
+        phase=current_phase(user_id, db)
+    )
+    if vector is not None:
+        interaction.embedding = models.InteractionEmbedding(
+            model=embedder.model_name,
+            dim=len(vector),
+            vector=vector_to_bytes(vector),
         )
-        db.add(interaction)
-        db.commit()
+
+    def on_committed(future: Future):
+        error = future.exception()
+        if error is not None:
+            logger.error(f"Error logging interaction: {error}")
+            return
         logger.info(f"Interaction logged for user {user_id}")
+        if vector is None:
+            memory_store.invalidate(user_id)
+            return
+        try:
+            memory_store.add_interaction(user_id, future.result().id, vector)
+        except Exception as e:
+            logger.error(f"Error updating memory index for user {user_id}: {e}")
+
+    def op(session: Session):
+        session.add(interaction)
+        session.flush()
+        record_interaction_events(session, interaction)
+        return interaction
+
+    try:
+        future = writer_for(db).submit(op, durable=False)
     except Exception as e:
         logger.error(f"Error logging interaction: {e}")
-        db.rollback() 
\ No newline at end of file
+        return
+    if durable:
+        try:
+            future.result(timeout=DB_WRITER_TIMEOUT)
+        except Exception:
+            pass  # Reported by on_committed
+        if future.done():
+            on_committed(future)
+            return
+        logger.warning(f"Interaction for user {user_id} not committed after {DB_WRITER_TIMEOUT}s; indexing it once it is")
+    future.add_done_callback(lambda done: _index_pool.submit(on_committed, done))
+
+
+def delete_interaction(interaction_id: int, user_id: int, db: Session) -> bool:
+    """
+    Delete a user's interaction together with its stored embedding (and
+    archived text, if any) and remove it from the user's memory index.
+    """
+    def op(session: Session) -> Optional[bool]:
+        interaction = session.query(models.Interaction).filter(
+            models.Interaction.id == interaction_id,
+            models.Interaction.user_id == user_id
+        ).first()
+        if interaction is None:
+            return None
+        session.query(models.InteractionEmbedding).filter(
+            models.InteractionEmbedding.interaction_id == interaction_id
+        ).delete()
+        delete_events(session, "interaction", interaction_id)
+        session.delete(interaction)
+        return interaction.archived_at is not None
+
+    try:
+        archived = writer_for(db).submit(op)
+        if archived is None:
+            return False
+        if archived:
+            delete_archived([interaction_id])
+    except Exception as e:
+        logger.error(f"Error deleting interaction {interaction_id}: {e}")
+        return False
+
+    memory_store.remove_interactions(user_id, [interaction_id])
+    return True
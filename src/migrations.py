@@ -0,0 +1,456 @@
+"""
+migrations.py
+Versioned, online schema migrations for the CycleWise database.
+
+Each migration has a version, a name, an optional `up` step (DDL, run in
+one short transaction) and an optional batched backfill. Backfills page
+through a table by id, commit every chunk together with a checkpoint in
+job_checkpoints ("migration:<version>") and pause between chunks, so the
+API keeps serving while a large table is rewritten and an interrupted run
+resumes where it stopped. A version is recorded in schema_migrations once
+its backfill has finished.
+
+Every step is idempotent, so databases created before versioning existed
+(by create_all or the old migrate_db.py) are brought up to date by simply
+running all migrations.
+
+Usage:
+    python migrations.py                  # apply pending migrations
+    python migrations.py --status
+    python migrations.py --target 3 --chunk-size 200 --pause 0.2
+"""
+
+import argparse
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, LargeBinary, MetaData, String, Table, Text, inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+from cycles import current_phase, rebuild_stats_chunk
+from database import engine
+from symptom_extraction import cycle_tags, extract_chunk
+import models
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_CHUNK_SIZE = int(os.getenv("MIGRATION_CHUNK_SIZE", "500"))  # Rows per backfill commit
+MIGRATION_PAUSE = float(os.getenv("MIGRATION_PAUSE", "0.05"))  # Seconds between chunks, to yield to live writes
+MIGRATION_LOCK_RETRIES = 5
+
+# backfill(session, after_id, limit) -> last id processed, or None when no rows remain. Must not commit.
+Backfill = Callable[[Session, int, int], Optional[int]]
+
+
+class Migration:
+    """
+    One schema version.
+
+    Args:
+        version: Position in the migration order; recorded in schema_migrations once applied
+        name: Short description
+        up: Idempotent DDL step, called with a Connection inside a transaction
+        backfill: Batched data step, see Backfill
+    """
+
+    def __init__(self, version: int, name: str, up: Callable[[Connection], None] = None, backfill: Backfill = None):
+        self.version = version
+        self.name = name
+        self.up = up
+        self.backfill = backfill
+
+    @property
+    def checkpoint_name(self) -> str:
+        return f"migration:{self.version}"
+
+
+# --- Steps ---
+
+def _add_columns(connection: Connection, table: str, columns: List[Tuple[str, str]]):
+    existing = {column["name"] for column in inspect(connection).get_columns(table)}
+    for name, ddl_type in columns:
+        if name not in existing:
+            logger.info(f"Adding '{table}.{name}' column...")
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl_type}"))
+
+
+# Tables as migrations 1 and 10 created them, frozen here rather than read from
+# models (like the interactions_fts DDL below): later model changes are made by
+# later migrations, which expect to find these definitions on old databases.
+frozen_metadata = MetaData()
+
+V1_TABLES = [
+    Table(
+        "users", frozen_metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("email", String, unique=True, index=True, nullable=False),
+        Column("age", Integer),
+        Column("cycle_start_date", DateTime),
+        Column("period_duration", Integer),
+        Column("created_at", DateTime),
+    ),
+    Table(
+        "interactions", frozen_metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("user_id", Integer, ForeignKey("users.id")),
+        Column("message", Text),
+        Column("response", Text),
+        Column("timestamp", DateTime),
+        Column("phase", String),
+        Column("archived_at", DateTime),
+    ),
+    Table(
+        "interaction_embeddings", frozen_metadata,
+        Column("interaction_id", Integer, ForeignKey("interactions.id"), primary_key=True),
+        Column("model", String, nullable=False),
+        Column("dim", Integer, nullable=False),
+        Column("vector", LargeBinary, nullable=False),
+        Column("created_at", DateTime),
+    ),
+    Table(
+        "cycles", frozen_metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("user_id", Integer, ForeignKey("users.id")),
+        Column("start_date", DateTime, nullable=False),
+        Column("symptoms", Text),
+        Column("moods", Text),
+    ),
+    Table(
+        "symptom_events", frozen_metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+        Column("date", DateTime, nullable=False),
+        Column("symptom", String, nullable=False),
+        Column("kind", String, nullable=False),
+        Column("severity", Integer),
+        Column("phase", String),
+        Column("source", String, nullable=False),
+        Column("source_id", Integer, nullable=False),
+        Index("ix_symptom_events_user_date", "user_id", "date"),
+        Index("ix_symptom_events_user_symptom_date", "user_id", "symptom", "date"),
+        Index("ix_symptom_events_source", "source", "source_id"),
+    ),
+    Table(
+        "reminders", frozen_metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("user_id", Integer, ForeignKey("users.id")),
+        Column("type", String),
+        Column("time", String),
+        Column("method", String),
+        Column("active", Boolean),
+    ),
+    Table(
+        "partners", frozen_metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("user_id", Integer, ForeignKey("users.id")),
+        Column("partner_user_id", Integer, ForeignKey("users.id")),
+        Column("consent_type", String),
+        Column("status", String),
+    ),
+    Table(
+        "job_checkpoints", frozen_metadata,
+        Column("name", String, primary_key=True),
+        Column("last_id", Integer),
+        Column("updated_at", DateTime),
+    ),
+]
+
+V10_USER_CYCLE_STATS = Table(
+    "user_cycle_stats", frozen_metadata,
+    Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
+    Column("last_start", DateTime, nullable=False),
+    Column("cycle_count", Integer, nullable=False),
+    Column("length_count", Integer, nullable=False),
+    Column("avg_cycle_length", Float),
+    Column("cycle_length_variance", Float),
+    Column("avg_period_length", Float),
+    Column("phase", String),
+    Column("phase_until", DateTime),
+    Column("next_period", DateTime),
+    Column("updated_at", DateTime),
+)
+
+
+def create_missing_tables(connection: Connection):
+    frozen_metadata.create_all(bind=connection, tables=V1_TABLES)
+
+
+def add_user_profile_columns(connection: Connection):
+    _add_columns(connection, "users", [("age", "INTEGER"), ("cycle_start_date", "DATETIME"), ("period_duration", "INTEGER")])
+
+
+def add_interaction_phase(connection: Connection):
+    _add_columns(connection, "interactions", [("phase", "VARCHAR")])
+
+
+def backfill_interaction_phases(db: Session, after_id: int, limit: int) -> Optional[int]:
+    """Tag untagged interactions with the cycle phase at the time they happened."""
+    rows = (
+        db.query(models.Interaction.id, models.Interaction.user_id, models.Interaction.timestamp)
+        .filter(models.Interaction.id > after_id)
+        .order_by(models.Interaction.id)
+        .limit(limit)
+        .all()
+    )
+    if not rows:
+        return None
+    untagged = {interaction_id for (interaction_id,) in db.query(models.Interaction.id).filter(
+        models.Interaction.id.between(rows[0].id, rows[-1].id), models.Interaction.phase.is_(None))}
+    updates = []
+    for interaction_id, user_id, timestamp in rows:
+        phase = current_phase(user_id, db, at=timestamp) if interaction_id in untagged and timestamp else None
+        if phase:
+            updates.append({"id": interaction_id, "phase": phase})
+    db.bulk_update_mappings(models.Interaction, updates)
+    return rows[-1].id
+
+
+def add_interaction_archived_at(connection: Connection):
+    _add_columns(connection, "interactions", [("archived_at", "DATETIME")])
+
+
+# The composite hot-path indexes migration 5 adds to tables that predate them
+V5_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_interactions_user_timestamp ON interactions (user_id, timestamp DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_interactions_unarchived_timestamp ON interactions (timestamp) WHERE archived_at IS NULL",
+    "CREATE INDEX IF NOT EXISTS ix_cycles_user_start_date ON cycles (user_id, start_date DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_reminders_user_id ON reminders (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_partners_partner_user_status ON partners (partner_user_id, status)",
+    "CREATE INDEX IF NOT EXISTS ix_partners_user_partner ON partners (user_id, partner_user_id)",
+]
+
+
+def create_missing_indexes(connection: Connection):
+    """Create the V5_INDEXES that are missing and refresh statistics."""
+    for statement in V5_INDEXES:
+        connection.exec_driver_sql(statement)
+    connection.execute(text("ANALYZE"))
+
+
+def add_cycle_tags(connection: Connection):
+    _add_columns(connection, "cycles", [("tags", "JSON")])
+
+
+def backfill_cycle_tags(db: Session, after_id: int, limit: int) -> Optional[int]:
+    """Parse the free-text symptoms/moods of cycles logged before tags existed."""
+    rows = (
+        db.query(models.Cycle.id, models.Cycle.symptoms, models.Cycle.moods, models.Cycle.tags)
+        .filter(models.Cycle.id > after_id)
+        .order_by(models.Cycle.id)
+        .limit(limit)
+        .all()
+    )
+    if not rows:
+        return None
+    db.bulk_update_mappings(models.Cycle, [
+        {"id": cycle_id, "tags": cycle_tags(symptoms, moods)}
+        for cycle_id, symptoms, moods, tags in rows if tags is None
+    ])
+    return rows[-1].id
+
+
+def create_user_cycle_stats(connection: Connection):
+    V10_USER_CYCLE_STATS.create(bind=connection, checkfirst=True)
+
+
+def backfill_cycle_symptoms(db: Session, after_id: int, limit: int) -> Optional[int]:
+    return extract_chunk(db, models.Cycle, after_id, limit)
+
+
+def backfill_interaction_symptoms(db: Session, after_id: int, limit: int) -> Optional[int]:
+    return extract_chunk(db, models.Interaction, after_id, limit)
+
+
+# interactions_fts as each migration left it. Frozen here rather than read from
+# models, so a version means the same DDL whatever the models look like later.
+FTS_V8_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS interactions_fts USING fts5(
+        message, response, content='interactions', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS interactions_fts_ai AFTER INSERT ON interactions BEGIN
+        INSERT INTO interactions_fts(rowid, message, response) VALUES (new.id, new.message, new.response);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS interactions_fts_ad AFTER DELETE ON interactions BEGIN
+        INSERT INTO interactions_fts(interactions_fts, rowid, message, response) VALUES ('delete', old.id, old.message, old.response);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS interactions_fts_au AFTER UPDATE ON interactions BEGIN
+        INSERT INTO interactions_fts(interactions_fts, rowid, message, response) VALUES ('delete', old.id, old.message, old.response);
+        INSERT INTO interactions_fts(rowid, message, response) VALUES (new.id, new.message, new.response);
+    END""",
+]
+FTS_V11_UPDATE_TRIGGER = """CREATE TRIGGER IF NOT EXISTS interactions_fts_au AFTER UPDATE OF message, response ON interactions BEGIN
+        INSERT INTO interactions_fts(interactions_fts, rowid, message, response) VALUES ('delete', old.id, old.message, old.response);
+        INSERT INTO interactions_fts(rowid, message, response) VALUES (new.id, new.message, new.response);
+    END"""
+FTS_V12_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS interactions_fts USING fts5(
+        message, response, owner, content='', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS interactions_fts_ai AFTER INSERT ON interactions BEGIN
+        INSERT INTO interactions_fts(rowid, message, response, owner) VALUES (new.id, new.message, new.response, 'u' || new.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS interactions_fts_ad AFTER DELETE ON interactions BEGIN
+        INSERT INTO interactions_fts(interactions_fts, rowid, message, response, owner) VALUES ('delete', old.id, old.message, old.response, 'u' || old.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS interactions_fts_au AFTER UPDATE OF message, response, user_id ON interactions BEGIN
+        INSERT INTO interactions_fts(interactions_fts, rowid, message, response, owner) VALUES ('delete', old.id, old.message, old.response, 'u' || old.user_id);
+        INSERT INTO interactions_fts(rowid, message, response, owner) VALUES (new.id, new.message, new.response, 'u' || new.user_id);
+    END""",
+]
+
+
+def _fts_columns(connection: Connection) -> Optional[set]:
+    """Columns of interactions_fts, or None if it doesn't exist (or this isn't SQLite)."""
+    if connection.dialect.name != "sqlite" or "interactions_fts" not in inspect(connection).get_table_names():
+        return None
+    return {row[1] for row in connection.exec_driver_sql("PRAGMA table_info(interactions_fts)")}
+
+
+def create_interactions_fts(connection: Connection):
+    if connection.dialect.name != "sqlite" or _fts_columns(connection) is not None:
+        return
+    logger.info("Creating 'interactions_fts' full-text index...")
+    for statement in FTS_V8_DDL:
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql("INSERT INTO interactions_fts(interactions_fts) VALUES ('rebuild')")
+
+
+def narrow_interactions_fts_update_trigger(connection: Connection):
+    """Recreate interactions_fts_au as AFTER UPDATE OF message, response."""
+    columns = _fts_columns(connection)
+    if columns is None or "owner" in columns:
+        return  # Already the per-user layout (created by create_all), which has its own trigger
+    connection.exec_driver_sql("DROP TRIGGER IF EXISTS interactions_fts_au")
+    connection.exec_driver_sql(FTS_V11_UPDATE_TRIGGER)
+
+
+def scope_interactions_fts_to_user(connection: Connection):
+    """Rebuild interactions_fts as a contentless index with an owner column ('u' || user_id)."""
+    columns = _fts_columns(connection)
+    if connection.dialect.name != "sqlite" or (columns is not None and "owner" in columns):
+        return
+    logger.info("Rebuilding 'interactions_fts' with a per-user owner column...")
+    for trigger in ("interactions_fts_ai", "interactions_fts_ad", "interactions_fts_au"):
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+    connection.exec_driver_sql("DROP TABLE IF EXISTS interactions_fts")
+    for statement in FTS_V12_DDL:
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql(
+        "INSERT INTO interactions_fts(rowid, message, response, owner) "
+        "SELECT id, message, response, 'u' || user_id FROM interactions"
+    )
+
+
+MIGRATIONS = [
+    Migration(1, "create missing tables", up=create_missing_tables),
+    Migration(2, "users: age, cycle_start_date, period_duration", up=add_user_profile_columns),
+    Migration(3, "interactions: phase", up=add_interaction_phase, backfill=backfill_interaction_phases),
+    Migration(4, "interactions: archived_at", up=add_interaction_archived_at),
+    Migration(5, "hot query indexes", up=create_missing_indexes),
+    Migration(6, "symptom_events from cycles", backfill=backfill_cycle_symptoms),
+    Migration(7, "symptom_events from interactions", backfill=backfill_interaction_symptoms),
+    Migration(8, "interactions full-text index", up=create_interactions_fts),
+    Migration(9, "cycles: tags", up=add_cycle_tags, backfill=backfill_cycle_tags),
+    Migration(10, "user_cycle_stats", up=create_user_cycle_stats, backfill=rebuild_stats_chunk),
+    Migration(11, "interactions_fts: update trigger on text columns only", up=narrow_interactions_fts_update_trigger),
+    Migration(12, "interactions_fts: per-user owner column", up=scope_interactions_fts_to_user),
+]
+
+
+# --- Runner ---
+
+def applied_versions(bind=None) -> dict:
+    """{version: applied_at} for migrations recorded in schema_migrations."""
+    bind = bind or engine
+    models.SchemaMigration.__table__.create(bind=bind, checkfirst=True)
+    with bind.connect() as connection:
+        rows = connection.execute(text("SELECT version, applied_at FROM schema_migrations"))
+        return {version: applied_at for version, applied_at in rows}
+
+
+def status(bind=None) -> List[Tuple[int, str, Optional[datetime]]]:
+    applied = applied_versions(bind)
+    return [(m.version, m.name, applied.get(m.version)) for m in MIGRATIONS]
+
+
+def _backfill_chunk(db: Session, migration: Migration, checkpoint: models.JobCheckpoint, chunk_size: int) -> Optional[int]:
+    """Run and commit one chunk with its checkpoint, retrying if live traffic holds the write lock."""
+    for attempt in range(MIGRATION_LOCK_RETRIES + 1):
+        try:
+            last_id = migration.backfill(db, checkpoint.last_id or 0, chunk_size)
+            if last_id is not None:
+                checkpoint.last_id = last_id
+            db.commit()
+            return last_id
+        except OperationalError as e:
+            db.rollback()
+            if "locked" not in str(e).lower() or attempt == MIGRATION_LOCK_RETRIES:
+                raise
+            time.sleep(0.05 * 2 ** attempt)
+
+
+def _run_backfill(db: Session, migration: Migration, chunk_size: int, pause: float):
+    checkpoint = db.get(models.JobCheckpoint, migration.checkpoint_name)
+    if checkpoint is None:
+        checkpoint = models.JobCheckpoint(name=migration.checkpoint_name, last_id=0)
+        db.add(checkpoint)
+        db.commit()
+    elif checkpoint.last_id:
+        logger.info(f"Resuming migration {migration.version} after id {checkpoint.last_id}")
+    while _backfill_chunk(db, migration, checkpoint, chunk_size) is not None:
+        logger.info(f"Migration {migration.version}: backfilled through id {checkpoint.last_id}")
+        if pause:
+            time.sleep(pause)
+    db.delete(checkpoint)
+
+
+def migrate(bind=None, target: int = None, chunk_size: int = None, pause: float = None) -> List[int]:
+    """Apply pending migrations in order, up to and including `target`. Returns the versions applied."""
+    bind = bind or engine
+    chunk_size = chunk_size or MIGRATION_CHUNK_SIZE
+    pause = MIGRATION_PAUSE if pause is None else pause
+    applied = applied_versions(bind)
+    db = sessionmaker(bind=bind, autoflush=False)()
+    done = []
+    try:
+        for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+            if migration.version in applied:
+                continue
+            if target is not None and migration.version > target:
+                break
+            logger.info(f"Applying migration {migration.version}: {migration.name}")
+            if migration.up:
+                with bind.begin() as connection:
+                    migration.up(connection)
+            if migration.backfill:
+                _run_backfill(db, migration, chunk_size, pause)
+            db.add(models.SchemaMigration(version=migration.version, name=migration.name))
+            db.commit()
+            done.append(migration.version)
+    finally:
+        db.close()
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply CycleWise schema migrations.")
+    parser.add_argument("--status", action="store_true", help="List migrations and whether they are applied")
+    parser.add_argument("--target", type=int, help="Stop after this version")
+    parser.add_argument("--chunk-size", type=int, default=MIGRATION_CHUNK_SIZE, help="Rows per backfill commit")
+    parser.add_argument("--pause", type=float, default=MIGRATION_PAUSE, help="Seconds to pause between backfill chunks")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.status:
+        for version, name, applied_at in status():
+            print(f"{version:>3}  {'applied ' + str(applied_at) if applied_at else 'pending':<36} {name}")
+        return
+    applied = migrate(target=args.target, chunk_size=args.chunk_size, pause=args.pause)
+    print(f"✅ Applied {len(applied)} migration(s): {applied}" if applied else "✅ Database is up to date.")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ models.py
 SQLAlchemy models for CycleWise backend.
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Boolean, Text, LargeBinary, JSON, DDL, Index, event
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -30,19 +30,83 @@ class Interaction(Base):
     message = Column(Text)
     response = Column(Text)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    phase = Column(String)  # Cycle phase when the interaction happened
+    archived_at = Column(DateTime, nullable=True)  # Set when full text moved to the archive; message/response hold summaries
     
     user = relationship("User", back_populates="interactions")
+    embedding = relationship("InteractionEmbedding", back_populates="interaction", uselist=False)
+
+# A user's interactions newest first (memory, history), and the retention sweep
+Index("ix_interactions_user_timestamp", Interaction.user_id, Interaction.timestamp.desc())
+Index("ix_interactions_unarchived_timestamp", Interaction.timestamp,
+      sqlite_where=Interaction.archived_at.is_(None), postgresql_where=Interaction.archived_at.is_(None))
+
+# Full-text index over interaction transcripts (SQLite FTS5, contentless), kept
+# in sync with the interactions table by triggers. The owner column holds
+# 'u' || user_id (lexical_index.owner_token) so searches match one user's rows.
+INTERACTIONS_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS interactions_fts USING fts5(
+        message, response, owner, content='', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS interactions_fts_ai AFTER INSERT ON interactions BEGIN
+        INSERT INTO interactions_fts(rowid, message, response, owner) VALUES (new.id, new.message, new.response, 'u' || new.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS interactions_fts_ad AFTER DELETE ON interactions BEGIN
+        INSERT INTO interactions_fts(interactions_fts, rowid, message, response, owner) VALUES ('delete', old.id, old.message, old.response, 'u' || old.user_id);
+    END""",
+    # Only text (or owner) edits touch the index, not archived_at/phase updates
+    """CREATE TRIGGER IF NOT EXISTS interactions_fts_au AFTER UPDATE OF message, response, user_id ON interactions BEGIN
+        INSERT INTO interactions_fts(interactions_fts, rowid, message, response, owner) VALUES ('delete', old.id, old.message, old.response, 'u' || old.user_id);
+        INSERT INTO interactions_fts(rowid, message, response, owner) VALUES (new.id, new.message, new.response, 'u' || new.user_id);
+    END""",
+]
+
+for statement in INTERACTIONS_FTS_DDL:
+    event.listen(Interaction.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+
+class InteractionEmbedding(Base):
+    __tablename__ = "interaction_embeddings"
+    interaction_id = Column(Integer, ForeignKey("interactions.id"), primary_key=True)
+    model = Column(String, nullable=False)  # Embedding model that produced the vector
+    dim = Column(Integer, nullable=False)
+    vector = Column(LargeBinary, nullable=False)  # float32 bytes, length dim * 4
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    interaction = relationship("Interaction", back_populates="embedding")
 
 class Cycle(Base):
     __tablename__ = "cycles"
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     start_date = Column(DateTime, nullable=False)
-    symptoms = Column(Text)
+    symptoms = Column(Text)  # Free text as logged
     moods = Column(Text)
+    tags = Column(JSON)  # Parsed from the text: {"symptoms": [{"tag", "severity"}], "moods": [...]}; rows in symptom_events
     
     user = relationship("User", back_populates="cycles")
 
+# Latest cycle for a user (phase lookups)
+Index("ix_cycles_user_start_date", Cycle.user_id, Cycle.start_date.desc())
+
+class SymptomEvent(Base):
+    """A symptom or mood mention extracted from a cycle log or chat message at write time."""
+    __tablename__ = "symptom_events"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    date = Column(DateTime, nullable=False)
+    symptom = Column(String, nullable=False)  # Canonical name, e.g. 'cramps', 'mood_changes'
+    kind = Column(String, nullable=False, default="symptom")  # 'symptom' or 'mood'
+    severity = Column(Integer)  # 1 mild, 2 moderate, 3 severe; None if not stated
+    phase = Column(String)  # Cycle phase on that date
+    source = Column(String, nullable=False)  # 'cycle' or 'interaction'
+    source_id = Column(Integer, nullable=False)  # Id of the cycles/interactions row
+
+    __table_args__ = (
+        Index("ix_symptom_events_user_date", "user_id", "date"),
+        Index("ix_symptom_events_user_symptom_date", "user_id", "symptom", "date"),
+        Index("ix_symptom_events_source", "source", "source_id"),
+    )
+
 class Reminder(Base):
     __tablename__ = "reminders"
     id = Column(Integer, primary_key=True, index=True)
@@ -54,6 +118,8 @@ class Reminder(Base):
     
     user = relationship("User", back_populates="reminders")
 
+Index("ix_reminders_user_id", Reminder.user_id)
+
 class Partner(Base):
     __tablename__ = "partners"
     id = Column(Integer, primary_key=True, index=True)
@@ -63,3 +129,34 @@ class Partner(Base):
     status = Column(String, default="pending")  # pending, accepted, revoked
     user = relationship("User", back_populates="partners", foreign_keys=[user_id])
     partner = relationship("User", back_populates="partner_of", foreign_keys=[partner_user_id])
+
+# Links shared with a user, and duplicate-invite checks
+Index("ix_partners_partner_user_status", Partner.partner_user_id, Partner.status)
+Index("ix_partners_user_partner", Partner.user_id, Partner.partner_user_id)
+
+class JobCheckpoint(Base):
+    __tablename__ = "job_checkpoints"
+    name = Column(String, primary_key=True)  # e.g. 'embedding_backfill:<model>'
+    last_id = Column(Integer, default=0)  # Highest row id fully processed
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+    version = Column(Integer, primary_key=True)  # Applied migration, see migrations.py
+    name = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+class UserCycleStats(Base):
+    """Per-user cycle statistics, updated as cycles are logged (see cycles.record_cycle)."""
+    __tablename__ = "user_cycle_stats"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    last_start = Column(DateTime, nullable=False)  # Latest logged period start
+    cycle_count = Column(Integer, nullable=False, default=0)  # Logged cycles
+    length_count = Column(Integer, nullable=False, default=0)  # Cycle lengths counted in the average
+    avg_cycle_length = Column(Float)  # Days between consecutive starts
+    cycle_length_variance = Column(Float)
+    avg_period_length = Column(Float)  # From the user's profile (users.period_duration)
+    phase = Column(String)  # Phase as of the last update, valid until phase_until
+    phase_until = Column(DateTime)  # Start of the next phase
+    next_period = Column(DateTime)  # Estimated next period start
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
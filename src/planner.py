@@ -2,7 +2,7 @@
 planner.py
 
 Enhanced agentic AI planner for CycleWise that implements:
-- Memory retrieval using vector similarity (via Google Vertex AI embeddings + FAISS)
+- Memory retrieval using hybrid BM25 + vector similarity (FTS5 + FAISS, rank fusion)
 - ReAct pattern (Thought → Action → Observation → Reflection → Final Answer)
 - Multi-step reasoning with Gemini API
 - Structured task output with categories and reasons
@@ -13,14 +13,13 @@ import logging
 from typing import List, Dict, Any, Optional
 from executor import call_gemini
 from database import get_db
-from models import Interaction
 from sqlalchemy.orm import Session
 from external_tools import CalendarTool, HealthTrackingTool, MedicalInfoTool, WeatherTool
-from datetime import datetime
 import models
-from google.cloud import aiplatform_v1
-import faiss
-import numpy as np
+from cycles import stats_phase
+from vector_store import format_interaction
+from retrieval import retrieve_memories
+from symptom_extraction import VOCABULARY, extract_mentions, latest_symptom, recent_symptoms as recent_symptom_counts
 
 logger = logging.getLogger(__name__)
 
@@ -33,46 +32,20 @@ SUPPORTED_TASK_TYPES = [
     "send_partner_update",
 ]
 
-# Vector embedding client setup (Google Vertex AI)
-def embed_text(texts: List[str]) -> List[List[float]]:
-    client = aiplatform_v1.PredictionServiceClient()
-    endpoint = "projects/your-project/locations/us-central1/publishers/google/models/textembedding-gecko"
-
-    instances = [{"content": t} for t in texts]
-    response = client.predict(endpoint=endpoint, instances=instances)
-    return [list(pred.embedding) for pred in response.predictions]
-
-# Vector store (in-memory FAISS index)
-embedding_dim = 768  # Depending on model used
-memory_index = faiss.IndexFlatL2(embedding_dim)
-memory_texts: List[str] = []
-
-
-def update_memory_index(user_id: int, db: Session):
-    global memory_index, memory_texts
-    interactions = (
-        db.query(Interaction)
-        .filter(Interaction.user_id == user_id)
-        .order_by(Interaction.timestamp.desc())
-        .limit(100)
-        .all()
-    )
-    memory_texts = [f"User: {i.message}\nAI: {i.response}" for i in interactions]
-    if memory_texts:
-        vectors = embed_text(memory_texts)
-        memory_index = faiss.IndexFlatL2(len(vectors[0]))
-        memory_index.add(np.array(vectors).astype('float32'))
-
+PHASE_DESCRIPTIONS = {
+    "menstrual": "You're in your menstrual phase. This is normal to experience cramps, fatigue, and mood changes.",
+    "follicular": "You're in the follicular phase. Energy levels typically increase, and you may feel more optimistic.",
+    "ovulatory": "You're in the ovulatory phase. This is your peak fertility window and you may feel confident and social.",
+    "luteal": "You're in the luteal phase. PMS symptoms like bloating and mood swings are common.",
+}
 
 def get_relevant_memory(user_id: int, user_input: str, db: Session) -> str:
     try:
-        update_memory_index(user_id, db)
-        if not memory_texts:
+        interactions = retrieve_memories(user_id, user_input, db, k=5)
+        if not interactions:
             return "No memory available."
 
-        query_vector = np.array(embed_text([user_input])[0]).astype('float32').reshape(1, -1)
-        _, I = memory_index.search(query_vector, k=5)
-        retrieved = [memory_texts[i] for i in I[0] if i < len(memory_texts)]
+        retrieved = [format_interaction(i.message, i.response) for i in interactions]
 
         memory_context = "Relevant past interactions:\n\n" + "\n\n".join(retrieved)
         return memory_context
@@ -109,13 +82,10 @@ def execute_action(action: str, user_id: int, db: Session) -> str:
         
         # Medical information
         elif "get_medical_info" in action.lower() or "research_symptom" in action.lower():
-            # Extract symptom from action (simplified)
-            symptoms = ["cramps", "fatigue", "mood_changes", "bloating"]
-            detected_symptom = None
-            for symptom in symptoms:
-                if symptom in action.lower():
-                    detected_symptom = symptom
-                    break
+            # Symptom named in the action, else the user's latest logged symptom
+            mentions = [name for name in VOCABULARY if name in action.lower()] or \
+                [name for name, _, _ in extract_mentions(action)]
+            detected_symptom = mentions[0] if mentions else latest_symptom(db, user_id)
             
             if detected_symptom:
                 medical_info = MedicalInfoTool.get_medical_info(detected_symptom)
@@ -130,29 +100,15 @@ def execute_action(action: str, user_id: int, db: Session) -> str:
         
         # Cycle phase check
         elif "check_cycle_phase" in action.lower():
-            # Get user's last cycle data
-            last_cycle = db.query(models.Cycle).filter(models.Cycle.user_id == user_id).order_by(models.Cycle.start_date.desc()).first()
-            if last_cycle:
-                days_since = (datetime.utcnow() - last_cycle.start_date).days
-                if days_since <= 4:
-                    phase = "menstrual"
-                    phase_description = "You're in your menstrual phase. This is normal to experience cramps, fatigue, and mood changes."
-                elif days_since <= 13:
-                    phase = "follicular"
-                    phase_description = "You're in the follicular phase. Energy levels typically increase, and you may feel more optimistic."
-                elif days_since <= 16:
-                    phase = "ovulatory"
-                    phase_description = "You're in the ovulatory phase. This is your peak fertility window and you may feel confident and social."
-                elif days_since <= 28:
-                    phase = "luteal"
-                    phase_description = "You're in the luteal phase. PMS symptoms like bloating and mood swings are common."
-                else:
-                    phase = "unknown"
-                    phase_description = "Cycle phase unclear. Consider logging your period start date."
+            # User's cycle stats (one primary-key read)
+            stats = db.get(models.UserCycleStats, user_id)
+            if stats:
+                phase, days_since = stats_phase(stats)
+                phase_description = PHASE_DESCRIPTIONS.get(phase, "Cycle phase unclear. Consider logging your period start date.")
                 
-                # Get recent symptoms and moods for context
-                recent_symptoms = last_cycle.symptoms if last_cycle.symptoms else "None logged"
-                recent_moods = last_cycle.moods if last_cycle.moods else "None logged"
+                # Recent symptoms and moods from extracted events (last 30 days)
+                recent_symptoms = ", ".join(name for name, _ in recent_symptom_counts(db, user_id, kind="symptom")) or "None logged"
+                recent_moods = ", ".join(name for name, _ in recent_symptom_counts(db, user_id, kind="mood")) or "None logged"
                 
                 return f"Cycle Phase: {phase} (day {days_since}). {phase_description} Recent symptoms: {recent_symptoms}. Recent moods: {recent_moods}."
             else:
@@ -0,0 +1,243 @@
+"""
+retrieval.py
+Hybrid memory retrieval for CycleWise: BM25 keyword search and vector
+similarity run concurrently and are merged with reciprocal rank fusion.
+
+If the embedder or the vector index backend is slow or failing, retrieval
+answers from the lexical results alone and skips vector search for a
+cool-down period. A user whose index is still being loaded or built only
+gets lexical results for that request; it doesn't trip the breaker for
+everyone else.
+
+Fused candidates are over-fetched and re-ranked by a weighted score of
+relevance (normalized fused rank averaged with cosine similarity, 0-1),
+recency decay and a boost for memories from the same cycle phase the user
+is in now.
+
+Vector hits whose cosine similarity to the query is below the embedder's
+floor (see vector_store.min_similarity_floor) are dropped; keyword hits are
+kept whatever their cosine, since an exact term match is relevant even when
+the embedding disagrees. The final selection uses maximal marginal
+relevance so near-duplicate transcripts don't crowd the prompt.
+Fewer than k memories (or none) are returned when fewer are relevant.
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Sequence, Tuple, Optional
+import numpy as np
+from sqlalchemy.orm import Session
+from cycles import current_phase
+from lexical_index import bm25_search
+from embeddings import get_embedder
+from vector_store import memory_store, load_interactions, load_embeddings, normalize
+import models
+
+logger = logging.getLogger(__name__)
+
+MEMORY_VECTOR_TIMEOUT = float(os.getenv("MEMORY_VECTOR_TIMEOUT", "2.0"))  # seconds
+MEMORY_VECTOR_COOLDOWN = float(os.getenv("MEMORY_VECTOR_COOLDOWN", "30.0"))  # seconds
+RRF_K = int(os.getenv("MEMORY_RRF_K", "60"))
+CANDIDATES_PER_RETRIEVER = 20
+RERANK_CANDIDATES = int(os.getenv("MEMORY_RERANK_CANDIDATES", "30"))
+
+# Re-ranking score weights
+WEIGHT_SIMILARITY = float(os.getenv("MEMORY_WEIGHT_SIMILARITY", "1.0"))
+WEIGHT_RECENCY = float(os.getenv("MEMORY_WEIGHT_RECENCY", "0.3"))
+WEIGHT_PHASE = float(os.getenv("MEMORY_WEIGHT_PHASE", "0.2"))
+RECENCY_HALF_LIFE_DAYS = float(os.getenv("MEMORY_RECENCY_HALF_LIFE_DAYS", "30"))
+
+# Maximal marginal relevance: trade-off between relevance (1.0) and novelty (0.0),
+# and the similarity above which a candidate counts as a duplicate outright
+MMR_LAMBDA = float(os.getenv("MEMORY_MMR_LAMBDA", "0.7"))
+DUPLICATE_SIMILARITY = float(os.getenv("MEMORY_DUPLICATE_SIMILARITY", "0.95"))
+
+_vector_pool = ThreadPoolExecutor(max_workers=int(os.getenv("MEMORY_VECTOR_WORKERS", "8")), thread_name_prefix="memory-vector")
+# Circuit breaker per failure source ("embedder", "backend"): monotonic time it stays open until
+_vector_down_until: Dict[str, float] = {}
+_state_lock = threading.Lock()
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = RRF_K) -> List[Tuple[int, float]]:
+    """
+    Fuse ranked id lists: each id scores sum(1 / (k + rank)) over the lists
+    it appears in. Returns (id, score) pairs, best first.
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
+
+
+def fused_relevance(fused: List[Tuple[int, float]], cosine: Dict[int, float], lists: int,
+                    k: int = RRF_K) -> List[Tuple[int, float]]:
+    """
+    Relevance in [0, 1] per fused candidate, the scale rerank_scores expects.
+    RRF scores are rank-based (about 1/k), so they are divided by the best
+    possible score (rank 1 in each of the `lists` non-empty rankings); a
+    candidate with a cosine similarity to the query averages the two.
+    """
+    best = max(lists, 1) / (k + 1.0)
+    relevance = []
+    for interaction_id, score in fused:
+        value = min(score / best, 1.0)
+        if interaction_id in cosine:
+            value = (value + min(max(cosine[interaction_id], 0.0), 1.0)) / 2.0
+        relevance.append((interaction_id, value))
+    return relevance
+
+
+def rerank_scores(similarity: np.ndarray, age_days: np.ndarray, same_phase: np.ndarray) -> np.ndarray:
+    """
+    Combined score per candidate:
+        w_sim * similarity
+      + w_rec * 0.5 ** (age_days / half_life)
+      + w_phase * same_phase
+    similarity must be on a 0-1 scale (a cosine similarity or fused_relevance),
+    the range the weights are tuned for; recency is in (0, 1] and same_phase 0 or 1.
+    """
+    similarity = np.clip(similarity, 0.0, 1.0)
+    recency = np.exp2(-np.maximum(age_days, 0.0) / RECENCY_HALF_LIFE_DAYS)
+    return WEIGHT_SIMILARITY * similarity + WEIGHT_RECENCY * recency + WEIGHT_PHASE * same_phase
+
+
+def rerank(db: Session, candidates: List[Tuple[int, float]], phase: Optional[str],
+           now: datetime = None) -> List[Tuple[int, float]]:
+    """Re-rank (interaction_id, 0-1 relevance) candidates; return (id, score) pairs, best first."""
+    if not candidates:
+        return []
+    now = now or datetime.utcnow()
+    ids = [interaction_id for interaction_id, _ in candidates]
+    meta = {
+        row.id: row for row in
+        db.query(models.Interaction.id, models.Interaction.timestamp, models.Interaction.phase)
+        .filter(models.Interaction.id.in_(ids))
+        .all()
+    }
+    ids = [interaction_id for interaction_id in ids if interaction_id in meta]
+    similarity = np.array([score for interaction_id, score in candidates if interaction_id in meta], dtype="float64")
+    age_days = np.array([(now - (meta[i].timestamp or now)).total_seconds() / 86400.0 for i in ids], dtype="float64")
+    same_phase = np.array([phase is not None and meta[i].phase == phase for i in ids], dtype="float64")
+    scores = rerank_scores(similarity, age_days, same_phase)
+    order = np.argsort(-scores, kind="stable")
+    return [(ids[i], float(scores[i])) for i in order]
+
+
+def mmr_select(ranked: List[Tuple[int, float]], vectors: Dict[int, np.ndarray], k: int,
+               lam: float = MMR_LAMBDA, duplicate: float = DUPLICATE_SIMILARITY) -> List[int]:
+    """
+    Pick up to k ids from ranked (id, score) pairs by maximal marginal relevance:
+    each step takes the candidate maximizing
+        lam * score / max(score) - (1 - lam) * max cosine to those already picked
+    and candidates at least `duplicate`-similar to a picked one are dropped.
+    Candidates without a vector in vectors never count as redundant.
+    """
+    if not ranked:
+        return []
+    ids = [interaction_id for interaction_id, _ in ranked]
+    relevance = np.array([score for _, score in ranked], dtype="float64")
+    peak = relevance.max()
+    relevance = relevance / peak if peak > 0 else relevance
+    dim = next(iter(vectors.values())).shape[0] if vectors else 1
+    matrix = np.vstack([vectors.get(i, np.zeros(dim, dtype="float32")) for i in ids])
+
+    redundancy = np.zeros(len(ids))
+    remaining = np.ones(len(ids), dtype=bool)
+    selected: List[int] = []
+    while len(selected) < k and remaining.any():
+        marginal = np.where(remaining, lam * relevance - (1 - lam) * redundancy, -np.inf)
+        best = int(np.argmax(marginal))
+        remaining[best] = False
+        selected.append(ids[best])
+        redundancy = np.maximum(redundancy, matrix @ matrix[best])
+        remaining &= redundancy < duplicate
+    return selected
+
+
+def _vector_available() -> bool:
+    now = time.monotonic()
+    with _state_lock:
+        return all(now >= until for until in _vector_down_until.values())
+
+
+def _mark_vector_down(source: str, reason: str):
+    with _state_lock:
+        _vector_down_until[source] = time.monotonic() + MEMORY_VECTOR_COOLDOWN
+    logger.warning(f"Vector memory search unavailable ({source}: {reason}); lexical-only for {MEMORY_VECTOR_COOLDOWN:.0f}s")
+
+
+class _VectorSearch:
+    """Vector leg of one retrieval; `stage` says where it is, so a failure can be attributed."""
+
+    def __init__(self, user_id: int, query: str, bind, k: int):
+        self.user_id = user_id
+        self.query = query
+        self.bind = bind
+        self.k = k
+        self.stage = "embedder"
+
+    def __call__(self) -> Tuple[np.ndarray, List[Tuple[int, float]]]:
+        # Runs on a pool thread, so it gets its own session on the request's engine
+        db = Session(bind=self.bind)
+        try:
+            query_vector = get_embedder().embed([self.query])[0]
+            self.stage = "index"  # Per-user load/build: slow for this user only
+            memory_store.get_index(self.user_id, db)
+            self.stage = "backend"
+            return query_vector, memory_store.search(self.user_id, self.query, db, k=self.k, query_vector=query_vector)
+        finally:
+            db.close()
+
+
+def retrieve_memories(user_id: int, query: str, db: Session, k: int = 5) -> List[models.Interaction]:
+    """
+    Return the user's k most relevant past interactions for query.
+    """
+    vector_future = None
+    if _vector_available():
+        vector_search = _VectorSearch(user_id, query, db.get_bind(), CANDIDATES_PER_RETRIEVER)
+        vector_future = _vector_pool.submit(vector_search)
+
+    try:
+        lexical_hits = bm25_search(db, user_id, query, k=CANDIDATES_PER_RETRIEVER)
+    except Exception as e:
+        logger.error(f"Lexical memory search failed: {e}")
+        lexical_hits = []
+
+    query_vector = None
+    vector_hits: List[Tuple[int, float]] = []
+    if vector_future is not None:
+        try:
+            query_vector, vector_hits = vector_future.result(timeout=MEMORY_VECTOR_TIMEOUT)
+        except FutureTimeoutError:
+            if vector_search.stage == "index":
+                logger.info(f"Memory index for user {user_id} still loading; lexical-only for this request")
+            else:
+                _mark_vector_down(vector_search.stage, f"timed out after {MEMORY_VECTOR_TIMEOUT}s")
+        except Exception as e:
+            if vector_search.stage == "index":
+                logger.error(f"Loading memory index for user {user_id} failed: {e}")
+            else:
+                _mark_vector_down(vector_search.stage, str(e))
+
+    fused = reciprocal_rank_fusion([
+        [interaction_id for interaction_id, _ in lexical_hits],
+        [interaction_id for interaction_id, _ in vector_hits],
+    ])[:RERANK_CANDIDATES]
+
+    # Vector hits were already held to the similarity floor by the store; stored
+    # vectors are loaded for every candidate so MMR can spot near-duplicates
+    vectors = load_embeddings(db, [interaction_id for interaction_id, _ in fused])
+    cosine = dict(vector_hits)
+    if query_vector is not None:
+        query_unit = normalize(query_vector)[0]
+        cosine.update((interaction_id, float(vector @ query_unit)) for interaction_id, vector in vectors.items())
+
+    relevance = fused_relevance(fused, cosine, lists=sum(1 for hits in (lexical_hits, vector_hits) if hits))
+    ranked = rerank(db, relevance, current_phase(user_id, db))
+    return load_interactions(db, mmr_select(ranked, vectors, k))
@@ -3,14 +3,20 @@ routers.py
 API routes for CycleWise backend.
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database import get_db
+from database import engine, get_db, get_async_db, get_read_db, get_async_read_db
 import models
 import auth
 import schemas
+from cycle_import import CycleImport, CycleImportError, insert_cycles, parser_for
+from cycles import rebuild_user_stats, record_cycle, stats_phase, stats_summary
+from db_writer import writer_for_bind
+from symptom_extraction import co_occurring_symptoms, cycle_tags, record_cycle_events, symptom_frequency
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 router = APIRouter()
 
@@ -33,7 +39,7 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     return db_user
 
 @router.get("/me", response_model=schemas.UserOut)
-def get_current_user(current_user: models.User = Depends(auth.get_current_user)):
+def get_current_user(current_user: models.User = Depends(auth.get_current_reader)):
     return current_user
 
 @router.put("/me", response_model=schemas.UserOut)
@@ -48,64 +54,121 @@ def update_user(
         current_user.cycle_start_date = user_update.cycle_start_date
     if user_update.period_duration is not None:
         current_user.period_duration = user_update.period_duration
+        stats = db.get(models.UserCycleStats, current_user.id)
+        if stats:
+            stats.avg_period_length = user_update.period_duration
     
     db.commit()
     db.refresh(current_user)
     return current_user
 
 # --- Cycle/Phase Management ---
+# Async handlers: GETs use the async read engine, writes go through the group-commit writer
 @router.post("/cycles", response_model=schemas.CycleOut)
-def log_cycle(
+async def log_cycle(
     cycle: schemas.CycleCreate,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user_async),
 ):
     new_cycle = models.Cycle(
         user_id=current_user.id,
         start_date=cycle.start_date,
         symptoms=cycle.symptoms,
         moods=cycle.moods,
+        tags=cycle_tags(cycle.symptoms, cycle.moods),
     )
-    db.add(new_cycle)
-    db.commit()
-    db.refresh(new_cycle)
-    return new_cycle
+    def op(session: Session):
+        session.add(new_cycle)
+        session.flush()
+        record_cycle_events(session, new_cycle, logged_at=datetime.utcnow())
+        record_cycle(session, new_cycle)
+        return new_cycle
+    return await writer_for_bind(engine).submit_async(op)
+
+@router.post("/cycles/import")
+async def import_cycles(
+    request: Request,
+    format: Optional[str] = None,
+    current_user: models.User = Depends(auth.get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Bulk import cycle history from another app's CSV/JSON export, streamed as the raw request body."""
+    try:
+        parser = parser_for(format, request.headers.get("content-type"))
+    except CycleImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result = await db.execute(select(models.Cycle.start_date).filter(models.Cycle.user_id == current_user.id))
+    importer = CycleImport(current_user.id, (start.date() for start in result.scalars()))
+    writer = writer_for_bind(engine)
+    user_id = current_user.id
+
+    async def write(rows):
+        await writer.submit_async(lambda session: insert_cycles(session, user_id, rows))
+
+    try:
+        try:
+            async for chunk in request.stream():
+                for row, record in parser.feed(chunk):
+                    if importer.add(row, record):
+                        await write(importer.take())
+            for row, record in parser.close():
+                importer.add(row, record)
+        except CycleImportError as e:
+            raise HTTPException(status_code=400, detail=f"{e} ({importer.counts['inserted']} cycles already imported)")
+        await write(importer.take())
+    finally:
+        # Batches already committed stay, so their stats must too
+        if importer.counts["inserted"]:
+            await writer.submit_async(lambda session: rebuild_user_stats(session, user_id))
+    return importer.summary()
 
 @router.get("/cycles", response_model=List[schemas.CycleOut])
-def get_cycles(
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+async def get_cycles(
+    current_user: models.User = Depends(auth.get_current_reader_async),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    cycles = db.query(models.Cycle).filter(models.Cycle.user_id == current_user.id).all()
-    return cycles
+    result = await db.execute(select(models.Cycle).filter(models.Cycle.user_id == current_user.id))
+    return result.scalars().all()
 
 @router.get("/phase")
-def get_current_phase(
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db),
+async def get_current_phase(
+    current_user: models.User = Depends(auth.get_current_reader_async),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
-    last_cycle = db.query(models.Cycle).filter(models.Cycle.user_id == current_user.id).order_by(models.Cycle.start_date.desc()).first()
-    if not last_cycle:
+    stats = await db.get(models.UserCycleStats, current_user.id)
+    if not stats:
         return {"phase": None, "message": "No cycle data found."}
-    days_since = (datetime.utcnow() - last_cycle.start_date).days
-    if days_since <= 4:
-        phase = "menstrual"
-    elif days_since <= 13:
-        phase = "follicular"
-    elif days_since <= 16:
-        phase = "ovulatory"
-    elif days_since <= 28:
-        phase = "luteal"
-    else:
-        phase = "unknown"
-    return {"phase": phase, "days_since": days_since}
+    return stats_summary(stats)
+
+# --- Symptom Analytics ---
+@router.get("/symptoms/frequency")
+def get_symptom_frequency(
+    phase: Optional[str] = None,
+    kind: Optional[str] = None,
+    days: Optional[int] = None,
+    current_user: models.User = Depends(auth.get_current_reader),
+    db: Session = Depends(get_read_db),
+):
+    """How often each symptom/mood was logged, optionally in one cycle phase, e.g. ?phase=luteal."""
+    rows = symptom_frequency(db, current_user.id, phase=phase, kind=kind, days=days)
+    return [
+        {"symptom": symptom, "count": count, "avg_severity": round(severity, 2) if severity is not None else None}
+        for symptom, count, severity in rows
+    ]
+
+@router.get("/symptoms/{symptom}/co-occurring")
+def get_co_occurring_symptoms(
+    symptom: str,
+    current_user: models.User = Depends(auth.get_current_reader),
+    db: Session = Depends(get_read_db),
+):
+    """Symptoms/moods most often logged together with `symptom`."""
+    return [{"symptom": other, "count": count} for other, count in co_occurring_symptoms(db, current_user.id, symptom)]
 
 # --- Reminders ---
 @router.post("/reminders", response_model=schemas.ReminderOut)
-def create_reminder(
+async def create_reminder(
     reminder: schemas.ReminderCreate,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: models.User = Depends(auth.get_current_user_async),
 ):
     new_reminder = models.Reminder(
         user_id=current_user.id,
@@ -113,37 +176,36 @@ def create_reminder(
         time=reminder.time,
         method=reminder.method
     )
-    db.add(new_reminder)
-    db.commit()
-    db.refresh(new_reminder)
-    return new_reminder
+    return await writer_for_bind(engine).add_async(new_reminder)
 
 @router.get("/reminders", response_model=List[schemas.ReminderOut])
-def get_reminders(
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+async def get_reminders(
+    current_user: models.User = Depends(auth.get_current_reader_async),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    reminders = db.query(models.Reminder).filter(models.Reminder.user_id == current_user.id).all()
-    return reminders
+    result = await db.execute(select(models.Reminder).filter(models.Reminder.user_id == current_user.id))
+    return result.scalars().all()
 
 # --- Partner Features ---
 @router.post("/invite-partner")
-def invite_partner(
+async def invite_partner(
     partner_email: str,
     consent_type: str = "cycle",
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: models.User = Depends(auth.get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Find partner user
-    partner_user = db.query(models.User).filter(models.User.email == partner_email).first()
+    result = await db.execute(select(models.User).filter(models.User.email == partner_email))
+    partner_user = result.scalars().first()
     if not partner_user:
         raise HTTPException(status_code=404, detail="Partner user not found")
     
     # Check if invitation already exists
-    existing_invite = db.query(models.Partner).filter(
+    result = await db.execute(select(models.Partner).filter(
         models.Partner.user_id == current_user.id,
         models.Partner.partner_user_id == partner_user.id
-    ).first()
+    ))
+    existing_invite = result.scalars().first()
     
     if existing_invite:
         raise HTTPException(status_code=400, detail="Invitation already sent")
@@ -155,23 +217,25 @@ def invite_partner(
         consent_type=consent_type,
         status="pending"
     )
-    db.add(partner_relation)
-    db.commit()
+    await writer_for_bind(engine).add_async(partner_relation)
     
     return {"message": f"Invitation sent to {partner_email}"}
 
 @router.get("/shared-info")
-def get_shared_info(
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db),
+async def get_shared_info(
+    current_user: models.User = Depends(auth.get_current_reader_async),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     # Show info shared with the current user as a partner
-    partner_links = db.query(models.Partner).filter(models.Partner.partner_user_id == current_user.id, models.Partner.status == "accepted").all()
+    result = await db.execute(select(models.Partner).filter(
+        models.Partner.partner_user_id == current_user.id, models.Partner.status == "accepted"))
+    partner_links = result.scalars().all()
     shared = []
     for link in partner_links:
-        owner = db.query(models.User).filter(models.User.id == link.user_id).first()
+        owner = await db.get(models.User, link.user_id)
         if link.consent_type == "cycle":
-            cycles = db.query(models.Cycle).filter(models.Cycle.user_id == owner.id).all()
+            result = await db.execute(select(models.Cycle).filter(models.Cycle.user_id == owner.id))
+            cycles = result.scalars().all()
             shared.append({
                 "owner": owner.email,
                 "cycles": [
@@ -188,8 +252,8 @@ def get_shared_info(
 # --- Health & External Data ---
 @router.get("/health")
 def get_health_data(
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: models.User = Depends(auth.get_current_reader),
+    db: Session = Depends(get_read_db)
 ):
     """Get comprehensive health data including hydration, exercise, and sleep."""
     from external_tools import HealthTrackingTool
@@ -214,8 +278,8 @@ def get_health_data(
 
 @router.get("/calendar")
 def get_calendar_data(
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: models.User = Depends(auth.get_current_reader),
+    db: Session = Depends(get_read_db)
 ):
     """Get calendar data and stress analysis."""
     from external_tools import CalendarTool
@@ -243,8 +307,8 @@ def get_calendar_data(
 
 @router.get("/weather")
 def get_weather_data(
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: models.User = Depends(auth.get_current_reader),
+    db: Session = Depends(get_read_db)
 ):
     """Get weather data and its impact on symptoms."""
     from external_tools import WeatherTool
@@ -271,8 +335,8 @@ def get_weather_data(
 
 @router.get("/health/insights")
 def get_health_insights(
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: models.User = Depends(auth.get_current_reader),
+    db: Session = Depends(get_read_db)
 ):
     """Get AI-powered health insights based on current data."""
     from external_tools import HealthTrackingTool, CalendarTool, WeatherTool
@@ -284,19 +348,8 @@ def get_health_insights(
         weather_data = WeatherTool.get_weather_data()
         
         # Get current phase
-        last_cycle = db.query(models.Cycle).filter(models.Cycle.user_id == current_user.id).order_by(models.Cycle.start_date.desc()).first()
-        days_since = (datetime.utcnow() - last_cycle.start_date).days if last_cycle else 0
-        
-        if days_since <= 4:
-            phase = "menstrual"
-        elif days_since <= 13:
-            phase = "follicular"
-        elif days_since <= 16:
-            phase = "ovulatory"
-        elif days_since <= 28:
-            phase = "luteal"
-        else:
-            phase = "unknown"
+        stats = db.get(models.UserCycleStats, current_user.id)
+        phase = stats_phase(stats)[0] if stats else "menstrual"
         
         # Generate insights
         insights = {
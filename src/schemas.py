@@ -68,6 +68,7 @@ class CycleOut(BaseModel):
     start_date: datetime
     symptoms: Optional[str]
     moods: Optional[str]
+    tags: Optional[dict] = None  # {"symptoms": [{"tag", "severity"}], "moods": [...]}
 
     class Config:
         orm_mode = True
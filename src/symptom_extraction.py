@@ -0,0 +1,313 @@
+"""
+symptom_extraction.py
+Write-time extraction of symptom and mood mentions into symptom_events.
+
+Cycle logs (cycles.symptoms / cycles.moods) and chat messages are scanned
+once, when they are written, and each mention is normalized to a canonical
+name with an optional severity. The resulting SymptomEvent rows are
+indexed by (user_id, date) and (user_id, symptom, date), so analytics and
+the planner query rows instead of re-parsing text on every request. Cycles
+also keep their parsed tags in the cycles.tags JSON column.
+
+Usage (one-off backfill of rows written before extraction existed):
+    python symptom_extraction.py --backfill
+"""
+
+import re
+import logging
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import and_, func, insert
+from sqlalchemy.orm import aliased, load_only
+from sqlalchemy.orm import Session
+from cycles import PHASE_LAST_DAY, PHASES, phase_for_day
+from database import SessionLocal
+from archive import hydrate
+import models
+
+logger = logging.getLogger(__name__)
+
+# Canonical name -> (kind, surface forms). Names match MedicalInfoTool's keys where they overlap.
+VOCABULARY: Dict[str, Tuple[str, List[str]]] = {
+    "cramps": ("symptom", ["cramps", "cramp", "cramping", "period pain", "menstrual pain", "pelvic pain"]),
+    "headache": ("symptom", ["headache", "headaches", "migraine", "migraines"]),
+    "bloating": ("symptom", ["bloating", "bloated", "bloat"]),
+    "fatigue": ("symptom", ["fatigue", "fatigued", "tired", "exhausted", "exhaustion", "no energy", "low energy"]),
+    "back_pain": ("symptom", ["back pain", "backache", "lower back pain", "back ache"]),
+    "acne": ("symptom", ["acne", "breakout", "breakouts", "pimples"]),
+    "nausea": ("symptom", ["nausea", "nauseous", "nauseated", "queasy"]),
+    "breast_tenderness": ("symptom", ["tender breasts", "breast tenderness", "sore breasts", "breast pain"]),
+    "insomnia": ("symptom", ["insomnia", "can't sleep", "cannot sleep", "trouble sleeping", "poor sleep"]),
+    "cravings": ("symptom", ["cravings", "craving", "food cravings"]),
+    "spotting": ("symptom", ["spotting"]),
+    "heavy_flow": ("symptom", ["heavy flow", "heavy bleeding", "heavy period"]),
+    "dizziness": ("symptom", ["dizzy", "dizziness", "lightheaded", "light-headed"]),
+    "mood_changes": ("mood", ["mood swings", "mood swing", "moody", "mood changes"]),
+    "irritability": ("mood", ["irritable", "irritability", "irritated", "cranky", "angry"]),
+    "anxiety": ("mood", ["anxious", "anxiety", "nervous", "worried"]),
+    "low_mood": ("mood", ["sad", "depressed", "low mood", "weepy", "crying"]),
+    "calm": ("mood", ["calm", "relaxed", "content"]),
+    "happy": ("mood", ["happy", "good mood", "energetic", "upbeat"]),
+}
+
+SEVERITY_WORDS = {
+    1: ["mild", "slight", "slightly", "a bit", "a little", "minor", "light"],
+    2: ["moderate", "noticeable"],
+    3: ["severe", "terrible", "awful", "really bad", "extreme", "intense", "unbearable", "horrible", "very bad", "so bad"],
+}
+NEGATIONS = ["no", "not", "without", "never", "don't have", "didn't have", "isn't", "aren't", "wasn't"]
+CONTEXT_WORDS = 4  # Words before a mention checked for severity and negation
+
+
+def _phrase_pattern(phrases: List[str]) -> str:
+    return "|".join(re.escape(p) for p in sorted(phrases, key=len, reverse=True))
+
+
+_MENTION = re.compile(
+    r"\b(" + _phrase_pattern([form for _, forms in VOCABULARY.values() for form in forms]) + r")\b",
+    re.IGNORECASE,
+)
+_CANONICAL = {form: name for name, (_, forms) in VOCABULARY.items() for form in forms}
+_SEVERITY = [(level, re.compile(r"\b(" + _phrase_pattern(words) + r")\b")) for level, words in SEVERITY_WORDS.items()]
+_NEGATION = re.compile(r"\b(" + _phrase_pattern(NEGATIONS) + r")\b")
+_CLAUSE_BREAK = re.compile(r"[.,;!?]|\b(?:but|and)\b")
+
+
+def extract_mentions(text: Optional[str]) -> List[Tuple[str, str, Optional[int]]]:
+    """
+    Canonical (symptom, kind, severity) mentions in text, one per symptom
+    (the highest stated severity wins). Negated mentions ("no cramps") are
+    skipped.
+    """
+    if not text:
+        return []
+    found: Dict[str, Tuple[str, Optional[int]]] = {}
+    previous_end = 0
+    for match in _MENTION.finditer(text):
+        name = _CANONICAL[match.group(1).lower()]
+        # Look back a few words, stopping at the previous clause or mention
+        before = _CLAUSE_BREAK.split(text[previous_end:match.start()].lower())[-1]
+        previous_end = match.end()
+        context = " ".join(before.split()[-CONTEXT_WORDS:])
+        if _NEGATION.search(context):
+            continue
+        severity = None
+        for level, pattern in _SEVERITY:
+            if pattern.search(context):
+                severity = level if severity is None else max(severity, level)
+        kind = VOCABULARY[name][0]
+        previous = found.get(name)
+        if previous is None or (severity or 0) > (previous[1] or 0):
+            found[name] = (kind, severity)
+    return [(name, kind, severity) for name, (kind, severity) in found.items()]
+
+
+def build_events(user_id: int, text: Optional[str], date: datetime, phase: Optional[str],
+                 source: str, source_id: int) -> List[models.SymptomEvent]:
+    return [
+        models.SymptomEvent(
+            user_id=user_id, date=date, symptom=symptom, kind=kind, severity=severity,
+            phase=phase, source=source, source_id=source_id,
+        )
+        for symptom, kind, severity in extract_mentions(text)
+    ]
+
+
+def cycle_tags(symptoms: Optional[str], moods: Optional[str]) -> Dict[str, List[Dict]]:
+    """Structured tags for a cycle log's free-text fields (the cycles.tags value)."""
+    text = ". ".join(part for part in (symptoms, moods) if part)
+    tags = {"symptoms": [], "moods": []}
+    for name, kind, severity in extract_mentions(text):
+        tags["moods" if kind == "mood" else "symptoms"].append({"tag": name, "severity": severity})
+    return tags
+
+
+def cycle_event_rows(user_id: int, cycle_id: int, start_date: datetime, tags: Dict[str, List[Dict]],
+                     date: Optional[datetime] = None) -> List[Dict]:
+    """
+    symptom_events column values for a cycle's tags (for bulk inserts). The
+    events are dated `date` (when they were noted, default the period start)
+    and tagged with the phase for that day of the cycle. A date before the
+    start, or past the cycle's last phase, is taken as the start itself.
+    """
+    if date is None or not 0 <= (date - start_date).days <= PHASE_LAST_DAY[PHASES[-1]]:
+        date = start_date
+    phase = phase_for_day((date - start_date).days)
+    return [
+        {"user_id": user_id, "date": date, "symptom": tag["tag"], "kind": kind, "severity": tag["severity"],
+         "phase": phase, "source": "cycle", "source_id": cycle_id}
+        for kind, group in (("symptom", tags["symptoms"]), ("mood", tags["moods"]))
+        for tag in group
+    ]
+
+
+def record_cycle_events(session: Session, cycle: models.Cycle,
+                        logged_at: Optional[datetime] = None) -> List[models.SymptomEvent]:
+    """
+    Add events for a flushed cycle log from its tags (parsed from
+    symptoms/moods if unset), dated when it was logged (see cycle_event_rows).
+    """
+    tags = cycle.tags if cycle.tags is not None else cycle_tags(cycle.symptoms, cycle.moods)
+    rows = cycle_event_rows(cycle.user_id, cycle.id, cycle.start_date, tags, date=logged_at)
+    events = [models.SymptomEvent(**row) for row in rows]
+    session.add_all(events)
+    return events
+
+
+def record_interaction_events(session: Session, interaction: models.Interaction) -> List[models.SymptomEvent]:
+    """Extract and add events for a flushed interaction (the user's message only)."""
+    events = build_events(interaction.user_id, interaction.message, interaction.timestamp,
+                          interaction.phase, "interaction", interaction.id)
+    session.add_all(events)
+    return events
+
+
+def delete_events(session: Session, source: str, source_id: int):
+    session.query(models.SymptomEvent).filter(
+        models.SymptomEvent.source == source, models.SymptomEvent.source_id == source_id
+    ).delete(synchronize_session=False)
+
+
+# --- Queries ---
+
+def recent_symptoms(db: Session, user_id: int, days: int = 30, kind: str = None, limit: int = 5) -> List[Tuple[str, int]]:
+    """The user's most frequent (symptom, count) pairs over the last `days` days."""
+    query = (
+        db.query(models.SymptomEvent.symptom, func.count(models.SymptomEvent.id))
+        .filter(models.SymptomEvent.user_id == user_id,
+                models.SymptomEvent.date >= datetime.utcnow() - timedelta(days=days))
+    )
+    if kind:
+        query = query.filter(models.SymptomEvent.kind == kind)
+    return (
+        query.group_by(models.SymptomEvent.symptom)
+        .order_by(func.count(models.SymptomEvent.id).desc(), func.max(models.SymptomEvent.date).desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def symptom_frequency(db: Session, user_id: int, phase: str = None, kind: str = None,
+                      days: int = None) -> List[Tuple[str, int, Optional[float]]]:
+    """
+    (symptom, times logged, average stated severity) for a user, most
+    frequent first, optionally within one cycle phase, kind or recent window.
+    """
+    query = db.query(
+        models.SymptomEvent.symptom, func.count(models.SymptomEvent.id), func.avg(models.SymptomEvent.severity)
+    ).filter(models.SymptomEvent.user_id == user_id)
+    if phase:
+        query = query.filter(models.SymptomEvent.phase == phase)
+    if kind:
+        query = query.filter(models.SymptomEvent.kind == kind)
+    if days:
+        query = query.filter(models.SymptomEvent.date >= datetime.utcnow() - timedelta(days=days))
+    return (
+        query.group_by(models.SymptomEvent.symptom)
+        .order_by(func.count(models.SymptomEvent.id).desc(), models.SymptomEvent.symptom)
+        .all()
+    )
+
+
+def co_occurring_symptoms(db: Session, user_id: int, symptom: str, limit: int = 10) -> List[Tuple[str, int]]:
+    """Symptoms and moods logged in the same cycle log or message as `symptom`, with how often."""
+    other = aliased(models.SymptomEvent)
+    return (
+        db.query(other.symptom, func.count(other.id))
+        .select_from(models.SymptomEvent)
+        .join(other, and_(other.source == models.SymptomEvent.source,
+                          other.source_id == models.SymptomEvent.source_id,
+                          other.symptom != models.SymptomEvent.symptom))
+        .filter(models.SymptomEvent.user_id == user_id, models.SymptomEvent.symptom == symptom)
+        .group_by(other.symptom)
+        .order_by(func.count(other.id).desc(), other.symptom)
+        .limit(limit)
+        .all()
+    )
+
+
+def latest_symptom(db: Session, user_id: int) -> Optional[str]:
+    row = (
+        db.query(models.SymptomEvent.symptom)
+        .filter(models.SymptomEvent.user_id == user_id, models.SymptomEvent.kind == "symptom")
+        .order_by(models.SymptomEvent.date.desc())
+        .first()
+    )
+    return row[0] if row else None
+
+
+# --- Backfill ---
+
+# Extraction reads explicit columns, never whole entities: migrations run it
+# before later migrations have added their columns to these tables.
+INTERACTION_COLUMNS = (models.Interaction.user_id, models.Interaction.message, models.Interaction.response,
+                       models.Interaction.timestamp, models.Interaction.phase, models.Interaction.archived_at)
+_SOURCES = {models.Cycle: "cycle", models.Interaction: "interaction"}
+
+
+def extract_chunk(db: Session, model, after_id: int = 0, limit: int = 1000) -> Optional[int]:
+    """
+    Extract events for up to `limit` rows of `model` (Cycle or Interaction)
+    with id > after_id that have none yet, without committing. Returns the
+    last id looked at, or None when there are no rows left.
+    """
+    source = _SOURCES[model]
+    if model is models.Cycle:
+        rows = (
+            db.query(models.Cycle.id, models.Cycle.user_id, models.Cycle.start_date, models.Cycle.symptoms, models.Cycle.moods)
+            .filter(models.Cycle.id > after_id).order_by(models.Cycle.id).limit(limit).all()
+        )
+    else:
+        rows = (
+            db.query(models.Interaction).options(load_only(*INTERACTION_COLUMNS))
+            .filter(models.Interaction.id > after_id).order_by(models.Interaction.id).limit(limit).all()
+        )
+    if not rows:
+        return None
+    last_id = rows[-1].id
+    done = {source_id for (source_id,) in db.query(models.SymptomEvent.source_id).filter(
+        models.SymptomEvent.source == source,
+        models.SymptomEvent.source_id.between(rows[0].id, last_id),
+    ).distinct()}
+    rows = [row for row in rows if row.id not in done]
+    if model is models.Cycle:
+        events = [event for cycle in rows for event in cycle_event_rows(
+            cycle.user_id, cycle.id, cycle.start_date, cycle_tags(cycle.symptoms, cycle.moods))]
+        if events:
+            db.execute(insert(models.SymptomEvent), events)
+    else:
+        hydrate(rows)  # Extract from the full text of archived interactions
+        for interaction in rows:
+            record_interaction_events(db, interaction)
+    return last_id
+
+
+def backfill(db: Session, batch_size: int = 1000) -> int:
+    """Extract events for cycles and interactions that have none yet. Returns events added."""
+    before = db.query(func.count(models.SymptomEvent.id)).scalar()
+    for model in _SOURCES:
+        last_id = 0
+        while last_id is not None:
+            last_id = extract_chunk(db, model, last_id, batch_size)
+            db.commit()
+    return db.query(func.count(models.SymptomEvent.id)).scalar() - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Symptom event extraction.")
+    parser.add_argument("--backfill", action="store_true", help="Extract events for existing cycles and interactions")
+    args = parser.parse_args()
+    if not args.backfill:
+        parser.print_help()
+        return
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        print(f"✅ Added {backfill(db)} symptom events.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
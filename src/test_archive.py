@@ -0,0 +1,111 @@
+"""
+test_archive.py
+
+Moves old interactions to the cold archive database and back: hot rows
+keep summaries and archived_at, load_interactions restores the full text,
+deleting an interaction removes its archived copy, and a run interrupted
+after the archive commit (before the hot rows are trimmed) resumes
+without losing text.
+
+Runs offline against temporary SQLite files for the hot and archive
+databases:
+    python -m pytest -q test_archive.py
+"""
+
+import os
+import tempfile
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from db_writer import close_writers
+from memory import delete_interaction
+from vector_store import load_interactions
+import archive
+import models
+
+NOW = datetime(2026, 6, 1)
+LONG_RESPONSE = "Try a heating pad and gentle stretching. " * 20
+
+
+@pytest.fixture
+def db(monkeypatch):
+    tmp = tempfile.TemporaryDirectory()
+    monkeypatch.setattr(archive, "ARCHIVE_DATABASE_URL", f"sqlite:///{os.path.join(tmp.name, 'archive.db')}")
+    monkeypatch.setattr(archive, "_archive_engine", None)
+    monkeypatch.setattr(archive, "_ArchiveSession", None)
+    engine = create_engine(f"sqlite:///{os.path.join(tmp.name, 'hot.db')}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, autoflush=False)()
+    session.add(models.User(id=1, email="archive@example.com"))
+    for n in range(5):
+        session.add(models.Interaction(user_id=1, message=f"cramps again, day {n}", response=LONG_RESPONSE,
+                                       timestamp=NOW - timedelta(days=400 - n)))
+    session.add(models.Interaction(user_id=1, message="fresh", response="ok", timestamp=NOW - timedelta(days=1)))
+    session.commit()
+    yield session
+    session.close()
+    close_writers()
+    engine.dispose()
+    if archive._archive_engine is not None:
+        archive._archive_engine.dispose()
+    tmp.cleanup()
+
+
+def hot_rows(db):
+    db.expire_all()
+    return {i.id: i for i in db.query(models.Interaction)}
+
+
+def test_archive_and_hydrate(db):
+    assert archive.archive_interactions(db, older_than_days=180, batch_size=2, now=NOW) == 5
+
+    rows = hot_rows(db)
+    old = [i for i in rows.values() if i.message != "fresh"]
+    assert all(i.archived_at is not None for i in old) and rows[6].archived_at is None
+    assert all(i.response == archive.summarize(LONG_RESPONSE) and len(i.response) <= archive.SUMMARY_CHARS for i in old)
+    assert archive.archive_interactions(db, older_than_days=180, now=NOW) == 0
+
+    loaded = load_interactions(db, [3, 6, 1])
+    assert [i.id for i in loaded] == [3, 6, 1]
+    assert loaded[0].message == "cramps again, day 2" and loaded[0].response == LONG_RESPONSE
+    # Hydrated text isn't written back to the hot table
+    db.commit()
+    assert hot_rows(db)[3].response == archive.summarize(LONG_RESPONSE)
+
+    assert delete_interaction(3, 1, db)
+    assert archive.fetch_archived([3]) == {}
+    assert 3 not in hot_rows(db) and set(archive.fetch_archived([1, 2, 4, 5])) == {1, 2, 4, 5}
+
+
+def test_interrupted_archive_resumes_without_losing_text(db, monkeypatch):
+    writer_for = archive.writer_for
+
+    class Interrupted(Exception):
+        pass
+
+    def failing_writer(session):
+        class Writer:
+            def submit(self, op):
+                raise Interrupted()
+        return Writer()
+
+    # The first batch reaches the archive, then the run dies before trimming the hot rows
+    monkeypatch.setattr(archive, "writer_for", failing_writer)
+    with pytest.raises(Interrupted):
+        archive.archive_interactions(db, older_than_days=180, batch_size=2, now=NOW)
+    assert set(archive.fetch_archived([1, 2, 3])) == {1, 2}
+    rows = hot_rows(db)
+    assert all(rows[n].archived_at is None and rows[n].response == LONG_RESPONSE for n in range(1, 6))
+
+    monkeypatch.setattr(archive, "writer_for", writer_for)
+    assert archive.archive_interactions(db, older_than_days=180, batch_size=2, now=NOW) == 5
+    full = archive.fetch_archived([1, 2, 3, 4, 5])
+    assert {n: full[n][0] for n in full} == {n: f"cramps again, day {n - 1}" for n in range(1, 6)}
+    assert all(response == LONG_RESPONSE for _, response in full.values())
+    assert [i.response for i in load_interactions(db, [1, 2])] == [LONG_RESPONSE, LONG_RESPONSE]
+
+
+if __name__ == "__main__":
+    pytest.main(["-q", __file__])
@@ -0,0 +1,122 @@
+"""
+test_cycle_import.py
+
+Feeds CSV, JSON-array and NDJSON exports to the streaming parsers in
+awkward chunk sizes (splitting rows, quoted newlines and multi-byte
+characters), then imports a file end to end: rows are deduplicated against
+existing cycles and within the file, invalid rows are reported, symptom
+events are written and cycle stats are rebuilt once, including when the
+file turns out to be malformed after some batches were committed.
+
+Runs offline against a temporary SQLite file:
+    python -m pytest -q test_cycle_import.py
+"""
+
+import json
+import os
+import tempfile
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+from database import Base
+import cycle_import
+from cycle_import import CSVRecords, CycleImportError, JSONRecords, import_file
+import models
+
+CSV_EXPORT = (
+    "\ufeffDate,Symptoms,Mood\r\n"
+    "2025-01-03,\"cramps, headache\nbloating\",calm\r\n"
+    "02/01/2025,,\r\n"
+    "\r\n"
+    "not a date,cramps,\r\n"
+    "2025-03-01T08:00:00,fatigue,irritable 😤\r\n"
+)
+RECORDS = [{"start_date": "2025-01-03", "symptoms": ["cramps", "headache"]},
+           {"period_start": "2025-01-31"},
+           {"start_date": "2025-01-31", "symptoms": "duplicate in file"},
+           {"notes": "no date"}]
+
+
+def feed(parser, data: bytes, size: int):
+    records = []
+    for i in range(0, len(data), size):
+        records += parser.feed(data[i:i + size])
+    return records + parser.close()
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 4096])
+def test_streaming_parsers(size):
+    rows = feed(CSVRecords(), CSV_EXPORT.encode(), size)
+    assert [row for row, _ in rows] == [1, 2, 3, 4]
+    assert rows[0][1] == {"date": "2025-01-03", "symptoms": "cramps, headache\nbloating", "mood": "calm"}
+    assert rows[3][1]["mood"] == "irritable 😤"
+
+    array = json.dumps(RECORDS, indent=2).encode()
+    ndjson = "\n".join(json.dumps(r) for r in RECORDS).encode()
+    assert [r for _, r in feed(JSONRecords(), array, size)] == RECORDS
+    assert [r for _, r in feed(JSONRecords(), ndjson, size)] == RECORDS
+
+    with pytest.raises(CycleImportError):
+        feed(JSONRecords(), b'[{"date": "2025-01-01"}, {"date": ', size)
+
+
+def test_import_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'import.db')}")
+        Base.metadata.create_all(engine)
+        db = sessionmaker(bind=engine, autoflush=False)()
+        db.add(models.User(id=1, email="import@example.com", period_duration=5))
+        db.add(models.Cycle(user_id=1, start_date=datetime(2025, 3, 1, 20, 0)))
+        db.commit()
+
+        path = os.path.join(tmp, "export.csv")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(CSV_EXPORT)
+        summary = import_file(db, 1, path, chunk_size=5)
+        assert {k: summary[k] for k in ("received", "inserted", "duplicates", "invalid")} == {
+            "received": 4, "inserted": 2, "duplicates": 1, "invalid": 1}
+        assert summary["errors"] == [{"row": 3, "error": "unrecognized date 'not a date'"}]
+
+        first = db.query(models.Cycle).filter(models.Cycle.start_date == datetime(2025, 1, 3)).one()
+        assert {s["tag"] for s in first.tags["symptoms"]} >= {"cramps", "headache", "bloating"}
+        assert db.query(func.count(models.SymptomEvent.id)).filter(
+            models.SymptomEvent.source_id == first.id).scalar() >= 3
+
+        stats = db.get(models.UserCycleStats, 1)
+        assert (stats.cycle_count, stats.last_start) == (3, datetime(2025, 3, 1, 20, 0))
+
+        # Re-importing the same file only finds duplicates
+        assert import_file(db, 1, path)["duplicates"] == 3
+        db.close()
+        engine.dispose()
+
+
+def test_malformed_file_still_rebuilds_stats(monkeypatch):
+    monkeypatch.setattr(cycle_import, "IMPORT_BATCH_SIZE", 2)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'import.db')}")
+        Base.metadata.create_all(engine)
+        db = sessionmaker(bind=engine, autoflush=False)()
+        db.add(models.User(id=1, email="import@example.com", period_duration=5))
+        db.commit()
+
+        path = os.path.join(tmp, "export.csv")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write("date,symptoms\n2025-01-03,cramps\n2025-01-31,\n2025-03-01,\n2025-03-29,\"unterminated\n")
+        with pytest.raises(CycleImportError):
+            import_file(db, 1, path, chunk_size=8)
+
+        # The first batch was committed before the bad row; its stats must be too
+        assert db.query(func.count(models.Cycle.id)).scalar() == 2
+        stats = db.get(models.UserCycleStats, 1)
+        assert (stats.cycle_count, stats.last_start) == (2, datetime(2025, 1, 31))
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    for size in [1, 3, 7, 4096]:
+        test_streaming_parsers(size)
+    test_import_file()
+    print("✅ Cycle history imports stream, dedupe and rebuild stats")
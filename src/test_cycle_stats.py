@@ -0,0 +1,82 @@
+"""
+test_cycle_stats.py
+
+Checks that user_cycle_stats maintained incrementally as cycles are logged
+(in order, back-dated, and with an unlogged-month gap) matches a rebuild
+from the cycles table, that the stored phase rolls over at its boundary
+date, and that cycle symptom events get the phase of the day they were
+logged.
+
+Runs offline against an in-memory database built from the models:
+    python -m pytest -q test_cycle_stats.py
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from cycles import rebuild_user_stats, record_cycle, stats_phase
+from symptom_extraction import cycle_event_rows
+import models
+
+START = datetime(2026, 1, 1)
+
+
+def log(db, user_id: int, start: datetime) -> models.UserCycleStats:
+    cycle = models.Cycle(user_id=user_id, start_date=start)
+    db.add(cycle)
+    db.flush()
+    stats = record_cycle(db, cycle)
+    db.commit()
+    return stats
+
+
+def test_incremental_matches_rebuild():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+    db.add(models.User(id=1, email="stats@example.com", period_duration=5))
+    db.commit()
+
+    day = 0
+    for length in [27, 29, 31, 26, 28]:
+        log(db, 1, START + timedelta(days=day))
+        day += length
+    stats = log(db, 1, START + timedelta(days=day + 30))  # Missed a month: 58-day gap still counts
+    log(db, 1, START + timedelta(days=day + 130))  # 100-day gap is left out of the average
+    incremental = (stats.last_start, stats.cycle_count, stats.length_count,
+                   stats.avg_cycle_length, stats.cycle_length_variance, stats.next_period)
+
+    rebuilt = rebuild_user_stats(db, 1)
+    assert incremental[:3] == (rebuilt.last_start, rebuilt.cycle_count, rebuilt.length_count)
+    assert incremental[3] == pytest.approx(rebuilt.avg_cycle_length)
+    assert incremental[4] == pytest.approx(rebuilt.cycle_length_variance)
+    assert incremental[5] == rebuilt.next_period
+    assert rebuilt.cycle_count == 7 and rebuilt.length_count == 5
+    assert rebuilt.avg_period_length == 5
+    db.commit()
+
+    # A back-dated cycle (before the first one) adds a length at the start
+    stats = log(db, 1, START - timedelta(days=28))
+    assert (stats.cycle_count, stats.length_count) == (8, 6)
+
+    # Phase stored at update time, recomputed once its window has passed
+    assert stats_phase(rebuilt, rebuilt.last_start + timedelta(days=2)) == ("menstrual", 2)
+    assert stats_phase(rebuilt, rebuilt.last_start + timedelta(days=20)) == ("luteal", 20)
+    db.close()
+
+
+def test_cycle_event_phase_follows_logged_day():
+    tags = {"symptoms": [{"tag": "bloating", "severity": None}], "moods": []}
+    assert cycle_event_rows(1, 1, START, tags)[0]["phase"] == "menstrual"
+    logged = cycle_event_rows(1, 1, START, tags, date=START + timedelta(days=20))[0]
+    assert (logged["phase"], logged["date"]) == ("luteal", START + timedelta(days=20))
+    # Logged long after (history entry) or before the start: the start day itself
+    assert cycle_event_rows(1, 1, START, tags, date=START + timedelta(days=90))[0]["date"] == START
+
+
+if __name__ == "__main__":
+    test_incremental_matches_rebuild()
+    test_cycle_event_phase_follows_logged_day()
+    print("✅ Incremental cycle stats match a rebuild")
@@ -0,0 +1,63 @@
+"""
+test_database.py
+
+Read-only engines on a SQLite file that is still in rollback-journal mode:
+the first read must not try to switch the file to WAL (a write), for both
+the sync read engine and the async one.
+
+Runs offline against a temporary SQLite file:
+    python -m pytest -q test_database.py
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from database import async_database_url, configure_sqlite, read_only_sqlite_url, sqlite_pragmas
+
+
+def test_read_only_engines_skip_write_pragmas():
+    assert "journal_mode" in sqlite_pragmas("production")
+    assert "journal_mode" not in sqlite_pragmas("production", read_only=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fresh.db")
+        connection = sqlite3.connect(path)
+        connection.execute("CREATE TABLE users (id INTEGER PRIMARY KEY)")
+        connection.commit()
+        connection.close()
+        url = read_only_sqlite_url(f"sqlite:///{path}")
+
+        read_engine = configure_sqlite(create_engine(url), "production", read_only=True)
+        with read_engine.connect() as connection:
+            assert connection.execute(text("SELECT count(*) FROM users")).scalar() == 0
+            assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "delete"
+        read_engine.dispose()
+
+        async def async_read():
+            async_engine = create_async_engine(async_database_url(url))
+            configure_sqlite(async_engine.sync_engine, "production", read_only=True)
+            try:
+                async with async_engine.connect() as connection:
+                    return (await connection.execute(text("SELECT count(*) FROM users"))).scalar()
+            finally:
+                await async_engine.dispose()
+
+        assert asyncio.run(async_read()) == 0
+
+        # The primary still switches the file to WAL, and read-only connections follow it
+        engine = configure_sqlite(create_engine(f"sqlite:///{path}"), "production")
+        with engine.connect() as connection:
+            assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+            read_engine = configure_sqlite(create_engine(url), "production", read_only=True)
+            with read_engine.connect() as reader:
+                assert reader.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+            read_engine.dispose()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    test_read_only_engines_skip_write_pragmas()
+    print("✅ Read-only engines open a non-WAL database")
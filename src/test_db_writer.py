@@ -0,0 +1,122 @@
+"""
+test_db_writer.py
+
+Times out async writes both while they are still queued and while their
+group is committing, and checks that the writer thread survives: the
+queued write is dropped, and later sync and async writes still commit.
+Memory index updates for logged interactions run off the writer thread,
+and a durable log_interaction returns after DB_WRITER_TIMEOUT even while
+its write is still queued.
+
+Runs offline against a temporary SQLite file:
+    python -m pytest -q test_db_writer.py
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from db_writer import DBWriter, close_writers, writer_for
+from embeddings import DeterministicEmbedder, set_embedder
+import memory
+import models
+
+
+def test_timed_out_async_writes_do_not_kill_the_writer():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'writer.db')}")
+        Base.metadata.create_all(engine)
+        writer = DBWriter(engine, max_wait_ms=0)
+        release = threading.Event()
+
+        def slow(session):
+            release.wait(5)
+            session.add(models.User(email="slow@example.com"))
+
+        def dropped(session):
+            session.add(models.User(email="dropped@example.com"))
+
+        async def scenario():
+            # slow() holds the writer; its caller gives up mid-commit, dropped() times out in the queue
+            held = asyncio.ensure_future(writer.submit_async(slow, timeout=0.2))
+            await asyncio.sleep(0.05)
+            results = await asyncio.gather(held, writer.submit_async(dropped, timeout=0.1), return_exceptions=True)
+            assert all(isinstance(r, asyncio.TimeoutError) for r in results)
+            release.set()
+            return await writer.add_async(models.User(email="async@example.com"), timeout=5)
+
+        assert asyncio.run(scenario()).id is not None
+        assert writer.submit(lambda session: session.add(models.User(email="sync@example.com")), timeout=5) is None
+        writer.close()
+
+        db = sessionmaker(bind=engine)()
+        emails = {email for (email,) in db.query(models.User.email)}
+        assert emails == {"slow@example.com", "async@example.com", "sync@example.com"}
+        assert writer.stats()["failed_ops"] == 0
+        db.close()
+        engine.dispose()
+
+
+class BlockingStore:
+    """Stands in for memory_store: records the calling thread, then blocks until released."""
+
+    def __init__(self):
+        self.calls = []
+        self.called = threading.Event()
+        self.release = threading.Event()
+
+    def add_interaction(self, user_id, interaction_id, vector):
+        self.calls.append(threading.current_thread().name)
+        self.called.set()
+        self.release.wait(5)
+
+    invalidate = add_interaction
+
+
+def test_index_updates_do_not_block_the_writer(monkeypatch):
+    set_embedder(DeterministicEmbedder(dim=8))
+    store = BlockingStore()
+    monkeypatch.setattr(memory, "memory_store", store)
+    monkeypatch.setattr(memory, "DB_WRITER_TIMEOUT", 0.2)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'index.db')}", connect_args={"check_same_thread": False})
+            Base.metadata.create_all(engine)
+            db = sessionmaker(bind=engine)()
+            db.add(models.User(id=1, email="index@example.com"))
+            db.commit()
+            writer = writer_for(db)
+
+            memory.log_interaction("cramps again", "ok", 1, db)
+            assert store.called.wait(5)
+            # The index update is blocked; other writes still commit
+            assert writer.submit(lambda session: session.add(models.User(email="next@example.com")), timeout=2) is None
+            assert store.calls[0].startswith("memory-index")
+
+            # A durable log whose write is stuck in the queue gives up after DB_WRITER_TIMEOUT
+            held = threading.Event()
+            writer.submit(lambda session: held.wait(5), durable=False)
+            start = time.perf_counter()
+            memory.log_interaction("still cramps", "ok", 1, db, durable=True)
+            assert time.perf_counter() - start < 2
+            held.set()
+            store.release.set()
+            writer.submit(lambda session: None, timeout=5)  # Drain
+            deadline = time.monotonic() + 5
+            while len(store.calls) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert len(store.calls) == 2 and "db-writer" not in store.calls
+            db.close()
+            close_writers()
+            engine.dispose()
+    finally:
+        set_embedder(None)
+
+
+if __name__ == "__main__":
+    test_timed_out_async_writes_do_not_kill_the_writer()
+    print("✅ DB writer survives timed-out async writes")
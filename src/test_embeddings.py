@@ -0,0 +1,63 @@
+"""
+test_embeddings.py
+
+BatchingEmbedder in front of a backend with a per-call limit (like
+VertexEmbedder.batch_size): concurrent single-text requests are coalesced,
+no micro-batch exceeds the limit, and the calls run concurrently so the
+total time stays near one round-trip per dispatcher wave.
+
+Runs offline with a fake backend:
+    python -m pytest -q test_embeddings.py
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from embeddings import BatchingEmbedder, DeterministicEmbedder
+
+ROUND_TRIP = 0.05  # Seconds per fake predict call
+REQUESTS = 20
+
+
+class LimitedEmbedder(DeterministicEmbedder):
+    """One simulated round-trip per batch_size texts, recording each call's size."""
+
+    def __init__(self, batch_size: int):
+        super().__init__(dim=8)
+        self.batch_size = batch_size
+        self.calls = []
+        self._calls_lock = threading.Lock()
+
+    def _embed(self, texts):
+        with self._calls_lock:
+            self.calls.append(len(texts))
+        time.sleep(ROUND_TRIP * -(-len(texts) // self.batch_size))
+        return super()._embed(texts)
+
+
+def test_micro_batches_capped_at_inner_batch_size():
+    inner = LimitedEmbedder(batch_size=5)
+    batcher = BatchingEmbedder(inner, max_batch_size=64, max_wait_ms=20, dispatchers=4)
+    assert batcher.max_batch_size == 5
+
+    texts = [f"message {n}" for n in range(REQUESTS)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=REQUESTS) as pool:
+        vectors = list(pool.map(lambda text: batcher.embed([text]), texts))
+    elapsed = time.perf_counter() - start
+
+    # Every caller gets its own vector back
+    expected = DeterministicEmbedder(dim=8).embed(texts)
+    assert all(np.allclose(vector[0], expected[n]) for n, vector in enumerate(vectors))
+    # Coalesced, one round-trip per call, never more than the backend takes at once
+    assert sum(inner.calls) == REQUESTS
+    assert max(inner.calls) <= 5
+    assert len(inner.calls) < REQUESTS
+    # 4 dispatchers x 5 texts: about one wave of round-trips, not 20 serial ones
+    assert elapsed < REQUESTS * ROUND_TRIP / 2
+
+
+if __name__ == "__main__":
+    test_micro_batches_capped_at_inner_batch_size()
+    print("✅ Embedding micro-batches respect the backend's batch size")
@@ -0,0 +1,261 @@
+"""
+test_memory_store_concurrency.py
+
+Multi-threaded stress test for the per-user vector memory store:
+many threads search while others log new interactions, across more users
+than fit in the LRU, so indexes are concurrently built, evicted, reloaded
+from their shards and written to.
+
+Checks that no search ever returns another user's interaction and that
+every user's index ends up holding exactly their interactions, and that an
+interaction added again after a catch-up already loaded it isn't duplicated,
+that writing an evicted user's shard doesn't block other users' lookups,
+and that loaded shards of every index kind are memory-mapped, not copied.
+
+Runs offline against a temporary SQLite database and the deterministic
+test embedder:
+    python -m pytest -q test_memory_store_concurrency.py
+"""
+
+import os
+import random
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+import models
+from embeddings import DeterministicEmbedder, set_embedder, vector_to_bytes
+from vector_store import UserMemoryIndex, VectorMemoryStore, create_index, format_interaction
+
+USERS = 12
+SEED_INTERACTIONS = 40
+WRITES_PER_USER = 15
+SEARCHES = 600
+THREADS = 16
+
+
+def test_concurrent_search_and_update():
+    embedder = DeterministicEmbedder(dim=32)
+    set_embedder(embedder)
+    try:
+        _stress(embedder)
+    finally:
+        set_embedder(None)  # Back to the configured backend on next use
+
+
+def _stress(embedder: DeterministicEmbedder):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(
+            f"sqlite:///{os.path.join(tmp, 'stress.db')}",
+            connect_args={"check_same_thread": False, "timeout": 30},
+        )
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+
+        # Room for only a few users' indexes, so evictions and shard reloads
+        # happen while searches and writes are in flight
+        store = VectorMemoryStore(index_dir=os.path.join(tmp, "index"), max_bytes=3 * SEED_INTERACTIONS * (32 * 4 + 8))
+
+        db = Session()
+        texts = {}
+        for user_id in range(1, USERS + 1):
+            db.add(models.User(id=user_id, email=f"user{user_id}@example.com"))
+            texts[user_id] = [f"user {user_id} message {n}" for n in range(SEED_INTERACTIONS)]
+            for text in texts[user_id]:
+                db.add(_interaction(embedder, user_id, text))
+        db.commit()
+        db.close()
+
+        owner_of = {}
+        owner_lock = threading.Lock()
+        violations = []
+        write_lock = threading.Lock()  # SQLite allows one writer at a time
+
+        def write(user_id: int, n: int):
+            text = f"user {user_id} extra {n}"
+            session = Session()
+            try:
+                with write_lock:
+                    interaction = _interaction(embedder, user_id, text)
+                    session.add(interaction)
+                    session.commit()
+                    interaction_id = interaction.id
+                store.add_interaction(user_id, interaction_id, embedder.embed([format_interaction(text, "ok")])[0])
+                with owner_lock:
+                    texts[user_id].append(text)
+            finally:
+                session.close()
+
+        def search(user_id: int):
+            session = Session()
+            try:
+                query = random.choice(texts[user_id][:SEED_INTERACTIONS])
+                hits = store.search(user_id, format_interaction(query, "ok"), session, k=5, min_similarity=-1.0)
+                for interaction_id, _ in hits:
+                    with owner_lock:
+                        owner = owner_of.get(interaction_id)
+                    if owner is None:
+                        owner = session.get(models.Interaction, interaction_id).user_id
+                        with owner_lock:
+                            owner_of[interaction_id] = owner
+                    if owner != user_id:
+                        violations.append((user_id, interaction_id, owner))
+                return hits
+            finally:
+                session.close()
+
+        rng = random.Random(0)
+        jobs = [("write", user_id, n) for user_id in range(1, USERS + 1) for n in range(WRITES_PER_USER)]
+        jobs += [("search", rng.randint(1, USERS), None) for _ in range(SEARCHES)]
+        rng.shuffle(jobs)
+
+        with ThreadPoolExecutor(max_workers=THREADS) as pool:
+            futures = [
+                pool.submit(write, user_id, n) if kind == "write" else pool.submit(search, user_id)
+                for kind, user_id, n in jobs
+            ]
+            for future in futures:
+                future.result()  # Re-raise any error from a worker
+
+        assert not violations, f"Searches returned other users' interactions: {violations[:5]}"
+
+        db = Session()
+        for user_id in range(1, USERS + 1):
+            user_index = store.get_index(user_id, db)
+            assert user_index.size == SEED_INTERACTIONS + WRITES_PER_USER
+            stored = {i for (i,) in db.query(models.Interaction.id).filter(models.Interaction.user_id == user_id)}
+            hits = store.search(user_id, "", db, k=user_index.size, min_similarity=-1.0)
+            assert {interaction_id for interaction_id, _ in hits} == stored
+        db.close()
+
+        stats = store.stats()
+        assert stats["evictions"] > 0 and stats["loads"] > 0
+        engine.dispose()
+
+
+def test_commit_callback_after_catch_up_is_idempotent():
+    embedder = DeterministicEmbedder(dim=32)
+    set_embedder(embedder)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'dup.db')}")
+            Base.metadata.create_all(engine)
+            db = sessionmaker(bind=engine)()
+            db.add(models.User(id=1, email="dup@example.com"))
+            rows = [_interaction(embedder, 1, f"message {n}") for n in range(4)]
+            db.add_all(rows)
+            db.commit()
+
+            # The cold load already holds the last row when its commit callback arrives
+            store = VectorMemoryStore(index_dir=os.path.join(tmp, "index"))
+            user_index = store.get_index(1, db)
+            last = rows[-1]
+            store.add_interaction(1, last.id, embedder.embed([format_interaction(last.message, "ok")])[0])
+            store.add_interaction(1, last.id, embedder.embed([format_interaction(last.message, "ok")])[0])
+            assert user_index.index.ntotal == 4
+            hits = store.search(1, "", db, k=10, min_similarity=-1.0)
+            assert sorted(i for i, _ in hits) == sorted(r.id for r in rows)
+
+            # HNSW can't remove: a held id is kept once, and a tombstoned one revived
+            hnsw = UserMemoryIndex(32, kind="hnsw", index=create_index(32, "hnsw"))
+            vectors = embedder.embed([r.message for r in rows])
+            hnsw.add([r.id for r in rows], vectors)
+            hnsw.remove([rows[0].id])
+            hnsw.add([rows[0].id, rows[1].id], vectors[:2])
+            assert hnsw.index.ntotal == 4 and hnsw.size == 4
+            db.close()
+            engine.dispose()
+    finally:
+        set_embedder(None)
+
+
+def test_eviction_flush_does_not_hold_store_lock():
+    embedder = DeterministicEmbedder(dim=32)
+    set_embedder(embedder)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'evict.db')}", connect_args={"check_same_thread": False})
+            Base.metadata.create_all(engine)
+            Session = sessionmaker(bind=engine)
+            db = Session()
+            for user_id in (1, 2, 3):
+                db.add(models.User(id=user_id, email=f"evict{user_id}@example.com"))
+                db.add_all([_interaction(embedder, user_id, f"user {user_id} message {n}") for n in range(4)])
+            db.commit()
+
+            store = VectorMemoryStore(index_dir=os.path.join(tmp, "index"), max_bytes=2 * 4 * (32 * 4 + 8))
+            store.get_index(1, db)
+            store.get_index(2, db)
+            store.add_interaction(1, 1, embedder.embed(["dirty"])[0])  # User 1 is dirty and least recently used
+            store.get_index(2, db)
+
+            flushing, release = threading.Event(), threading.Event()
+            flush = store._flush
+
+            def slow_flush(user_id, user_index):
+                if user_id == 1:
+                    flushing.set()
+                    release.wait(5)
+                flush(user_id, user_index)
+
+            store._flush = slow_flush
+            loader = threading.Thread(target=lambda: store.get_index(3, Session()))
+            loader.start()
+            assert flushing.wait(5)
+            # User 1's shard is being written; other users' lookups must not wait for it
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                assert pool.submit(store.get_index, 2, Session()).result(timeout=1).size == 4
+                assert pool.submit(store.stats).result(timeout=1)["evictions"] == 1
+            release.set()
+            loader.join(5)
+            assert store.stats()["flushes"] >= 3
+            db.close()
+            engine.dispose()
+    finally:
+        set_embedder(None)
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="reads /proc/self/maps")
+@pytest.mark.parametrize("kind", ["flat", "hnsw", "ivf"])
+def test_loaded_shard_is_memory_mapped(kind):
+    embedder = DeterministicEmbedder(dim=32)
+    set_embedder(embedder)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = VectorMemoryStore(index_dir=os.path.join(tmp, "index"))
+            vectors = embedder.embed([f"message {n}" for n in range(400)])
+            built = UserMemoryIndex(32, kind=kind, index=create_index(32, kind, training_vectors=np.asarray(vectors)))
+            built.add(list(range(1, 401)), vectors)
+            store._flush(1, built)
+
+            path = store._shard_path(1)
+            user_index = store._load_shard(1)
+            with open("/proc/self/maps") as f:
+                assert path in f.read()
+            assert user_index.search(vectors[7], k=1)[0][0] == 8
+
+            # The first write swaps in an owned copy, leaving the mapped one untouched
+            store._writable(1, user_index).add([401], [vectors[0]])
+            assert not user_index.mmapped and user_index.index.ntotal == 401
+    finally:
+        set_embedder(None)
+
+
+def _interaction(embedder, user_id: int, text: str) -> models.Interaction:
+    vector = embedder.embed([format_interaction(text, "ok")])[0]
+    interaction = models.Interaction(user_id=user_id, message=text, response="ok", timestamp=datetime.utcnow())
+    interaction.embedding = models.InteractionEmbedding(
+        model=embedder.model_name, dim=len(vector), vector=vector_to_bytes(vector)
+    )
+    return interaction
+
+
+if __name__ == "__main__":
+    test_concurrent_search_and_update()
+    print("✅ Concurrent memory store stress test passed")
@@ -0,0 +1,129 @@
+"""
+test_migrations.py
+
+Upgrades a database with the original (pre-versioning) schema through all
+migrations with a small chunk size, checks the backfilled data, that an
+interrupted backfill resumes from its checkpoint, and that a second run is
+a no-op. A new database migrated from scratch ends up with the same
+tables, columns and indexes as create_all on the current models.
+
+Runs offline against a temporary SQLite file:
+    python -m pytest -q test_migrations.py
+"""
+
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, inspect, text
+from database import Base
+import migrations
+
+ORIGINAL_SCHEMA = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR NOT NULL UNIQUE, created_at DATETIME)",
+    "CREATE TABLE interactions (id INTEGER PRIMARY KEY, user_id INTEGER, message TEXT, response TEXT, timestamp DATETIME)",
+    "CREATE TABLE cycles (id INTEGER PRIMARY KEY, user_id INTEGER, start_date DATETIME NOT NULL, symptoms TEXT, moods TEXT)",
+    "CREATE TABLE reminders (id INTEGER PRIMARY KEY, user_id INTEGER, type VARCHAR, time VARCHAR, method VARCHAR, active BOOLEAN)",
+    "CREATE TABLE partners (id INTEGER PRIMARY KEY, user_id INTEGER, partner_user_id INTEGER, consent_type VARCHAR, status VARCHAR)",
+]
+
+
+def seed_original(engine, interactions: int = 25):
+    start = datetime(2026, 1, 1)
+    with engine.begin() as connection:
+        for statement in ORIGINAL_SCHEMA:
+            connection.exec_driver_sql(statement)
+        connection.execute(text("INSERT INTO users (id, email) VALUES (1, 'old@example.com')"))
+        connection.execute(text("INSERT INTO cycles (user_id, start_date, symptoms) VALUES (1, :d, 'mild cramps')"),
+                           {"d": start})
+        for n in range(interactions):
+            connection.execute(
+                text("INSERT INTO interactions (user_id, message, response, timestamp) VALUES (1, :m, 'ok', :t)"),
+                {"m": f"feeling tired today {n}", "t": start + timedelta(days=n)},
+            )
+
+
+def fts_schema(connection) -> dict:
+    return dict(connection.execute(text(
+        "SELECT name, sql FROM sqlite_master WHERE name LIKE 'interactions_fts%' AND sql IS NOT NULL")).all())
+
+
+def fts_schema_from_models() -> dict:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.connect() as connection:
+        return fts_schema(connection)
+
+
+def schema(connection) -> dict:
+    """Columns of every table and the SQL of every index (ALTER TABLE rewrites table SQL, so not compared)."""
+    columns = {table: {c["name"] for c in inspect(connection).get_columns(table)}
+               for table in inspect(connection).get_table_names() if not table.startswith("interactions_fts")}
+    indexes = dict(connection.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'index'")).all())
+    return {"columns": columns, "indexes": indexes, "fts": fts_schema(connection)}
+
+
+def test_upgrade_original_schema():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'old.db')}")
+        seed_original(engine)
+
+        # Interrupt the phase backfill after its first chunk
+        original = migrations.backfill_interaction_phases
+        calls = []
+
+        def flaky(db, after_id, limit):
+            calls.append(after_id)
+            if len(calls) == 2:
+                raise RuntimeError("interrupted")
+            return original(db, after_id, limit)
+
+        phase_migration = next(m for m in migrations.MIGRATIONS if m.version == 3)
+        phase_migration.backfill = flaky
+        try:
+            try:
+                migrations.migrate(engine, chunk_size=10, pause=0)
+            except RuntimeError:
+                pass
+        finally:
+            phase_migration.backfill = original
+        assert set(migrations.applied_versions(engine)) == {1, 2}
+
+        applied = migrations.migrate(engine, chunk_size=10, pause=0)
+        assert applied == [m.version for m in migrations.MIGRATIONS if m.version >= 3]
+        assert migrations.migrate(engine, chunk_size=10, pause=0) == []
+
+        with engine.connect() as connection:
+            columns = {c["name"] for c in inspect(connection).get_columns("interactions")}
+            assert {"phase", "archived_at"} <= columns
+            phases = dict(connection.execute(text("SELECT id, phase FROM interactions")).all())
+            assert phases[1] == "menstrual" and phases[10] == "follicular" and phases[25] == "luteal"
+            events = connection.execute(text("SELECT source, symptom, severity FROM symptom_events")).all()
+            assert ("cycle", "cramps", 1) in events
+            tags = connection.execute(text("SELECT tags FROM cycles")).scalar()
+            assert json.loads(tags) == {"symptoms": [{"tag": "cramps", "severity": 1}], "moods": []}
+            assert sum(1 for source, symptom, _ in events if source == "interaction" and symptom == "fatigue") == 25
+            assert connection.execute(text("SELECT count(*) FROM job_checkpoints")).scalar() == 0
+            assert connection.execute(text(
+                "SELECT count(*) FROM interactions_fts WHERE interactions_fts MATCH 'owner:u1 AND tired'")).scalar() == 25
+            assert fts_schema(connection) == fts_schema_from_models()
+            indexes = {i["name"] for i in inspect(connection).get_indexes("interactions")}
+            assert "ix_interactions_user_timestamp" in indexes
+        engine.dispose()
+
+
+def test_new_database_matches_models():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'new.db')}")
+        migrations.migrate(engine, pause=0)
+        fresh = create_engine("sqlite://")
+        Base.metadata.create_all(fresh)
+        with engine.connect() as migrated, fresh.connect() as expected:
+            assert schema(migrated) == schema(expected)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    test_upgrade_original_schema()
+    test_new_database_matches_models()
+    print("✅ Migrations upgrade the original schema")
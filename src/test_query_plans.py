@@ -0,0 +1,104 @@
+"""
+test_query_plans.py
+
+Checks with SQLite's EXPLAIN QUERY PLAN that every hot query path is served
+by an index: no full table scans and no temporary B-tree sorts. The BM25
+keyword search is checked too: each of its FTS5 lookups is a single
+virtual-table scan scoped to the user, and it returns only their rows,
+ranked by how rare each matched word is in their history.
+
+Runs offline against an in-memory database built from the models:
+    python -m pytest -q test_query_plans.py
+"""
+
+from datetime import datetime
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from lexical_index import COUNT_SQL, MATCH_SQL, bm25_search, user_match_query
+import models
+
+NOW = datetime(2026, 1, 1)
+
+
+def hot_queries(db):
+    """(name, query) for the app's per-request and background query paths."""
+    user_id = 1
+    return [
+        ("latest cycle (phase)", db.query(models.Cycle)
+            .filter(models.Cycle.user_id == user_id, models.Cycle.start_date <= NOW)
+            .order_by(models.Cycle.start_date.desc()).limit(1)),
+        ("cycles for user", db.query(models.Cycle).filter(models.Cycle.user_id == user_id)),
+        ("recent interactions", db.query(models.Interaction)
+            .filter(models.Interaction.user_id == user_id)
+            .order_by(models.Interaction.timestamp.desc()).limit(20)),
+        ("memory index catch-up", db.query(func.count(models.Interaction.id), func.max(models.Interaction.id))
+            .filter(models.Interaction.user_id == user_id)),
+        ("memory index vectors", db.query(models.Interaction.id, models.InteractionEmbedding)
+            .outerjoin(models.InteractionEmbedding, models.InteractionEmbedding.interaction_id == models.Interaction.id)
+            .filter(models.Interaction.user_id == user_id, models.Interaction.id > 0)),
+        ("shared with partner", db.query(models.Partner)
+            .filter(models.Partner.partner_user_id == user_id, models.Partner.status == "accepted")),
+        ("existing invite", db.query(models.Partner)
+            .filter(models.Partner.user_id == user_id, models.Partner.partner_user_id == 2)),
+        ("reminders for user", db.query(models.Reminder).filter(models.Reminder.user_id == user_id)),
+        ("recent symptoms", db.query(models.SymptomEvent.symptom, func.count(models.SymptomEvent.id))
+            .filter(models.SymptomEvent.user_id == user_id, models.SymptomEvent.date >= NOW)
+            .group_by(models.SymptomEvent.symptom)),
+        ("retention sweep", db.query(models.Interaction)
+            .filter(models.Interaction.timestamp < NOW, models.Interaction.archived_at.is_(None))
+            .order_by(models.Interaction.timestamp, models.Interaction.id).limit(500)),
+    ]
+
+
+def query_plan(db, query) -> list:
+    sql = str(query.statement.compile(db.get_bind(), compile_kwargs={"literal_binds": True}))
+    return [row[-1] for row in db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def test_hot_queries_use_indexes():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+
+    problems = []
+    for name, query in hot_queries(db):
+        plan = query_plan(db, query)
+        for step in plan:
+            full_scan = step.startswith("SCAN ") and "VIRTUAL TABLE" not in step
+            if full_scan or "USE TEMP B-TREE" in step:
+                problems.append(f"{name}: {step}  (plan: {plan})")
+    db.close()
+
+    assert not problems, "Hot queries not fully served by indexes:\n" + "\n".join(problems)
+
+
+def test_keyword_search_is_scoped_to_the_user():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    for user_id in (1, 2):
+        db.add(models.User(id=user_id, email=f"user{user_id}@example.com"))
+        db.add_all([models.Interaction(user_id=user_id, message=f"cramps again {n}", response="heating pad", timestamp=NOW)
+                    for n in range(5)])
+    db.add(models.Interaction(user_id=1, message="u2 cramps", response="ok", timestamp=NOW))
+    db.commit()
+
+    for sql in (COUNT_SQL, MATCH_SQL):
+        plan = [row[-1] for row in db.connection().exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {sql}", {"match": user_match_query(1, "cramps")})]
+        assert len(plan) == 1 and plan[0].startswith("SCAN interactions_fts VIRTUAL TABLE"), plan
+
+    owners = dict(db.query(models.Interaction.id, models.Interaction.user_id))
+    hits = bm25_search(db, 1, "cramps heating", k=20)
+    assert len(hits) == 6 and {owners[i] for i, _ in hits} == {1}
+    # "u2" is only in the text of user 1's last row; "cramps" is in all of them, so "u2" ranks it first
+    assert bm25_search(db, 1, "cramps u2")[0][0] == max(owners)
+    assert [owners[i] for i, _ in bm25_search(db, 2, "u2 cramps", k=20)] == [2] * 5
+    db.close()
+
+
+if __name__ == "__main__":
+    test_hot_queries_use_indexes()
+    test_keyword_search_is_scoped_to_the_user()
+    print("✅ All hot queries use indexes")
@@ -0,0 +1,139 @@
+"""
+test_retrieval.py
+
+Hybrid memory retrieval: fused relevance is on the 0-1 scale the re-rank
+weights expect, the similarity floor only drops vector hits (keyword
+matches are kept), MMR drops near-duplicate transcripts, lexical hits
+survive when vector search is slow or failing, and only embedder/backend
+failures (not one user's slow index load) open the vector circuit breaker.
+
+Runs offline against a temporary SQLite database (with FTS5) and the
+deterministic test embedder:
+    python -m pytest -q test_retrieval.py
+"""
+
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from embeddings import DeterministicEmbedder, HashingEmbedder, set_embedder, vector_to_bytes
+from vector_store import VectorMemoryStore, format_interaction
+import models
+import retrieval
+import vector_store
+
+MESSAGES = ["cramps again this morning", "slept badly, very tired", "craving chocolate", "headache after work"]
+
+
+def _seed(db, embedder, messages):
+    now = datetime.utcnow()
+    for n, message in enumerate(messages):
+        vector = embedder.embed([format_interaction(message, "ok")])[0]
+        interaction = models.Interaction(user_id=1, message=message, response="ok", timestamp=now - timedelta(days=n))
+        interaction.embedding = models.InteractionEmbedding(
+            model=embedder.model_name, dim=len(vector), vector=vector_to_bytes(vector))
+        db.add(interaction)
+    db.commit()
+
+
+@pytest.fixture
+def make_memories(monkeypatch):
+    """Returns seed(embedder=None, messages=MESSAGES) -> session over user 1's memories."""
+    monkeypatch.setattr(retrieval, "_vector_down_until", {})
+    tmp = tempfile.TemporaryDirectory()
+    engine = create_engine(f"sqlite:///{os.path.join(tmp.name, 'memories.db')}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.add(models.User(id=1, email="memories@example.com"))
+    db.commit()
+    monkeypatch.setattr(retrieval, "memory_store", VectorMemoryStore(index_dir=os.path.join(tmp.name, "index")))
+
+    def seed(embedder=None, messages=MESSAGES):
+        embedder = embedder or DeterministicEmbedder(dim=32)
+        set_embedder(embedder)
+        _seed(db, embedder, messages)
+        return db
+
+    yield seed
+    db.close()
+    engine.dispose()
+    set_embedder(None)
+    tmp.cleanup()
+
+
+@pytest.fixture
+def memories(make_memories):
+    return make_memories()
+
+
+def test_fused_relevance_scale():
+    fused = retrieval.reciprocal_rank_fusion([[1, 2, 3], [2, 4]])
+    relevance = dict(retrieval.fused_relevance(fused, {2: 0.9, 4: 0.6}, lists=2))
+    assert all(0.0 <= value <= 1.0 for value in relevance.values())
+    assert max(relevance, key=relevance.get) == 2
+    # Lexical-only: the top hit is fully relevant rather than ~1/60
+    assert retrieval.fused_relevance([(7, 1.0 / (retrieval.RRF_K + 1))], {}, lists=1) == [(7, 1.0)]
+
+    # A relevant old memory still beats an irrelevant fresh one from the same phase
+    scores = retrieval.rerank_scores(np.array([0.9, 0.1]), np.array([60.0, 0.0]), np.array([0.0, 1.0]))
+    assert scores[0] > scores[1]
+
+
+def test_similarity_floor_applies_to_vector_hits_only(make_memories, monkeypatch):
+    db = make_memories(HashingEmbedder(dim=512, workers=1))
+    assert vector_store.min_similarity_floor() == HashingEmbedder.min_similarity
+    hits = retrieval.retrieve_memories(1, "cramps again", db)
+    assert hits and hits[0].message == MESSAGES[0]
+    assert retrieval._vector_available()
+
+    # Even with a floor no real cosine reaches, the keyword match survives
+    monkeypatch.setattr(vector_store, "MEMORY_MIN_SIMILARITY", 0.99)
+    assert retrieval.memory_store.search(1, "cramps again", db) == []
+    assert [m.message for m in retrieval.retrieve_memories(1, "cramps again", db)] == [MESSAGES[0]]
+
+
+def test_fusion_and_mmr_drop_near_duplicates(make_memories):
+    messages = ["cramps again this morning", "cramps again this morning", "cramps and a headache", "went for a run"]
+    db = make_memories(HashingEmbedder(dim=512, workers=1), messages)
+    hits = retrieval.retrieve_memories(1, "cramps again this morning", db, k=4)
+    texts = [m.message for m in hits]
+    assert texts[0] == messages[0]
+    assert texts.count(messages[0]) == 1  # Identical transcript dropped by MMR
+    assert "cramps and a headache" in texts
+    assert retrieval.reciprocal_rank_fusion([[1, 2], [2, 3]])[0][0] == 2  # In both lists beats either alone
+
+
+def test_slow_index_load_does_not_open_breaker(memories, monkeypatch):
+    monkeypatch.setattr(retrieval, "MEMORY_VECTOR_TIMEOUT", 0.05)
+    store = retrieval.memory_store
+    load = store.get_index
+
+    def slow_load(user_id, db):
+        time.sleep(0.3)
+        return load(user_id, db)
+
+    monkeypatch.setattr(store, "get_index", slow_load)
+    hits = retrieval.retrieve_memories(1, "cramps again", memories)
+    assert hits and hits[0].message == MESSAGES[0]
+    assert retrieval._vector_available()
+
+
+def test_embedder_failure_opens_breaker(memories):
+    class Failing(DeterministicEmbedder):
+        def _embed(self, texts):
+            raise RuntimeError("embedding service down")
+
+    set_embedder(Failing(dim=32))
+    hits = retrieval.retrieve_memories(1, "cramps again", memories)
+    assert hits and hits[0].message == MESSAGES[0]
+    assert set(retrieval._vector_down_until) == {"embedder"}
+    assert not retrieval._vector_available()
+
+
+if __name__ == "__main__":
+    pytest.main(["-q", __file__])
@@ -0,0 +1,48 @@
+"""
+test_symptom_extraction.py
+
+Mention extraction: negations only cancel the mention they precede (up to
+a clause break), severity words are picked up from the words before a
+mention and the highest stated severity wins. Canonical names line up with
+MedicalInfoTool's curated entries, so researching an extracted symptom gets
+the curated information rather than the generic fallback.
+
+Runs offline:
+    python -m pytest -q test_symptom_extraction.py
+"""
+
+import pytest
+from external_tools import MedicalInfoTool
+from symptom_extraction import VOCABULARY, extract_mentions
+
+CASES = [
+    ("no cramps", {}),
+    ("cramps but no headache", {"cramps": None}),
+    ("no cramps, but a terrible headache", {"headache": 3}),
+    ("headache and no nausea", {"headache": None}),
+    ("without any headaches today", {}),
+    ("severe cramps", {"cramps": 3}),
+    ("mild cramps in the morning, severe cramps by lunch", {"cramps": 3}),
+    ("I feel slightly nauseous", {"nausea": 1}),
+    ("really bad back pain and a bit bloated", {"back_pain": 3, "bloating": 1}),
+    ("not tired, just irritable", {"irritability": None}),
+]
+
+
+@pytest.mark.parametrize("text, expected", CASES)
+def test_extract_mentions(text, expected):
+    assert {name: severity for name, _, severity in extract_mentions(text)} == expected
+
+
+def test_kinds():
+    assert extract_mentions("anxious and cramping") == [("anxiety", "mood", None), ("cramps", "symptom", None)]
+
+
+def test_canonical_names_match_medical_info():
+    curated = {name for name in VOCABULARY if MedicalInfoTool.get_medical_info(name)["evidence_level"] != "low"}
+    assert curated == {"cramps", "fatigue", "mood_changes", "bloating", "headache"}
+    assert MedicalInfoTool.get_medical_info("headaches") == MedicalInfoTool.get_medical_info("headache")
+
+
+if __name__ == "__main__":
+    pytest.main(["-q", __file__])
@@ -0,0 +1,707 @@
+"""
+vector_store.py
+Per-user vector memory store for CycleWise backend.
+
+Each user gets their own FAISS index that is built from their interaction
+history on first access and then kept up to date as new interactions are
+logged, so a chat request only has to embed the incoming message.
+
+Indexes are ID-mapped on Interaction.id: vectors are added and removed by
+interaction id and search results are ids that map straight back to rows,
+so no transcript text is held in memory.
+
+Every user's index is persisted as a shard file under MEMORY_INDEX_DIR and
+memory-mapped when first accessed. Only recently active users stay
+resident, under an LRU bounded by MEMORY_CACHE_MAX_BYTES.
+
+The index type follows corpus size: exact flat search for small corpora,
+HNSW above MEMORY_HNSW_THRESHOLD vectors and IVF above
+MEMORY_IVF_THRESHOLD, each with tunable search parameters. Vectors are
+stored as float32, float16, int8 or product-quantized codes according to
+MEMORY_ENCODING, optionally re-ranked against the exact stored embeddings.
+
+Vectors are L2-normalized on the way in, so inner-product search scores
+are cosine similarities; results below the embedder's min_similarity (or
+MEMORY_MIN_SIMILARITY, if set) are dropped.
+
+The store is safe to use from many request threads: the LRU registry is
+guarded by a short-held lock, each user's index has a reader-writer lock
+so searches run in parallel and only block while that user's index is
+being modified, and loads/builds are serialized per user rather than
+globally.
+"""
+
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple, Optional, Any
+import faiss
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from embeddings import get_embedder, vector_to_bytes, bytes_to_vector
+from models import Interaction, InteractionEmbedding
+from archive import hydrate
+
+logger = logging.getLogger(__name__)
+
+MEMORY_INDEX_DIR = os.getenv("MEMORY_INDEX_DIR", "./memory_index")
+MEMORY_CACHE_MAX_BYTES = int(os.getenv("MEMORY_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Map flat codes, HNSW graphs and IVF lists in place. (IO_FLAG_MMAP alone only
+# maps IVF inverted lists, and can't be combined with this flag for IVF.)
+SHARD_MMAP_FLAGS = faiss.IO_FLAG_MMAP_IFC
+
+# Index selection by corpus size
+MEMORY_HNSW_THRESHOLD = int(os.getenv("MEMORY_HNSW_THRESHOLD", "10000"))
+MEMORY_IVF_THRESHOLD = int(os.getenv("MEMORY_IVF_THRESHOLD", "500000"))
+HNSW_M = int(os.getenv("MEMORY_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("MEMORY_HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.getenv("MEMORY_HNSW_EF_SEARCH", "64"))
+IVF_NPROBE = int(os.getenv("MEMORY_IVF_NPROBE", "16"))
+METRIC = faiss.METRIC_INNER_PRODUCT  # On unit vectors, i.e. cosine similarity
+METRIC_NAME = "cosine"  # Recorded in shard metadata; shards built otherwise are rebuilt
+# Overrides the embedder's own min_similarity when set
+MEMORY_MIN_SIMILARITY = float(os.environ["MEMORY_MIN_SIMILARITY"]) if os.getenv("MEMORY_MIN_SIMILARITY") else None
+
+# Vector encoding. Bytes per 768-dim vector: float32 3072, float16 1536,
+# int8 768, pq 96 (default m = dim / 8). See bench_memory.py for recall cost.
+MEMORY_ENCODING = os.getenv("MEMORY_ENCODING", "float32")
+MEMORY_PQ_M = int(os.getenv("MEMORY_PQ_M", "0"))  # PQ sub-quantizers (bytes per vector); 0 = dim / 8
+MEMORY_RERANK = os.getenv("MEMORY_RERANK", "false").lower() == "true"
+MEMORY_RERANK_FACTOR = int(os.getenv("MEMORY_RERANK_FACTOR", "4"))
+
+INDEX_KINDS = ["flat", "hnsw", "ivf"]
+ENCODINGS = ["float32", "float16", "int8", "pq"]  # Increasing compression
+# Vectors needed to train an encoding; below this the next weaker encoding is used
+ENCODING_MIN_TRAIN = {"float32": 0, "float16": 0, "int8": 1000, "pq": 39 * 256}
+
+
+def choose_index_kind(n: int) -> str:
+    """Pick the index type for a corpus of n vectors."""
+    if n >= MEMORY_IVF_THRESHOLD:
+        return "ivf"
+    if n >= MEMORY_HNSW_THRESHOLD:
+        return "hnsw"
+    return "flat"
+
+
+def effective_encoding(n: int, encoding: str = None) -> str:
+    """
+    The configured encoding, or the strongest weaker one that can be
+    trained on n vectors (e.g. PQ falls back to int8 for small corpora).
+    """
+    encoding = encoding or MEMORY_ENCODING
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown encoding '{encoding}'. Choose from {ENCODINGS}.")
+    for candidate in reversed(ENCODINGS[:ENCODINGS.index(encoding) + 1]):
+        if n >= ENCODING_MIN_TRAIN[candidate]:
+            return candidate
+    return "float32"
+
+
+def pq_m(dim: int) -> int:
+    """Largest divisor of dim not above the configured (or default dim/8) PQ size."""
+    target = MEMORY_PQ_M or max(1, dim // 8)
+    return max(m for m in range(1, min(target, dim) + 1) if dim % m == 0)
+
+
+def encoding_code(dim: int, encoding: str) -> str:
+    """index_factory component for a vector encoding."""
+    return {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8", "pq": f"PQ{pq_m(dim)}"}[encoding]
+
+
+def bytes_per_code(dim: int, encoding: str) -> int:
+    """Stored size of one encoded vector."""
+    return {"float32": dim * 4, "float16": dim * 2, "int8": dim, "pq": pq_m(dim)}[encoding]
+
+
+def ivf_nlist(n: int) -> int:
+    """Number of IVF cells: ~4*sqrt(n), leaving >= 39 training points per cell."""
+    return max(1, min(int(4 * np.sqrt(n)), n // 39))
+
+
+def create_index(dim: int, kind: str, training_vectors: np.ndarray = None, encoding: str = "float32") -> faiss.Index:
+    """
+    Create an empty ID-mapped index of the given kind and vector encoding.
+    IVF indexes and the int8/PQ encodings are trained on training_vectors,
+    which should be the corpus (or a sample of it).
+    """
+    code = encoding_code(dim, encoding)
+    if kind == "flat":
+        index = faiss.index_factory(dim, f"IDMap2,{code}", METRIC)
+        max_train = 50000
+    elif kind == "hnsw":
+        index = faiss.index_factory(dim, f"IDMap2,HNSW{HNSW_M},{code}", METRIC)
+        faiss.downcast_index(index.index).hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        max_train = 50000
+    elif kind == "ivf":
+        n = len(training_vectors) if training_vectors is not None else 0
+        index = faiss.index_factory(dim, f"IVF{ivf_nlist(n)},{code}", METRIC)
+        max_train = 64 * ivf_nlist(n)
+    else:
+        raise ValueError(f"Unknown index kind '{kind}'. Choose from {INDEX_KINDS}.")
+
+    if not index.is_trained:
+        if training_vectors is None or len(training_vectors) == 0:
+            raise ValueError(f"{kind}/{encoding} index requires training vectors")
+        sample = training_vectors
+        if len(sample) > max_train:
+            picks = np.random.default_rng(0).choice(len(sample), max_train, replace=False)
+            sample = sample[np.sort(picks)]
+        index.train(np.ascontiguousarray(sample, dtype="float32"))
+    set_search_params(index, kind)
+    return index
+
+
+def set_search_params(index: faiss.Index, kind: str, ef_search: int = None, nprobe: int = None):
+    """Apply search-time parameters (HNSW efSearch / IVF nprobe) to an index."""
+    params = faiss.ParameterSpace()
+    if kind == "hnsw":
+        params.set_index_parameter(index, "efSearch", ef_search or HNSW_EF_SEARCH)
+    elif kind == "ivf":
+        params.set_index_parameter(index, "nprobe", nprobe or IVF_NPROBE)
+
+
+def normalize(vectors) -> np.ndarray:
+    """Return float32 copies of vectors scaled to unit L2 norm (zero rows stay zero)."""
+    vectors = np.array(vectors, dtype="float32", ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def exact_distances(query_vector, vectors: np.ndarray) -> np.ndarray:
+    """
+    Exact scores between a query and candidate vectors under METRIC:
+    cosine similarity for inner product (higher is closer), squared
+    distance for L2 (lower is closer).
+    """
+    query = np.asarray(query_vector, dtype="float32").reshape(-1)
+    if METRIC == faiss.METRIC_INNER_PRODUCT:
+        return normalize(vectors) @ normalize(query)[0]
+    diff = vectors - query
+    return np.einsum("ij,ij->i", diff, diff)
+
+
+def format_interaction(message: str, response: str) -> str:
+    """Text representation of an interaction used for embedding and prompts."""
+    return f"User: {message}\nAI: {response}"
+
+
+def load_interactions(db: Session, interaction_ids: Sequence[int]) -> List[Interaction]:
+    """
+    Fetch interactions by id, preserving the order of interaction_ids
+    (i.e. search rank). Ids that no longer exist are dropped. Archived
+    interactions come back with their full text.
+    """
+    if not interaction_ids:
+        return []
+    rows = hydrate(db.query(Interaction).filter(Interaction.id.in_(list(interaction_ids))).all())
+    by_id = {row.id: row for row in rows}
+    return [by_id[i] for i in interaction_ids if i in by_id]
+
+
+def load_embeddings(db: Session, interaction_ids: Sequence[int], model: str = None) -> Dict[int, np.ndarray]:
+    """
+    Stored embeddings for interaction_ids as {id: unit vector}. Only
+    embeddings from model (default: the current embedder's) are returned.
+    """
+    if not interaction_ids:
+        return {}
+    rows = (
+        db.query(InteractionEmbedding.interaction_id, InteractionEmbedding.vector)
+        .filter(
+            InteractionEmbedding.interaction_id.in_(list(interaction_ids)),
+            InteractionEmbedding.model == (model or get_embedder().model_name),
+        )
+        .all()
+    )
+    if not rows:
+        return {}
+    vectors = normalize(np.vstack([bytes_to_vector(vector) for _, vector in rows]))
+    return {interaction_id: vectors[row] for row, (interaction_id, _) in enumerate(rows)}
+
+
+def min_similarity_floor() -> float:
+    """Cosine below which a vector hit is dropped: MEMORY_MIN_SIMILARITY, else the embedder's default."""
+    return MEMORY_MIN_SIMILARITY if MEMORY_MIN_SIMILARITY is not None else get_embedder().min_similarity
+
+
+class ReadWriteLock:
+    """
+    Any number of concurrent readers or a single writer. Waiting writers
+    block new readers, so a stream of searches can't starve an update.
+    Not reentrant.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class UserMemoryIndex:
+    """
+    FAISS index for a single user, keyed by Interaction.id.
+
+    HNSW graphs don't support removal, so ids removed from one are kept as
+    tombstones and filtered out of search results until the next rebuild.
+
+    search() holds the read side of `lock`; add(), remove() and
+    load_writable() hold the write side.
+    """
+
+    def __init__(self, dim: int, kind: str = "flat", encoding: str = "float32",
+                 index: faiss.Index = None, mmapped: bool = False):
+        self.dim = dim
+        self.kind = kind
+        self.encoding = encoding
+        self.index = index if index is not None else create_index(dim, kind, encoding=encoding)
+        self.mmapped = mmapped
+        self.dirty = False
+        self.max_id = 0
+        self.tombstones = set()
+        self.lock = ReadWriteLock()
+
+    @property
+    def size(self) -> int:
+        return self.index.ntotal - len(self.tombstones)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate bytes held for this index: vector codes, id map and graph links."""
+        per_vector = bytes_per_code(self.dim, self.encoding) + 8
+        if self.kind == "hnsw":
+            per_vector += HNSW_M * 2 * 4
+        return self.index.ntotal * per_vector
+
+    def add(self, interaction_ids: Sequence[int], vectors):
+        """
+        Add or replace vectors by interaction id. Idempotent: an id the index
+        may already hold (at most max_id, e.g. loaded by a catch-up before its
+        commit callback ran) is not added a second time.
+        """
+        if len(interaction_ids) == 0:
+            return
+        ids = np.asarray(interaction_ids, dtype="int64")
+        vectors = normalize(np.asarray(vectors, dtype="float32").reshape(len(ids), -1))
+        _, last = np.unique(ids[::-1], return_index=True)  # Last vector per id wins
+        keep = np.sort(len(ids) - 1 - last)
+        ids, vectors = ids[keep], vectors[keep]
+        with self.lock.write():
+            seen = ids[ids <= self.max_id]
+            if seen.size:
+                if self.kind == "hnsw":
+                    # No removal from HNSW graphs: keep the held vector, reviving it if tombstoned
+                    held = {int(i) for i in seen if self._contains(int(i))}
+                    self.tombstones -= held
+                    fresh = np.array([int(i) not in held for i in ids])
+                    ids, vectors = ids[fresh], vectors[fresh]
+                else:
+                    self.index.remove_ids(seen)
+            if ids.size == 0:
+                return
+            self.index.add_with_ids(vectors, ids)
+            self.max_id = max(self.max_id, int(ids.max()))
+            self.dirty = True
+
+    def remove(self, interaction_ids: Sequence[int]) -> int:
+        if len(interaction_ids) == 0:
+            return 0
+        with self.lock.write():
+            if self.kind == "hnsw":
+                ids = [i for i in set(int(i) for i in interaction_ids) - self.tombstones if self._contains(i)]
+                self.tombstones.update(ids)
+                removed = len(ids)
+            else:
+                removed = self.index.remove_ids(np.asarray(interaction_ids, dtype="int64"))
+            self.dirty = self.dirty or removed > 0
+        return removed
+
+    def load_writable(self, path: str):
+        """
+        Memory-mapped shards are read-only (faiss aborts on a write to a
+        mapped vector); before the first write, read the shard at path fully
+        into memory.
+        """
+        with self.lock.write():
+            if self.mmapped:
+                self.index = faiss.read_index(path)
+                set_search_params(self.index, self.kind)
+                self.mmapped = False
+
+    def _contains(self, interaction_id: int) -> bool:
+        try:
+            self.index.reconstruct(interaction_id)
+            return True
+        except RuntimeError:
+            return False
+
+    def search(self, query_vector: List[float], k: int = 5) -> List[Tuple[int, float]]:
+        """Return (interaction_id, similarity) pairs, most similar first."""
+        if self.size == 0:
+            return []
+        query = normalize(query_vector)
+        with self.lock.read():
+            D, I = self.index.search(query, min(k + len(self.tombstones), self.index.ntotal))
+            hits = [(int(i), float(d)) for i, d in zip(I[0], D[0]) if i >= 0 and int(i) not in self.tombstones]
+        return hits[:k]
+
+
+class VectorMemoryStore:
+    """
+    Process-wide registry of per-user memory indexes keyed by user_id.
+
+    Indexes are held in an LRU. A miss memory-maps the user's shard from
+    disk (catching up on interactions logged since it was written) or, if
+    there is no usable shard, builds one from stored embeddings. Evicted
+    indexes are flushed to their shard first if they were modified.
+    """
+
+    def __init__(self, index_dir: str = MEMORY_INDEX_DIR, max_bytes: int = MEMORY_CACHE_MAX_BYTES):
+        self.index_dir = index_dir
+        self.max_bytes = max_bytes
+        self._indexes: "OrderedDict[int, UserMemoryIndex]" = OrderedDict()
+        self._lock = threading.RLock()  # Guards _indexes, _user_locks and _counters
+        self._user_locks: Dict[int, threading.Lock] = {}  # Serialize loads/builds per user
+        self._counters = {"hits": 0, "loads": 0, "builds": 0, "evictions": 0, "flushes": 0}
+
+    # --- Shard files ---
+
+    def _shard_path(self, user_id: int) -> str:
+        model = get_embedder().model_name.replace("/", "_")
+        return os.path.join(self.index_dir, f"user_{user_id}.{model}.faiss")
+
+    def _flush(self, user_id: int, user_index: UserMemoryIndex):
+        """Atomically write a user's index and its metadata to their shard."""
+        os.makedirs(self.index_dir, exist_ok=True)
+        path = self._shard_path(user_id)
+        with user_index.lock.read():
+            faiss.write_index(user_index.index, path + ".tmp")
+            with open(path + ".json.tmp", "w") as f:
+                json.dump({
+                    "kind": user_index.kind,
+                    "metric": METRIC_NAME,
+                    "encoding": user_index.encoding,
+                    "count": user_index.size,
+                    "max_id": user_index.max_id,
+                    "tombstones": sorted(user_index.tombstones),
+                }, f)
+            os.replace(path + ".tmp", path)
+            os.replace(path + ".json.tmp", path + ".json")
+            user_index.dirty = False
+        with self._lock:
+            self._counters["flushes"] += 1
+
+    def _load_shard(self, user_id: int) -> Optional[UserMemoryIndex]:
+        path = self._shard_path(user_id)
+        if not (os.path.exists(path) and os.path.exists(path + ".json")):
+            return None
+        try:
+            with open(path + ".json") as f:
+                meta = json.load(f)
+            index = faiss.read_index(path, SHARD_MMAP_FLAGS)
+        except Exception as e:
+            logger.warning(f"Discarding unreadable memory shard for user {user_id}: {e}")
+            return None
+        if meta.get("metric", "l2") != METRIC_NAME:
+            return None  # Built under a different metric; rebuild
+        kind = meta.get("kind", "flat")
+        set_search_params(index, kind)
+        user_index = UserMemoryIndex(index.d, kind=kind, encoding=meta.get("encoding", "float32"), index=index, mmapped=True)
+        user_index.max_id = meta.get("max_id", 0)
+        user_index.tombstones = set(meta.get("tombstones", []))
+        return user_index
+
+    def _writable(self, user_id: int, user_index: UserMemoryIndex) -> UserMemoryIndex:
+        user_index.load_writable(self._shard_path(user_id))
+        return user_index
+
+    # --- Loading and building ---
+
+    def get_index(self, user_id: int, db: Session) -> UserMemoryIndex:
+        """
+        Return the user's index: from the LRU if resident, otherwise mapped
+        from their shard, otherwise built from the database. An index whose
+        corpus has grown past its type's size range is rebuilt as the next
+        type up.
+
+        Only the registry lookups hold the store lock; loading or building
+        holds a per-user lock, so one user's cold start doesn't stall
+        searches for everyone else. Threads holding the previous index
+        object keep using it until they are done (a snapshot read).
+        """
+        user_index = self._resident(user_id)
+        if user_index is not None:
+            return user_index
+
+        with self._user_lock(user_id):
+            # Another thread may have loaded it while this one waited
+            user_index = self._resident(user_id)
+            if user_index is not None:
+                return user_index
+
+            with self._lock:
+                user_index = self._indexes.get(user_id)
+            if user_index is None:
+                user_index = self._load_shard(user_id)
+            if user_index is not None and self._catch_up(user_id, user_index, db) and not self._outgrown(user_index):
+                counter = "loads"
+            else:
+                user_index = self._build(user_id, db)
+                counter = "builds"
+                self._flush(user_id, user_index)
+
+            with self._lock:
+                self._counters[counter] += 1
+                self._indexes[user_id] = user_index
+                self._indexes.move_to_end(user_id)
+                evicted = self._evict()
+        # Shards are written after releasing this user's lock (flushing takes the evicted users')
+        self._flush_evicted(evicted)
+        return user_index
+
+    def _user_lock(self, user_id: int) -> threading.Lock:
+        with self._lock:
+            return self._user_locks.setdefault(user_id, threading.Lock())
+
+    def _resident(self, user_id: int) -> Optional[UserMemoryIndex]:
+        """The user's resident index (marking it recently used), unless absent or outgrown."""
+        with self._lock:
+            user_index = self._indexes.get(user_id)
+            if user_index is None or self._outgrown(user_index):
+                return None
+            self._indexes.move_to_end(user_id)
+            self._counters["hits"] += 1
+            return user_index
+
+    @staticmethod
+    def _outgrown(user_index: UserMemoryIndex) -> bool:
+        """
+        Whether the corpus now warrants a bigger index type or (once there is
+        enough data to train it) a more compact encoding. Only ever upgrade,
+        so a corpus hovering around a threshold doesn't flip-flop.
+        """
+        kind = choose_index_kind(user_index.size)
+        if INDEX_KINDS.index(kind) > INDEX_KINDS.index(user_index.kind):
+            return True
+        encoding = effective_encoding(user_index.size)
+        return ENCODINGS.index(encoding) > ENCODINGS.index(user_index.encoding)
+
+    def _catch_up(self, user_id: int, user_index: UserMemoryIndex, db: Session) -> bool:
+        """
+        Add interactions logged after the shard was written. Returns False if
+        the shard no longer matches the database (e.g. rows were deleted
+        while it was not resident) and must be rebuilt.
+        """
+        count, max_id = (
+            db.query(func.count(Interaction.id), func.max(Interaction.id))
+            .filter(Interaction.user_id == user_id)
+            .one()
+        )
+        if count == user_index.size and (max_id or 0) == user_index.max_id:
+            return True
+        ids, vectors = self._load_vectors(user_id, db, after_id=user_index.max_id)
+        if user_index.size + len(ids) != count:
+            return False
+        self._writable(user_id, user_index).add(ids, vectors)
+        return True
+
+    def _load_vectors(self, user_id: int, db: Session, after_id: int = 0) -> Tuple[List[int], np.ndarray]:
+        """
+        Load a user's stored embeddings for interactions with id > after_id.
+        Interactions that were never embedded (or were embedded by a different
+        model) are embedded once here and written back so later builds don't
+        repeat the work.
+        """
+        embedder = get_embedder()
+        rows = (
+            db.query(Interaction.id, InteractionEmbedding)
+            .outerjoin(InteractionEmbedding, InteractionEmbedding.interaction_id == Interaction.id)
+            .filter(Interaction.user_id == user_id, Interaction.id > after_id)
+            .all()
+        )
+        ids = [interaction_id for interaction_id, _ in rows]
+        vectors: List = [None] * len(rows)
+        missing = []
+        for pos, (_, stored) in enumerate(rows):
+            if stored is not None and stored.model == embedder.model_name:
+                vectors[pos] = bytes_to_vector(stored.vector)
+            else:
+                missing.append(pos)
+
+        if missing:
+            interactions = load_interactions(db, [ids[pos] for pos in missing])
+            embedded = embedder.embed([format_interaction(i.message, i.response) for i in interactions])
+            for pos, vector in zip(missing, embedded):
+                vectors[pos] = vector
+                stored = rows[pos][1]
+                if stored is None:
+                    stored = InteractionEmbedding(interaction_id=ids[pos])
+                    db.add(stored)
+                stored.model = embedder.model_name
+                stored.dim = len(vector)
+                stored.vector = vector_to_bytes(vector)
+            try:
+                db.commit()
+            except Exception as e:
+                logger.error(f"Error storing embeddings for user {user_id}: {e}")
+                db.rollback()
+            logger.info(f"Embedded {len(missing)} interactions for user {user_id}")
+
+        if not ids:
+            return [], np.zeros((0, embedder.dim), dtype="float32")
+        return ids, np.vstack(vectors)
+
+    def _build(self, user_id: int, db: Session) -> UserMemoryIndex:
+        ids, vectors = self._load_vectors(user_id, db)
+        kind = choose_index_kind(len(ids))
+        encoding = effective_encoding(len(ids))
+        dim = get_embedder().dim
+        index = create_index(dim, kind, training_vectors=normalize(vectors), encoding=encoding)
+        user_index = UserMemoryIndex(dim, kind=kind, encoding=encoding, index=index)
+        user_index.add(ids, vectors)
+        logger.info(f"Built {kind}/{encoding} memory index for user {user_id} with {len(ids)} interactions")
+        return user_index
+
+    def _evict(self) -> List[Tuple[int, UserMemoryIndex]]:
+        """
+        Drop least recently used indexes until under the memory cap. Call with
+        the store lock held; returns the evicted entries, which the caller
+        passes to _flush_evicted after releasing it.
+        """
+        evicted = []
+        while len(self._indexes) > 1 and self.resident_bytes() > self.max_bytes:
+            evicted.append(self._indexes.popitem(last=False))
+            self._counters["evictions"] += 1
+        return evicted
+
+    def _flush_evicted(self, evicted: List[Tuple[int, UserMemoryIndex]]):
+        """Write modified evicted indexes to their shards, holding each user's load lock so a reload waits for it."""
+        for user_id, user_index in evicted:
+            if user_index.dirty:
+                with self._user_lock(user_id):
+                    self._flush(user_id, user_index)
+
+    # --- Updates and search ---
+
+    def add_interaction(self, user_id: int, interaction_id: int, vector: List[float]):
+        """
+        Append a newly logged interaction's embedding to the user's index.
+        Users whose index isn't resident are skipped; their shard catches up
+        from the database when it is next loaded.
+        """
+        with self._lock:
+            user_index = self._indexes.get(user_id)
+        if user_index is None:
+            return
+        self._writable(user_id, user_index).add([interaction_id], [vector])
+        with self._lock:
+            evicted = self._evict()
+        self._flush_evicted(evicted)
+
+    def remove_interactions(self, user_id: int, interaction_ids: Sequence[int]) -> int:
+        """Remove deleted or archived interactions from the user's index."""
+        with self._lock:
+            user_index = self._indexes.get(user_id)
+        if user_index is None:
+            return 0
+        return self._writable(user_id, user_index).remove(interaction_ids)
+
+    def search(self, user_id: int, query: str, db: Session, k: int = 5,
+               query_vector=None, min_similarity: float = None) -> List[Tuple[int, float]]:
+        """
+        Return (interaction_id, cosine similarity) pairs for the user's
+        closest memories, dropping any below min_similarity (default
+        min_similarity_floor()). Pass query_vector if the query is already
+        embedded. With MEMORY_RERANK, compressed indexes over-fetch and the
+        candidates are re-scored against their exact stored embeddings.
+        """
+        user_index = self.get_index(user_id, db)
+        if user_index.size == 0:
+            return []
+        if query_vector is None:
+            query_vector = get_embedder().embed([query])[0]
+        rerank = MEMORY_RERANK and user_index.encoding != "float32"
+        hits = user_index.search(query_vector, k * MEMORY_RERANK_FACTOR if rerank else k)
+        if rerank:
+            hits = self._rerank(query_vector, hits, db)
+        threshold = min_similarity_floor() if min_similarity is None else min_similarity
+        return [(interaction_id, score) for interaction_id, score in hits[:k] if score >= threshold]
+
+    def _rerank(self, query_vector, hits: List[Tuple[int, float]], db: Session) -> List[Tuple[int, float]]:
+        stored = load_embeddings(db, [interaction_id for interaction_id, _ in hits])
+        if len(stored) != len(hits):
+            return hits  # Some embeddings missing; keep approximate order
+        ids = list(stored)
+        scores = exact_distances(query_vector, np.vstack([stored[i] for i in ids]))
+        order = np.argsort(-scores)
+        return [(ids[i], float(scores[i])) for i in order]
+
+    def invalidate(self, user_id: int):
+        """Drop a user's index and shard so it is rebuilt on next access."""
+        with self._user_lock(user_id):
+            with self._lock:
+                self._indexes.pop(user_id, None)
+            path = self._shard_path(user_id)
+            for stale in (path, path + ".json"):
+                if os.path.exists(stale):
+                    os.remove(stale)
+
+    def flush_all(self):
+        """Write every modified resident index to its shard (e.g. at shutdown)."""
+        with self._lock:
+            resident = list(self._indexes.items())
+        for user_id, user_index in resident:
+            if user_index.dirty:
+                self._flush(user_id, user_index)
+
+    # --- Metrics ---
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(user_index.nbytes for user_index in self._indexes.values())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._counters,
+                "resident_users": len(self._indexes),
+                "resident_bytes": self.resident_bytes(),
+                "max_bytes": self.max_bytes,
+            }
+
+
+memory_store = VectorMemoryStore()